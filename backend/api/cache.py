@@ -0,0 +1,169 @@
+from datetime import datetime
+from hashlib import md5
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from django.core.cache import caches
+from django.utils import timezone
+
+from api.models import YandexWeatherModel
+from core.metrics import cache_requests
+from core.timing import timed
+from core.utils import dump_json, normalize_city_name
+from yandex_weather.settings.base import WEATHER_CACHE_ALIAS
+
+
+class WeatherCache:
+    """Read-through кэш данных о погоде по наименованию города.
+
+    Записи хранятся в кэше Django с алиасом WEATHER_CACHE_ALIAS,
+    время жизни записи ограничено моментом, до которого
+    допустимо отдавать данные о погоде пользователю.
+    Вместе с данными хранится их готовое JSON-представление,
+    которое обновляется при каждой записи в кэш.
+    """
+
+    key_prefix = "weather"
+
+    def __init__(self, alias: str = WEATHER_CACHE_ALIAS) -> None:
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, city: str) -> str:
+        """Возвращает ключ кэша для города."""
+        city_hash = md5(normalize_city_name(city).encode()).hexdigest()
+        return f"{self.key_prefix}:{city_hash}"
+
+    @staticmethod
+    def get_timeout(updated_at: Optional[datetime]) -> float:
+        """Возвращает оставшееся время хранения данных в секундах."""
+        if updated_at is None:
+            return 0
+        return (
+            YandexWeatherModel.get_stale_until(updated_at) - timezone.now()
+        ).total_seconds()
+
+    @staticmethod
+    def make_entry(
+        data: Dict[str, Any], updated_at: Optional[datetime]
+    ) -> Dict[str, Any]:
+        """Возвращает запись кэша с JSON-представлением данных."""
+        with timed("serialize"):
+            body = dump_json(data)
+        return {"data": data, "updated_at": updated_at, "body": body}
+
+    def get(
+        self, city: str, count_miss: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """Возвращает запись кэша для города.
+
+        count_miss=False не учитывает промах в статистике, если после
+        него запись будет запрошена повторно.
+        """
+        entry = self.cache.get(self.make_key(city))
+        if entry is not None or count_miss:
+            self._count(entry)
+        return entry
+
+    async def aget(self, city: str) -> Optional[Dict[str, Any]]:
+        """Асинхронно возвращает запись кэша для города."""
+        entry = await self.cache.aget(self.make_key(city))
+        self._count(entry)
+        return entry
+
+    def _count(self, entry: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        cache_requests.inc(result="miss" if entry is None else "hit")
+
+    def set(
+        self, city: str, data: Dict[str, Any], updated_at: Optional[datetime]
+    ) -> None:
+        """Сохраняет данные о погоде для города."""
+        timeout = self.get_timeout(updated_at)
+        if timeout <= 0:
+            return
+        self.cache.set(
+            self.make_key(city), self.make_entry(data, updated_at), timeout
+        )
+
+    async def aset(
+        self, city: str, data: Dict[str, Any], updated_at: Optional[datetime]
+    ) -> None:
+        """Асинхронно сохраняет данные о погоде для города."""
+        timeout = self.get_timeout(updated_at)
+        if timeout <= 0:
+            return
+        await self.cache.aset(
+            self.make_key(city), self.make_entry(data, updated_at), timeout
+        )
+
+    def set_many(
+        self,
+        cities: Iterable[str],
+        data: Dict[str, Any],
+        updated_at: Optional[datetime],
+    ) -> None:
+        """Сохраняет одинаковые данные о погоде для нескольких городов."""
+        timeout = self.get_timeout(updated_at)
+        if timeout <= 0:
+            return
+        entry = self.make_entry(data, updated_at)
+        self.cache.set_many(
+            {self.make_key(city): entry for city in cities}, timeout
+        )
+
+    async def aset_many(
+        self,
+        cities: Iterable[str],
+        data: Dict[str, Any],
+        updated_at: Optional[datetime],
+    ) -> None:
+        """Асинхронно сохраняет данные о погоде для нескольких городов."""
+        timeout = self.get_timeout(updated_at)
+        if timeout <= 0:
+            return
+        entry = self.make_entry(data, updated_at)
+        await self.cache.aset_many(
+            {self.make_key(city): entry for city in cities}, timeout
+        )
+
+    def delete(self, city: str) -> None:
+        """Удаляет запись кэша для города."""
+        self.cache.delete(self.make_key(city))
+
+    def get_or_load(
+        self,
+        city: str,
+        loader: Callable[[], Tuple[Dict[str, Any], Optional[datetime]]],
+    ) -> Dict[str, Any]:
+        """Возвращает запись из кэша, при промахе загружает через loader."""
+        entry = self.get(city)
+        if entry is not None:
+            return entry
+        data, updated_at = loader()
+        self.set(city, data, updated_at)
+        return self.make_entry(data, updated_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики попаданий и промахов кэша."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+        }
+
+
+weather_cache = WeatherCache()
@@ -0,0 +1,215 @@
+import io
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import pandas as pd
+from django.core.validators import MinLengthValidator
+from django.db import connection, transaction
+
+from api.models import YandexWeatherModel
+from core.utils import iter_batches, normalize_city_name
+
+STAGING_TABLE = "import_city_staging"
+
+UPSERT_CONFLICT_FIELDS = {
+    "city": ("city_normalized",),
+    "coords": ("latitude", "longitude"),
+}
+
+
+@dataclass
+class ImportStats:
+    """Статистика импорта городов."""
+
+    read: int = 0
+    invalid: int = 0
+    loaded: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+class CityImporter:
+    """Импорт городов в YandexWeatherModel.
+
+    Пакеты записей проверяются целиком средствами pandas.
+    В PostgreSQL корректные записи загружаются через COPY во временную
+    таблицу и переносятся в основную одним INSERT ... ON CONFLICT,
+    в остальных СУБД записываются пакетами через bulk_create.
+    """
+
+    model = YandexWeatherModel
+    fields = ("city", "city_normalized", "latitude", "longitude")
+
+    def __init__(
+        self,
+        batch_size: int = 10000,
+        upsert: Optional[str] = None,
+        progress: Optional[Callable[[ImportStats], None]] = None,
+    ) -> None:
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.progress = progress
+        city_field = self.model._meta.get_field(self.model.CITYNAME_FIELD)
+        self.city_max_length = city_field.max_length
+        self.city_min_length = next(
+            validator.limit_value
+            for validator in city_field.validators
+            if isinstance(validator, MinLengthValidator)
+        )
+
+    @property
+    def is_copy_supported(self) -> bool:
+        return connection.vendor == "postgresql"
+
+    def validate(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Возвращает корректные записи пакета в формате полей модели."""
+        city = frame["city"].astype("string").str.strip()
+        latitude = pd.to_numeric(frame["latitude"], errors="coerce")
+        longitude = pd.to_numeric(frame["longitude"], errors="coerce")
+        city_length = city.str.len()
+        is_valid = (
+            city_length.between(self.city_min_length, self.city_max_length)
+            & latitude.between(-90.0, 90.0)
+            & longitude.between(-180.0, 180.0)
+        ).fillna(False)
+        valid = pd.DataFrame(
+            {
+                "city": city[is_valid],
+                "latitude": latitude[is_valid],
+                "longitude": longitude[is_valid],
+            }
+        )
+        valid["city_normalized"] = valid["city"].map(normalize_city_name)
+        return valid[list(self.fields)]
+
+    def load(self, rows: Iterable[Dict[str, Any]]) -> ImportStats:
+        """Загружает записи rows, возвращает статистику импорта."""
+        stats = ImportStats()
+        started = time.perf_counter()
+        with transaction.atomic():
+            if self.is_copy_supported:
+                self._create_staging_table()
+            for batch in iter_batches(iter(rows), self.batch_size):
+                frame = self.validate(
+                    pd.DataFrame.from_records(
+                        batch, columns=("city", "latitude", "longitude")
+                    )
+                )
+                stats.read += len(batch)
+                stats.invalid += len(batch) - len(frame)
+                if self.is_copy_supported:
+                    self._copy_to_staging(frame)
+                else:
+                    stats.loaded += self._bulk_create(frame)
+                stats.elapsed = time.perf_counter() - started
+                if self.progress:
+                    self.progress(stats)
+            if self.is_copy_supported:
+                stats.loaded = self._merge_staging()
+        stats.elapsed = time.perf_counter() - started
+        return stats
+
+    def _create_staging_table(self) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {STAGING_TABLE} ("
+                "city varchar(150), city_normalized varchar(150), "
+                "latitude double precision, longitude double precision"
+                ") ON COMMIT DROP"
+            )
+
+    def _copy_to_staging(self, frame: pd.DataFrame) -> None:
+        buffer = io.StringIO()
+        frame.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {STAGING_TABLE} ({', '.join(self.fields)}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+
+    def _merge_staging(self) -> int:
+        """Переносит записи из временной таблицы одним запросом."""
+        conflict_fields = UPSERT_CONFLICT_FIELDS[self.upsert or "city"]
+        other_fields = UPSERT_CONFLICT_FIELDS[
+            "coords"
+            if conflict_fields == UPSERT_CONFLICT_FIELDS["city"]
+            else "city"
+        ]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        columns = ", ".join(self.fields)
+        modified_field = self.model.MODIFIED_FIELD
+        if self.upsert:
+            action = "DO UPDATE SET " + ", ".join(
+                [
+                    f"{field} = EXCLUDED.{field}"
+                    for field in self.fields
+                    if field not in conflict_fields
+                ]
+                + [f"{modified_field} = now()"]
+            )
+        else:
+            action = "DO NOTHING"
+        # Записи, конфликтующие с другими городами по второму уникальному
+        # ключу, пропускаются, чтобы не прерывать загрузку всего набора.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH by_city AS ("
+                f"SELECT DISTINCT ON (city_normalized) {columns} "
+                f"FROM {STAGING_TABLE} ORDER BY city_normalized"
+                f"), deduplicated AS ("
+                f"SELECT DISTINCT ON (latitude, longitude) {columns} "
+                f"FROM by_city ORDER BY latitude, longitude"
+                f") "
+                f"INSERT INTO {table} "
+                f"(created_at, {modified_field}, requests_count, {columns}) "
+                f"SELECT now(), now(), 0, {columns} "
+                f"FROM deduplicated AS source "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {table} AS target WHERE "
+                + " AND ".join(
+                    f"target.{field} = source.{field}"
+                    for field in other_fields
+                )
+                + " AND NOT ("
+                + " AND ".join(
+                    f"target.{field} = source.{field}"
+                    for field in conflict_fields
+                )
+                + f")) ON CONFLICT ({', '.join(conflict_fields)}) {action}"
+            )
+            return cursor.rowcount
+
+    def _bulk_create(self, frame: pd.DataFrame) -> int:
+        """Записывает пакет, возвращает количество загруженных записей.
+
+        При upsert загруженными считаются добавленные и обновленные
+        записи, без него - только добавленные: записи, пропущенные
+        из-за конфликтов, не меняют количество городов пакета в таблице,
+        которое считается по уникальному индексу city_normalized.
+        """
+        objects = [self.model(**record) for record in frame.to_dict("records")]
+        if self.upsert:
+            conflict_fields = UPSERT_CONFLICT_FIELDS[self.upsert]
+            self.model.objects.bulk_create(
+                objects,
+                update_conflicts=True,
+                unique_fields=conflict_fields,
+                update_fields=[
+                    field
+                    for field in self.fields
+                    if field not in conflict_fields
+                ]
+                + [self.model.MODIFIED_FIELD],
+            )
+            return len(objects)
+        batch_cities = self.model.objects.filter(
+            city_normalized__in=frame["city_normalized"].unique().tolist()
+        )
+        count = batch_cities.count()
+        self.model.objects.bulk_create(objects, ignore_conflicts=True)
+        return batch_cities.count() - count
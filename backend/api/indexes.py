@@ -0,0 +1,350 @@
+import heapq
+import math
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from threading import RLock
+from time import monotonic
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import Count, Max, Sum
+
+from api.models import YandexWeatherModel
+from core.utils import normalize_city_name
+from yandex_weather.settings.base import (
+    CITY_INDEX_CHECK_INTERVAL,
+    CITY_SUGGEST_LIMIT,
+    CITY_SUGGEST_MIN_SIMILARITY,
+)
+
+
+class ModelIndex(ABC):
+    """Индекс записей модели в памяти процесса.
+
+    Строится при первом обращении и обновляется по сигналам сохранения
+    и удаления записей. Изменения в обход сигналов (bulk_create, импорт,
+    другие процессы) обнаруживаются раз в check_interval секунд
+    по количеству записей, максимальному pk и времени последнего
+    изменения записи, после чего индекс перестраивается целиком.
+    QuerySet.update не заполняет auto_now: изменяющие индексируемые
+    поля запросы должны обновлять и поле model.MODIFIED_FIELD,
+    остальные изменения учитываются через get_version_aggregates.
+    Наследники задают fields (первым идет pk) и методы build, add, remove.
+    """
+
+    model = YandexWeatherModel
+    fields: Tuple[str, ...] = ("pk",)
+
+    def __init__(self, check_interval: int = CITY_INDEX_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = RLock()
+        self._version = None
+        self._checked_at: Optional[float] = None
+        self.build(())
+
+    def get_version_aggregates(self) -> Dict[str, Any]:
+        """Возвращает агрегаты таблицы, из которых состоит версия."""
+        return {
+            "count": Count("pk"),
+            "max_pk": Max("pk"),
+            "modified_at": Max(self.model.MODIFIED_FIELD),
+        }
+
+    def get_version(self) -> Tuple[Any, ...]:
+        """Возвращает дешевую для БД версию таблицы."""
+        aggregates = self.get_version_aggregates()
+        version = self.model.objects.aggregate(**aggregates)
+        return tuple(version[name] for name in aggregates)
+
+    def ensure_fresh(self) -> None:
+        """Перестраивает индекс, если таблица изменилась в обход сигналов."""
+        if not self._is_check_needed():
+            return
+        with self._lock:
+            if not self._is_check_needed():
+                return
+            version = self.get_version()
+            if version != self._version:
+                self.build(self.model.objects.values_list(*self.fields))
+                self._version = version
+            self._checked_at = monotonic()
+
+    def reset(self) -> None:
+        """Сбрасывает индекс, он будет перестроен при следующем обращении."""
+        with self._lock:
+            self._version = None
+            self._checked_at = None
+            self.build(())
+
+    def update(self, instance) -> None:
+        """Обновляет запись индекса по сохраненному экземпляру модели."""
+        with self._lock:
+            if self._checked_at is None:
+                return
+            self.remove(instance.pk)
+            self.add(tuple(getattr(instance, field) for field in self.fields))
+
+    def delete(self, instance) -> None:
+        """Удаляет запись индекса по удаленному экземпляру модели."""
+        with self._lock:
+            if self._checked_at is not None:
+                self.remove(instance.pk)
+
+    @abstractmethod
+    def build(self, rows: Iterable[Tuple[Any, ...]]) -> None:
+        """Строит индекс заново по строкам rows."""
+
+    @abstractmethod
+    def add(self, row: Tuple[Any, ...]) -> None:
+        """Добавляет строку row в индекс."""
+
+    @abstractmethod
+    def remove(self, pk: int) -> None:
+        """Удаляет запись pk из индекса."""
+
+    def _is_check_needed(self) -> bool:
+        return (
+            self._checked_at is None
+            or monotonic() - self._checked_at >= self.check_interval
+        )
+
+
+def get_trigrams(name: str) -> frozenset:
+    """Возвращает триграммы нормализованного наименования по словам."""
+    return frozenset(
+        padded[index : index + 3]
+        for word in name.split("-")
+        if word
+        for padded in (f"  {word} ",)
+        for index in range(len(padded) - 2)
+    )
+
+
+class CitySuggestIndex(ModelIndex):
+    """Индекс подсказок наименований городов.
+
+    Совпадения по началу нормализованного наименования ищутся бинарным
+    поиском по отсортированному списку, наименования с опечатками -
+    по общим триграммам. Популярность городов обновляется запросами
+    update без сигналов, поэтому входит в версию таблицы: ранжирование
+    отстает от БД не больше чем на check_interval секунд.
+    """
+
+    fields = ("pk", "city", "city_normalized", "requests_count")
+
+    def get_version_aggregates(self):
+        return {
+            **super().get_version_aggregates(),
+            "popularity": Sum("requests_count"),
+        }
+
+    def build(self, rows):
+        self._entries = {}
+        self._sorted = []
+        self._trigrams = defaultdict(set)
+        for row in rows:
+            self._sorted.append(self._add_entry(row))
+        self._sorted.sort()
+
+    def add(self, row):
+        insort(self._sorted, self._add_entry(row))
+
+    def _add_entry(self, row):
+        """Добавляет запись без списка наименований, возвращает его ключ."""
+        pk, city, city_normalized, requests_count = row
+        trigrams = get_trigrams(city_normalized)
+        self._entries[pk] = (city, city_normalized, requests_count, trigrams)
+        for trigram in trigrams:
+            self._trigrams[trigram].add(pk)
+        return city_normalized, pk
+
+    def remove(self, pk):
+        entry = self._entries.pop(pk, None)
+        if entry is None:
+            return
+        index = bisect_left(self._sorted, (entry[1], pk))
+        del self._sorted[index]
+        for trigram in entry[3]:
+            self._trigrams[trigram].discard(pk)
+
+    def suggest(
+        self, query: str, limit: int = CITY_SUGGEST_LIMIT
+    ) -> List[Dict[str, str]]:
+        """Возвращает подсказки городов, сначала совпадения по началу."""
+        self.ensure_fresh()
+        key = normalize_city_name(query)
+        if not key:
+            return []
+        with self._lock:
+            prefixed = self._get_prefixed(key, limit)
+            results = [
+                {"city": self._entries[pk][0], "match": "prefix"}
+                for pk in prefixed
+            ]
+            if len(results) < limit:
+                results.extend(
+                    {"city": self._entries[pk][0], "match": "similar"}
+                    for pk in self._get_similar(
+                        key, limit - len(results), set(prefixed)
+                    )
+                )
+        return results
+
+    def _get_prefixed(self, key, limit):
+        index = bisect_left(self._sorted, (key,))
+        matches = []
+        while index < len(self._sorted) and self._sorted[index][0].startswith(
+            key
+        ):
+            matches.append(self._sorted[index][1])
+            index += 1
+        return heapq.nsmallest(
+            limit,
+            matches,
+            key=lambda pk: (
+                self._entries[pk][1] != key,
+                -self._entries[pk][2],
+                self._entries[pk][1],
+            ),
+        )
+
+    def _get_similar(self, key, limit, exclude):
+        trigrams = get_trigrams(key)
+        shared = Counter(
+            pk
+            for trigram in trigrams
+            for pk in self._trigrams.get(trigram, ())
+        )
+        scored = []
+        for pk, count in shared.items():
+            if pk in exclude:
+                continue
+            similarity = count / (
+                len(trigrams) + len(self._entries[pk][3]) - count
+            )
+            if similarity >= CITY_SUGGEST_MIN_SIMILARITY:
+                scored.append((similarity, pk))
+        return [
+            pk
+            for _, pk in heapq.nsmallest(
+                limit,
+                scored,
+                key=lambda item: (
+                    -item[0],
+                    -self._entries[item[1]][2],
+                    self._entries[item[1]][1],
+                ),
+            )
+        ]
+
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def get_unit_vector(latitude: float, longitude: float) -> Tuple[float, ...]:
+    """Возвращает точку на единичной сфере по координатам в градусах."""
+    phi = math.radians(latitude)
+    lam = math.radians(longitude)
+    return (
+        math.cos(phi) * math.cos(lam),
+        math.cos(phi) * math.sin(lam),
+        math.sin(phi),
+    )
+
+
+def get_chord_distance_km(squared_chord: float) -> float:
+    """Возвращает расстояние по дуге большого круга по квадрату хорды."""
+    return (
+        2 * EARTH_RADIUS_KM * math.asin(min(math.sqrt(squared_chord) / 2, 1))
+    )
+
+
+class CityNearestIndex(ModelIndex):
+    """Индекс ближайших городов по координатам.
+
+    Города хранятся в k-d дереве точек на единичной сфере: порядок
+    расстояний по хорде совпадает с порядком расстояний по поверхности,
+    поэтому поиск корректен у полюсов и линии перемены дат.
+    После изменения записей дерево перестраивается при следующем поиске.
+    """
+
+    fields = ("pk", "city", "latitude", "longitude")
+
+    def build(self, rows):
+        self._points = {}
+        self._tree = None
+        for row in rows:
+            self.add(row)
+
+    def add(self, row):
+        pk, city, latitude, longitude = row
+        self._points[pk] = (city, get_unit_vector(latitude, longitude))
+        self._tree = None
+
+    def remove(self, pk):
+        if self._points.pop(pk, None) is not None:
+            self._tree = None
+
+    def nearest(
+        self, latitude: float, longitude: float, k: int = 1
+    ) -> List[Dict[str, Any]]:
+        """Возвращает k ближайших городов, начиная с самого близкого."""
+        self.ensure_fresh()
+        target = get_unit_vector(latitude, longitude)
+        with self._lock:
+            if self._tree is None:
+                self._tree = self._build_tree(
+                    [(vector, pk) for pk, (_, vector) in self._points.items()],
+                    depth=0,
+                )
+            found = []
+            self._search(self._tree, target, k, found)
+            return [
+                {
+                    "pk": pk,
+                    "city": self._points[pk][0],
+                    "distance_km": round(
+                        get_chord_distance_km(-squared_distance), 3
+                    ),
+                }
+                for squared_distance, pk in sorted(found, reverse=True)
+            ]
+
+    def _build_tree(self, points, depth):
+        if not points:
+            return None
+        axis = depth % 3
+        points.sort(key=lambda point: point[0][axis])
+        median = len(points) // 2
+        vector, pk = points[median]
+        return (
+            vector,
+            pk,
+            axis,
+            self._build_tree(points[:median], depth + 1),
+            self._build_tree(points[median + 1 :], depth + 1),
+        )
+
+    def _search(self, node, target, k, found):
+        """Ищет k ближайших точек, found - куча (-квадрат хорды, pk)."""
+        if node is None:
+            return
+        vector, pk, axis, left, right = node
+        squared_distance = sum(
+            (coordinate - target_coordinate) ** 2
+            for coordinate, target_coordinate in zip(vector, target)
+        )
+        if len(found) < k:
+            heapq.heappush(found, (-squared_distance, pk))
+        elif squared_distance < -found[0][0]:
+            heapq.heapreplace(found, (-squared_distance, pk))
+        difference = target[axis] - vector[axis]
+        near, far = (left, right) if difference < 0 else (right, left)
+        self._search(near, target, k, found)
+        if len(found) < k or difference**2 < -found[0][0]:
+            self._search(far, target, k, found)
+
+
+city_suggest_index = CitySuggestIndex()
+
+city_nearest_index = CityNearestIndex()
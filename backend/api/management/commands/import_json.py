@@ -1,11 +1,19 @@
 import json
+import time
 
 from django.core.management import BaseCommand
 
 from api import models
+from api.importers import UPSERT_CONFLICT_FIELDS, CityImporter
+from core.utils import iter_batches, iter_json_array
 
 EMPTY_ARGS_MESSAGE = '"--{arg}" argument was not provided'
 UNKNOW_MODEL_MESSAGE = "Unknow model {model} was provided"
+PROGRESS_MESSAGE = "Импортировано записей: {total} ({rate:.0f} записей/с)"
+COPY_RESULT_MESSAGE = (
+    "Загружено записей: {loaded}, пропущено некорректных: {invalid}"
+)
+COPY_MODEL_MESSAGE = '"--engine copy" supports only {model} model'
 
 
 class Command(BaseCommand):
@@ -15,6 +23,15 @@ class Command(BaseCommand):
     --path - полный путь до json-файла
     --model - имя модели, в которую импортируем данные
 
+    Необязательные параметры:
+    --stream - потоковое чтение json-массива с постоянным расходом памяти
+    --batch-size - количество записей в одном INSERT
+    --upsert - обновление существующих записей при конфликте
+    по наименованию города (city) или координатам (coords)
+    --engine - способ загрузки: orm (bulk_create) или copy (пакетная
+    проверка в pandas и COPY через временную таблицу в PostgreSQL,
+    только для YandexWeatherModel)
+
     Пример вызова:
     python manage.py import_json --path '/Dev/test.json' --model Model
     При таком вызове произойдет запись данных в модель Model.
@@ -25,6 +42,12 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("--path", type=str)
         parser.add_argument("--model", type=str)
+        parser.add_argument("--stream", action="store_true")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--upsert", choices=UPSERT_CONFLICT_FIELDS.keys(), default=None
+        )
+        parser.add_argument("--engine", choices=("orm", "copy"), default="orm")
 
     def handle(self, *args, **kwargs):
         path = kwargs.get("path")
@@ -36,7 +59,86 @@ class Command(BaseCommand):
         import_model = getattr(models, model_name, None)
         if not import_model:
             raise KeyError(EMPTY_ARGS_MESSAGE.format(arg="model"))
+        if (
+            kwargs["engine"] == "copy"
+            and import_model is not CityImporter.model
+        ):
+            raise KeyError(
+                COPY_MODEL_MESSAGE.format(model=CityImporter.model.__name__)
+            )
         with open(path, "r", encoding="utf-8") as json_file:
-            json_data = json.load(json_file)
-        objects = [import_model(**data) for data in json_data]
-        import_model.objects.bulk_create(objects)
+            json_data = (
+                iter_json_array(json_file)
+                if kwargs["stream"]
+                else json.load(json_file)
+            )
+            if kwargs["engine"] == "copy":
+                self.copy_data(
+                    json_data, kwargs["batch_size"], kwargs["upsert"]
+                )
+            else:
+                self.import_data(
+                    import_model,
+                    json_data,
+                    kwargs["batch_size"],
+                    kwargs["upsert"],
+                )
+
+    def copy_data(self, json_data, batch_size, upsert):
+        """Загружает города через CityImporter."""
+        importer = CityImporter(
+            batch_size=batch_size,
+            upsert=upsert,
+            progress=lambda stats: self.stdout.write(
+                PROGRESS_MESSAGE.format(total=stats.read, rate=stats.rate)
+            ),
+        )
+        stats = importer.load(json_data)
+        self.stdout.write(
+            COPY_RESULT_MESSAGE.format(
+                loaded=stats.loaded, invalid=stats.invalid
+            )
+        )
+
+    def import_data(self, import_model, json_data, batch_size, upsert):
+        """Записывает данные в БД пакетами по batch_size записей."""
+        started = time.perf_counter()
+        total = 0
+        for batch in iter_batches(iter(json_data), batch_size):
+            objects = [import_model(**data) for data in batch]
+            import_model.objects.bulk_create(
+                objects, **self.get_upsert_kwargs(import_model, batch, upsert)
+            )
+            total += len(objects)
+            self.stdout.write(
+                PROGRESS_MESSAGE.format(
+                    total=total,
+                    rate=total / max(time.perf_counter() - started, 1e-9),
+                )
+            )
+
+    def get_upsert_kwargs(self, import_model, batch, upsert):
+        """Возвращает параметры bulk_create для обновления при конфликте."""
+        if not upsert:
+            return {}
+        unique_fields = list(UPSERT_CONFLICT_FIELDS[upsert])
+        update_fields = [
+            field for field in batch[0].keys() if field not in unique_fields
+        ]
+        normalized_field = getattr(
+            import_model, "CITYNAME_NORMALIZED_FIELD", None
+        )
+        if (
+            normalized_field
+            and "city" in update_fields
+            and normalized_field not in unique_fields
+        ):
+            update_fields.append(normalized_field)
+        modified_field = getattr(import_model, "MODIFIED_FIELD", None)
+        if modified_field:
+            update_fields.append(modified_field)
+        return {
+            "update_conflicts": True,
+            "unique_fields": unique_fields,
+            "update_fields": update_fields,
+        }
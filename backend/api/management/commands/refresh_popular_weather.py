@@ -0,0 +1,173 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from api.models import YandexWeatherModel
+from api.services import prune_weather_history, refresh_cached_weather
+from core.exceptions import RequestYandexWeatherError
+from core.quota import background_priority
+from yandex_weather.settings.base import TIMEOUT_YANDEX_UPDATE
+
+logger = logging.getLogger(__name__)
+
+CYCLE_MESSAGE = (
+    "Обновлено городов: {refreshed} ({cities}), ошибок: {failed}, "
+    "бюджет: {used}/{budget} в минуту"
+)
+DECAY_MESSAGE = "Популярность городов уменьшена вдвое"
+PRUNE_MESSAGE = "Удалено устаревших наблюдений погоды: {deleted}"
+
+
+class UpstreamBudget:
+    """Бюджет запросов к сервису yandex на текущую минуту."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.per_minute = per_minute
+        self.used = 0
+        self._window_start = time.monotonic()
+
+    def _roll_window(self) -> None:
+        if time.monotonic() - self._window_start >= 60:
+            self._window_start = time.monotonic()
+            self.used = 0
+
+    @property
+    def remaining(self) -> int:
+        self._roll_window()
+        return max(self.per_minute - self.used, 0)
+
+    def spend(self, count: int) -> None:
+        self._roll_window()
+        self.used += count
+
+
+class Command(BaseCommand):
+    """Команда для упреждающего обновления погоды в популярных городах.
+
+    Периодически выбирает наиболее запрашиваемые города, данные которых
+    устареют в ближайшие --lead секунд, и обновляет их с сервиса yandex
+    с ограничением параллельности и бюджета запросов в минуту.
+    Раз в --prune-interval секунд удаляет историю наблюдений старше
+    WEATHER_HISTORY_RETENTION_DAYS дней.
+
+    Пример вызова:
+    python manage.py refresh_popular_weather --top 200 --budget 60
+    """
+
+    help = "Proactively refresh weather for the most requested cities."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=100)
+        parser.add_argument("--lead", type=int, default=120)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--budget", type=int, default=60)
+        parser.add_argument("--interval", type=int, default=30)
+        parser.add_argument("--decay-interval", type=int, default=3600)
+        parser.add_argument("--min-requests", type=int, default=1)
+        parser.add_argument("--prune-interval", type=int, default=3600)
+        parser.add_argument("--once", action="store_true")
+
+    def handle(self, *args, **kwargs):
+        upstream_budget = UpstreamBudget(kwargs["budget"])
+        decayed_at = pruned_at = time.monotonic()
+        with ThreadPoolExecutor(
+            max_workers=kwargs["concurrency"],
+            thread_name_prefix="popular-refresh",
+        ) as executor:
+            while True:
+                close_old_connections()
+                self.run_cycle(executor, upstream_budget, **kwargs)
+                if kwargs["once"]:
+                    break
+                if time.monotonic() - decayed_at >= kwargs["decay_interval"]:
+                    self.decay_popularity()
+                    decayed_at = time.monotonic()
+                if time.monotonic() - pruned_at >= kwargs["prune_interval"]:
+                    self.prune_history()
+                    pruned_at = time.monotonic()
+                time.sleep(kwargs["interval"])
+
+    def get_expiring_cities(self, limit, lead, min_requests):
+        """Возвращает популярные города, данные которых скоро устареют."""
+        if limit <= 0:
+            return []
+        threshold = timezone.now() - timedelta(
+            minutes=TIMEOUT_YANDEX_UPDATE, seconds=-lead
+        )
+        return list(
+            YandexWeatherModel.objects.without_forecast()
+            .filter(
+                Q(updated_at__isnull=True) | Q(updated_at__lte=threshold),
+                requests_count__gte=min_requests,
+            )
+            .order_by("-requests_count")[:limit]
+        )
+
+    def run_cycle(self, executor, upstream_budget, **kwargs):
+        """Выполняет один цикл обновления, возвращает его статистику."""
+        cities = self.get_expiring_cities(
+            min(kwargs["top"], upstream_budget.remaining),
+            kwargs["lead"],
+            kwargs["min_requests"],
+        )
+        upstream_budget.spend(len(cities))
+        results = list(executor.map(self.refresh, cities))
+        refreshed = [
+            weather.city for weather, ok in zip(cities, results) if ok
+        ]
+        failed = results.count(None)
+        stats = {
+            "refreshed": len(refreshed),
+            "cities": ", ".join(refreshed),
+            "failed": failed,
+            "used": upstream_budget.used,
+            "budget": upstream_budget.per_minute,
+        }
+        self.stdout.write(CYCLE_MESSAGE.format(**stats))
+        logger.info(CYCLE_MESSAGE.format(**stats))
+        return stats
+
+    def refresh(self, weather):
+        """Обновляет данные о погоде в городе в потоке исполнителя.
+
+        Возвращает True, если время обновления данных города изменилось,
+        и None при ошибке обновления.
+        """
+        updated_at = weather.updated_at
+        try:
+            with background_priority():
+                return refresh_cached_weather(weather).updated_at != updated_at
+        except (DatabaseError, RequestYandexWeatherError, ValidationError):
+            logger.warning(
+                "Упреждающее обновление погоды для %s не выполнено",
+                weather.city,
+                exc_info=True,
+            )
+            return None
+        finally:
+            connection.close()
+
+    def decay_popularity(self):
+        """Уменьшает популярность городов, чтобы учитывать свежий спрос."""
+        YandexWeatherModel.objects.filter(requests_count__gt=0).update(
+            requests_count=F("requests_count") / 2
+        )
+        self.stdout.write(DECAY_MESSAGE)
+
+    def prune_history(self):
+        """Удаляет устаревшую историю наблюдений погоды."""
+        try:
+            deleted = prune_weather_history()
+        except DatabaseError:
+            logger.warning(
+                "История наблюдений погоды не очищена", exc_info=True
+            )
+            return
+        self.stdout.write(PRUNE_MESSAGE.format(deleted=deleted))
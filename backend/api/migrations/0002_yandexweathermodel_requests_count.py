@@ -0,0 +1,21 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="yandexweathermodel",
+            name="requests_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Not required. Popularity of city weather requests.",
+                verbose_name="requests_count",
+            ),
+        ),
+    ]
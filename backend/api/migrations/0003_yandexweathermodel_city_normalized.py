@@ -0,0 +1,57 @@
+import re
+
+from django.db import migrations, models
+
+CITY_SEPARATORS_RE = re.compile(r"[\s\-\u2010-\u2015]+")
+
+
+def normalize_city_name(city):
+    """Копия core.utils.normalize_city_name на момент миграции."""
+    return "-".join(
+        CITY_SEPARATORS_RE.split(city.strip().lower().replace("ё", "е"))
+    ).strip("-")
+
+
+def fill_city_normalized(apps, schema_editor):
+    YandexWeatherModel = apps.get_model("api", "YandexWeatherModel")
+    weathers = list(YandexWeatherModel.objects.only("id", "city"))
+    for weather in weathers:
+        weather.city_normalized = normalize_city_name(weather.city)
+    YandexWeatherModel.objects.bulk_update(
+        weathers, ["city_normalized"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0002_yandexweathermodel_requests_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="yandexweathermodel",
+            name="city_normalized",
+            field=models.CharField(
+                default="",
+                editable=False,
+                help_text="Normalized city name for case-insensitive lookup.",
+                max_length=150,
+                verbose_name="city_normalized",
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(
+            fill_city_normalized, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name="yandexweathermodel",
+            name="city_normalized",
+            field=models.CharField(
+                editable=False,
+                help_text="Normalized city name for case-insensitive lookup.",
+                max_length=150,
+                unique=True,
+                verbose_name="city_normalized",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.10 on 2026-10-18 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0003_yandexweathermodel_city_normalized"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="yandexweathermodel",
+            name="forecast",
+            field=models.JSONField(
+                editable=False,
+                help_text="Not required. Compact daily and hourly forecast.",
+                null=True,
+                verbose_name="forecast",
+            ),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.10 on 2026-10-18 13:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0004_yandexweathermodel_forecast"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WeatherObservationModel",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "observed_at",
+                    models.DateTimeField(
+                        help_text="Required. Update datetime from yandex.",
+                        verbose_name="observed_at",
+                    ),
+                ),
+                ("temp", models.FloatField(verbose_name="temp")),
+                (
+                    "pressure_mm",
+                    models.IntegerField(verbose_name="pressure_mm"),
+                ),
+                ("wind_speed", models.FloatField(verbose_name="wind_speed")),
+                (
+                    "city",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="observations",
+                        to="api.yandexweathermodel",
+                        verbose_name="city",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Наблюдение погоды в городе",
+                "verbose_name_plural": "Наблюдения погоды в городах",
+                "indexes": [
+                    models.Index(
+                        fields=["city", "observed_at"],
+                        name="observation_city_time_idx",
+                    ),
+                    models.Index(
+                        fields=["observed_at"], name="observation_time_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
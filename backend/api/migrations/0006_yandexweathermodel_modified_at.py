@@ -0,0 +1,22 @@
+# Generated by Django 4.2.10 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0005_weatherobservationmodel"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="yandexweathermodel",
+            name="modified_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                db_index=True,
+                help_text="Last change of city name or coordinates.",
+                verbose_name="modified_at",
+            ),
+        ),
+    ]
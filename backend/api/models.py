@@ -11,13 +11,34 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from core.models import BaseModel
-from yandex_weather.settings.base import TIMEOUT_YANDEX_UPDATE
+from core.utils import normalize_city_name
+from yandex_weather.settings.base import (
+    TIMEOUT_YANDEX_UPDATE,
+    WEATHER_MAX_STALE,
+    WEATHER_STALE_WHILE_REVALIDATE,
+)
+
+
+class YandexWeatherQuerySet(models.QuerySet):
+    """QuerySet прогнозов погоды с заполнением нормализованного города."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.city_normalized = normalize_city_name(obj.city)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def without_forecast(self):
+        """Не загружает прогноз там, где нужна только текущая погода."""
+        return self.defer("forecast")
 
 
 class YandexWeatherModel(BaseModel):
     """Модель для прогноза погоды."""
 
     CITYNAME_FIELD = "city"
+    CITYNAME_NORMALIZED_FIELD = "city_normalized"
+    MODIFIED_FIELD = "modified_at"
 
     city = models.CharField(
         _("city"),
@@ -26,6 +47,13 @@ class YandexWeatherModel(BaseModel):
         validators=[MinLengthValidator(3)],
         help_text=_("Required. 3-150 characters. Letters only."),
     )
+    city_normalized = models.CharField(
+        _("city_normalized"),
+        unique=True,
+        max_length=150,
+        editable=False,
+        help_text=_("Normalized city name for case-insensitive lookup."),
+    )
     latitude = models.FloatField(
         _("latitude"),
         validators=[MinValueValidator(-90.0), MaxValueValidator(90.0)],
@@ -56,15 +84,68 @@ class YandexWeatherModel(BaseModel):
         null=True,
         help_text=_("Not required. Wind speed in city."),
     )
+    forecast = models.JSONField(
+        _("forecast"),
+        null=True,
+        editable=False,
+        help_text=_("Not required. Compact daily and hourly forecast."),
+    )
+    requests_count = models.PositiveIntegerField(
+        _("requests_count"),
+        default=0,
+        help_text=_("Not required. Popularity of city weather requests."),
+    )
+    modified_at = models.DateTimeField(
+        _("modified_at"),
+        auto_now=True,
+        db_index=True,
+        help_text=_("Last change of city name or coordinates."),
+    )
+
+    objects = YandexWeatherQuerySet.as_manager()
+
+    @staticmethod
+    def get_expires_at(updated_at):
+        """Возвращает момент устаревания данных о погоде."""
+        return updated_at + timedelta(minutes=TIMEOUT_YANDEX_UPDATE)
+
+    @staticmethod
+    def get_stale_until(updated_at):
+        """Возвращает момент, до которого допустимо отдавать данные."""
+        return updated_at + timedelta(
+            minutes=min(
+                TIMEOUT_YANDEX_UPDATE + WEATHER_STALE_WHILE_REVALIDATE,
+                WEATHER_MAX_STALE,
+            )
+        )
 
     @property
     def is_need_update(self):
         return (
             self.updated_at is None
-            or self.updated_at
-            < timezone.now() - timedelta(minutes=TIMEOUT_YANDEX_UPDATE)
+            or self.get_expires_at(self.updated_at) < timezone.now()
         )
 
+    @property
+    def is_servable(self):
+        """Данные не старше WEATHER_MAX_STALE можно отдать пользователю."""
+        return (
+            self.updated_at is not None
+            and self.updated_at + timedelta(minutes=WEATHER_MAX_STALE)
+            >= timezone.now()
+        )
+
+    @property
+    def is_need_sync_update(self):
+        return (
+            self.updated_at is None
+            or self.get_stale_until(self.updated_at) < timezone.now()
+        )
+
+    def save(self, *args, **kwargs):
+        self.city_normalized = normalize_city_name(self.city)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return (
             f"City: {self.city} ("
@@ -83,3 +164,38 @@ class YandexWeatherModel(BaseModel):
                 name="unique_coords",
             )
         ]
+
+
+class WeatherObservationModel(models.Model):
+    """Наблюдение погоды в городе, сохраняется при каждом обновлении."""
+
+    city = models.ForeignKey(
+        YandexWeatherModel,
+        on_delete=models.CASCADE,
+        related_name="observations",
+        verbose_name=_("city"),
+    )
+    observed_at = models.DateTimeField(
+        _("observed_at"),
+        help_text=_("Required. Update datetime from yandex."),
+    )
+    temp = models.FloatField(_("temp"))
+    pressure_mm = models.IntegerField(_("pressure_mm"))
+    wind_speed = models.FloatField(_("wind_speed"))
+
+    def __str__(self):
+        return f"City: {self.city_id} ({self.observed_at}, temp: {self.temp})"
+
+    class Meta:
+        verbose_name = "Наблюдение погоды в городе"
+        verbose_name_plural = "Наблюдения погоды в городах"
+        indexes = [
+            models.Index(
+                fields=["city", "observed_at"],
+                name="observation_city_time_idx",
+            ),
+            models.Index(
+                fields=["observed_at"],
+                name="observation_time_idx",
+            ),
+        ]
@@ -0,0 +1,363 @@
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Lock
+from time import monotonic
+
+from django.db import DatabaseError, connection
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from api.cache import weather_cache
+from api.models import WeatherObservationModel, YandexWeatherModel
+from api.serializers import YandexWeatherSerializer
+from core.exceptions import RequestYandexWeatherError, UpstreamUnavailableError
+from core.metrics import (
+    get_popularity_bucket,
+    refresh_wait_duration,
+    refreshes,
+)
+from core.quota import background_priority, upstream_priority
+from core.singleflight import AsyncSingleFlight, SingleFlight
+from core.utils import (
+    arequest_weather_from_yandex_api,
+    get_weather_cell,
+    normalize_city_name,
+    request_weather_from_yandex_api,
+)
+from yandex_weather.settings.base import (
+    WEATHER_CELL_SIZE,
+    WEATHER_HISTORY_RETENTION_DAYS,
+    WEATHER_POPULARITY_FLUSH_INTERVAL,
+    WEATHER_REFRESH_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+weather_refresh_flight = SingleFlight(wait_metric=refresh_wait_duration)
+
+weather_refresh_async_flight = AsyncSingleFlight(
+    wait_metric=refresh_wait_duration
+)
+
+weather_refresh_executor = ThreadPoolExecutor(
+    max_workers=WEATHER_REFRESH_WORKERS,
+    thread_name_prefix="weather-refresh",
+)
+
+WEATHER_FIELDS = tuple(
+    field
+    for field in YandexWeatherSerializer.Meta.fields
+    if field != "updated_at"
+)
+
+_scheduled_cities = set()
+_scheduled_lock = Lock()
+
+
+def refresh_weather(weather: YandexWeatherModel) -> YandexWeatherModel:
+    """Обновляет данные о погоде в городе с сервиса yandex.
+
+    Города одной ячейки сетки WEATHER_CELL_SIZE обновляются одним
+    запросом к yandex, конкурентные обновления ячейки с одинаковым
+    приоритетом квоты объединяются: запрос пользователя не получает
+    отказ в квоте, выданный фоновому обновлению.
+    """
+    cell = get_weather_cell(weather.latitude, weather.longitude)
+    validated_data, updated_at = weather_refresh_flight.do(
+        (cell, upstream_priority.get()), _refresh_weather_cell, weather, cell
+    )
+    return apply_weather(weather, validated_data, updated_at)
+
+
+def _refresh_weather_cell(weather, cell):
+    current = get_current_weather(
+        YandexWeatherModel.objects.filter(pk=weather.pk).first(),
+        weather.updated_at,
+    )
+    if current is not None:
+        return current
+    # Данные считаются полученными в момент начала запроса к yandex:
+    # запись не затирает данные запроса, начатого позже и завершенного
+    # раньше.
+    updated_at = timezone.now()
+    weather_from_yandex = request_weather_from_yandex_api(
+        latitude=cell[0], longitude=cell[1]
+    )
+    refreshes.inc(bucket=get_popularity_bucket(weather.requests_count))
+    validated_data = {
+        **get_validated_weather(weather, weather_from_yandex),
+        "forecast": weather_from_yandex.get("forecast"),
+    }
+    cell_queryset = get_cell_queryset(weather, cell)
+    cell_queryset.filter(
+        Q(updated_at__isnull=True) | Q(updated_at__lt=updated_at)
+    ).update(updated_at=updated_at, **validated_data)
+    updated = list(
+        cell_queryset.filter(updated_at=updated_at).values_list("pk", "city")
+    )
+    weather_cache.set_many(
+        (city for pk, city in updated if pk != weather.pk),
+        YandexWeatherSerializer(validated_data).data,
+        updated_at,
+    )
+    WeatherObservationModel.objects.bulk_create(
+        get_observations(updated, validated_data, updated_at)
+    )
+    if all(pk != weather.pk for pk, _ in updated):
+        # Город уже обновлен более поздним запросом к yandex.
+        current = get_current_weather(
+            YandexWeatherModel.objects.filter(pk=weather.pk).first(),
+            weather.updated_at,
+        )
+        if current is not None:
+            return current
+    return validated_data, updated_at
+
+
+async def arefresh_weather(weather: YandexWeatherModel) -> YandexWeatherModel:
+    """Асинхронно обновляет данные о погоде в городе с сервиса yandex."""
+    cell = get_weather_cell(weather.latitude, weather.longitude)
+    validated_data, updated_at = await weather_refresh_async_flight.do(
+        (cell, upstream_priority.get()), _arefresh_weather_cell, weather, cell
+    )
+    return apply_weather(weather, validated_data, updated_at)
+
+
+async def _arefresh_weather_cell(weather, cell):
+    current = get_current_weather(
+        await YandexWeatherModel.objects.filter(pk=weather.pk).afirst(),
+        weather.updated_at,
+    )
+    if current is not None:
+        return current
+    updated_at = timezone.now()
+    weather_from_yandex = await arequest_weather_from_yandex_api(
+        latitude=cell[0], longitude=cell[1]
+    )
+    refreshes.inc(bucket=get_popularity_bucket(weather.requests_count))
+    validated_data = {
+        **get_validated_weather(weather, weather_from_yandex),
+        "forecast": weather_from_yandex.get("forecast"),
+    }
+    cell_queryset = get_cell_queryset(weather, cell)
+    await cell_queryset.filter(
+        Q(updated_at__isnull=True) | Q(updated_at__lt=updated_at)
+    ).aupdate(updated_at=updated_at, **validated_data)
+    updated = [
+        row
+        async for row in cell_queryset.filter(
+            updated_at=updated_at
+        ).values_list("pk", "city")
+    ]
+    await weather_cache.aset_many(
+        (city for pk, city in updated if pk != weather.pk),
+        YandexWeatherSerializer(validated_data).data,
+        updated_at,
+    )
+    await WeatherObservationModel.objects.abulk_create(
+        get_observations(updated, validated_data, updated_at)
+    )
+    if all(pk != weather.pk for pk, _ in updated):
+        current = get_current_weather(
+            await YandexWeatherModel.objects.filter(pk=weather.pk).afirst(),
+            weather.updated_at,
+        )
+        if current is not None:
+            return current
+    return validated_data, updated_at
+
+
+def get_observations(updated, validated_data, observed_at):
+    """Возвращает наблюдения погоды для обновленных городов."""
+    return [
+        WeatherObservationModel(
+            city_id=pk,
+            observed_at=observed_at,
+            **{field: validated_data[field] for field in WEATHER_FIELDS},
+        )
+        for pk, _ in updated
+    ]
+
+
+def prune_weather_history(
+    retention_days: int = WEATHER_HISTORY_RETENTION_DAYS,
+    batch_size: int = 10000,
+) -> int:
+    """Удаляет наблюдения старше retention_days дней.
+
+    Удаление выполняется пакетами по batch_size записей, чтобы
+    не держать долгие блокировки. Возвращает количество удаленных записей.
+    """
+    threshold = timezone.now() - timedelta(days=retention_days)
+    total = 0
+    while True:
+        pks = list(
+            WeatherObservationModel.objects.filter(
+                observed_at__lt=threshold
+            ).values_list("pk", flat=True)[:batch_size]
+        )
+        if not pks:
+            return total
+        total += WeatherObservationModel.objects.filter(pk__in=pks).delete()[0]
+
+
+def get_current_weather(weather, read_at):
+    """Возвращает данные о погоде из БД, если их обновили после read_at."""
+    if weather is None or weather.updated_at is None:
+        return None
+    if read_at is not None and weather.updated_at <= read_at:
+        return None
+    return {
+        field: getattr(weather, field)
+        for field in (*WEATHER_FIELDS, "forecast")
+    }, weather.updated_at
+
+
+def get_validated_weather(weather, weather_from_yandex):
+    """Возвращает проверенные сериалайзером данные о погоде."""
+    serializer = YandexWeatherSerializer(weather, data=weather_from_yandex)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def get_cell_queryset(weather, cell):
+    """Возвращает queryset города и его соседей по ячейке сетки."""
+    if WEATHER_CELL_SIZE:
+        half_size = WEATHER_CELL_SIZE / 2
+        in_cell = Q(
+            latitude__gte=cell[0] - half_size,
+            latitude__lt=cell[0] + half_size,
+            longitude__gte=cell[1] - half_size,
+            longitude__lt=cell[1] + half_size,
+        )
+    else:
+        in_cell = Q(latitude=cell[0], longitude=cell[1])
+    return YandexWeatherModel.objects.filter(in_cell | Q(pk=weather.pk))
+
+
+def apply_weather(weather, validated_data, updated_at):
+    """Переносит обновленные данные о погоде в экземпляр модели."""
+    for field, value in validated_data.items():
+        setattr(weather, field, value)
+    weather.updated_at = updated_at
+    return weather
+
+
+def get_servable_weather(weather: YandexWeatherModel) -> YandexWeatherModel:
+    """Возвращает данные о погоде, допустимые для ответа пользователю.
+
+    Устаревшие данные в пределах окна stale-while-revalidate
+    возвращаются без ожидания yandex, а при разомкнутой цепи
+    запросов к yandex или исчерпанной квоте - пока не превышен
+    WEATHER_MAX_STALE.
+    """
+    if weather.is_need_sync_update:
+        try:
+            weather = refresh_weather(weather)
+        except UpstreamUnavailableError:
+            if not weather.is_servable:
+                raise
+    return weather
+
+
+def refresh_cached_weather(weather: YandexWeatherModel) -> YandexWeatherModel:
+    """Обновляет данные о погоде в городе и сохраняет их в кэше."""
+    weather = refresh_weather(weather)
+    weather_cache.set(
+        weather.city,
+        YandexWeatherSerializer(weather).data,
+        weather.updated_at,
+    )
+    return weather
+
+
+def schedule_weather_refresh(city: str) -> bool:
+    """Планирует фоновое обновление данных о погоде в городе."""
+    city_key = normalize_city_name(city)
+    with _scheduled_lock:
+        if city_key in _scheduled_cities:
+            return False
+        _scheduled_cities.add(city_key)
+    weather_refresh_executor.submit(_background_refresh, city_key)
+    return True
+
+
+def _background_refresh(city_key: str) -> None:
+    try:
+        weather = (
+            YandexWeatherModel.objects.without_forecast()
+            .filter(city_normalized=city_key)
+            .first()
+        )
+        if weather is None:
+            return
+        if weather.is_need_update:
+            with background_priority():
+                refresh_cached_weather(weather)
+        else:
+            weather_cache.set(
+                weather.city,
+                YandexWeatherSerializer(weather).data,
+                weather.updated_at,
+            )
+    except (DatabaseError, RequestYandexWeatherError, ValidationError):
+        logger.warning(
+            "Фоновое обновление погоды для %s не выполнено",
+            city_key,
+            exc_info=True,
+        )
+    finally:
+        with _scheduled_lock:
+            _scheduled_cities.discard(city_key)
+        connection.close()
+
+
+class PopularityTracker:
+    """Счетчик запросов погоды по городам.
+
+    Счетчики накапливаются в памяти процесса и периодически
+    добавляются к полю requests_count в БД.
+    """
+
+    def __init__(self, flush_interval: int) -> None:
+        self.flush_interval = flush_interval
+        self._counter = Counter()
+        self._lock = Lock()
+        self._flushed_at = monotonic()
+
+    def hit(self, city: str) -> bool:
+        """Учитывает запрос, возвращает признак необходимости записи."""
+        with self._lock:
+            self._counter[normalize_city_name(city)] += 1
+            if monotonic() - self._flushed_at < self.flush_interval:
+                return False
+            self._flushed_at = monotonic()
+            return True
+
+    def flush(self) -> None:
+        """Записывает накопленные счетчики в БД."""
+        with self._lock:
+            counter, self._counter = self._counter, Counter()
+        try:
+            for city_key, count in counter.items():
+                YandexWeatherModel.objects.filter(
+                    city_normalized=city_key
+                ).update(requests_count=F("requests_count") + count)
+        except DatabaseError:
+            logger.warning(
+                "Счетчики популярности городов не записаны", exc_info=True
+            )
+        finally:
+            connection.close()
+
+
+popularity_tracker = PopularityTracker(WEATHER_POPULARITY_FLUSH_INTERVAL)
+
+
+def record_weather_request(city: str) -> None:
+    """Учитывает запрос погоды для расчета популярности города."""
+    if popularity_tracker.hit(city):
+        weather_refresh_executor.submit(popularity_tracker.flush)
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.indexes import city_nearest_index, city_suggest_index
+from api.models import YandexWeatherModel
+
+CITY_INDEXES = (city_suggest_index, city_nearest_index)
+
+
+@receiver(post_save, sender=YandexWeatherModel)
+def update_city_indexes(sender, instance, **kwargs):
+    """Обновляет индексы городов в памяти процесса."""
+    for index in CITY_INDEXES:
+        index.update(instance)
+
+
+@receiver(post_delete, sender=YandexWeatherModel)
+def delete_from_city_indexes(sender, instance, **kwargs):
+    """Удаляет город из индексов в памяти процесса."""
+    for index in CITY_INDEXES:
+        index.delete(instance)
@@ -1,17 +1,66 @@
 from django.urls import include, path
 
-from api.views import YandexWeatherAPIView
+from api.views import (
+    CitySuggestAPIView,
+    UpstreamStatusAPIView,
+    WeatherHistoryAPIView,
+    YandexForecastAPIView,
+    YandexWeatherAPIView,
+    YandexWeatherAsyncView,
+    YandexWeatherBatchAPIView,
+    YandexWeatherNearestAPIView,
+    get_cached_weather_view,
+)
 
 app_name = "api"
 
 weather_urls = [
     path(
         route="",
-        view=YandexWeatherAPIView.as_view(),
+        view=get_cached_weather_view(YandexWeatherAPIView.as_view()),
         name="weather",
     ),
+    path(
+        route="async/",
+        view=YandexWeatherAsyncView.as_view(),
+        name="weather-async",
+    ),
+    path(
+        route="batch/",
+        view=YandexWeatherBatchAPIView.as_view(),
+        name="weather-batch",
+    ),
+    path(
+        route="forecast/",
+        view=YandexForecastAPIView.as_view(),
+        name="weather-forecast",
+    ),
+    path(
+        route="history/",
+        view=WeatherHistoryAPIView.as_view(),
+        name="weather-history",
+    ),
+    path(
+        route="nearest/",
+        view=YandexWeatherNearestAPIView.as_view(),
+        name="weather-nearest",
+    ),
+]
+
+city_urls = [
+    path(
+        route="suggest/",
+        view=CitySuggestAPIView.as_view(),
+        name="city-suggest",
+    ),
 ]
 
 urlpatterns = [
     path("weather/", include(weather_urls)),
+    path("cities/", include(city_urls)),
+    path(
+        route="status/upstream/",
+        view=UpstreamStatusAPIView.as_view(),
+        name="upstream-status",
+    ),
 ]
@@ -1,14 +1,100 @@
-from django.db import DatabaseError, transaction
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import update_wrapper
+
+from django.db import DatabaseError, connection
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import Trunc
+from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy as _
+from django.views import View
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema
 from rest_framework import serializers, status
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from api.cache import weather_cache
+from api.indexes import city_nearest_index, city_suggest_index
+from api.models import WeatherObservationModel, YandexWeatherModel
 from api.serializers import YandexWeatherSerializer
-from core.exceptions import RequestYandexWeatherError
-from core.utils import request_weather_from_yandex_api
+from api.services import (
+    arefresh_weather,
+    get_servable_weather,
+    record_weather_request,
+    schedule_weather_refresh,
+)
+from core.exceptions import (
+    RequestYandexWeatherError,
+    UpstreamUnavailableError,
+    get_error_payload,
+)
+from core.quota import upstream_quota
+from core.timing import timed
+from core.upstream import yandex_circuit_breaker
+from core.upstream_archive import upstream_archive
+from core.utils import get_forecast_rows, normalize_city_name
 from core.validators import validate_only_letters
+from yandex_weather.settings.base import (
+    CITY_SUGGEST_LIMIT,
+    WEATHER_BATCH_CONCURRENCY,
+    WEATHER_BATCH_MAX_CITIES,
+    WEATHER_NEAREST_MAX_CITIES,
+)
+
+
+def get_weather_age(updated_at):
+    """Возвращает возраст данных о погоде в секундах и признак устаревания."""
+    now = timezone.now()
+    return (
+        int((now - updated_at).total_seconds()),
+        YandexWeatherModel.get_expires_at(updated_at) < now,
+    )
+
+
+def get_weather_headers(updated_at):
+    """Возвращает заголовки с возрастом данных о погоде и HTTP-кэшированием.
+
+    max-age в Cache-Control равен оставшемуся времени до устаревания
+    данных, ETag и Last-Modified вычисляются по updated_at.
+    """
+    age, is_stale = get_weather_age(updated_at)
+    max_age = max(
+        int(
+            (
+                YandexWeatherModel.get_expires_at(updated_at) - timezone.now()
+            ).total_seconds()
+        ),
+        0,
+    )
+    headers = {
+        "X-Weather-Age": str(age),
+        "ETag": f'"{int(updated_at.timestamp() * 1_000_000):x}"',
+        "Last-Modified": http_date(updated_at.timestamp()),
+        "Cache-Control": f"public, max-age={max_age}",
+        "Vary": "Accept",
+    }
+    if is_stale:
+        headers["X-Weather-Stale"] = "true"
+    return headers
+
+
+def get_not_modified_response(request, updated_at, headers):
+    """Возвращает ответ 304, если у клиента актуальная версия данных."""
+    response = get_conditional_response(
+        request,
+        etag=headers["ETag"],
+        last_modified=int(updated_at.timestamp()),
+    )
+    if response is not None:
+        for header, value in headers.items():
+            response[header] = value
+    return response
 
 
 class YandexWeatherAPIView(GenericAPIView):
@@ -16,7 +102,7 @@ class YandexWeatherAPIView(GenericAPIView):
 
     serializer_class = YandexWeatherSerializer
     model = serializer_class.Meta.model
-    lookup_field = "{}__iexact".format(model.CITYNAME_FIELD)
+    lookup_field = model.CITYNAME_NORMALIZED_FIELD
 
     class CityQueryParamsSerializer(serializers.Serializer):
         """Query параметр запроса по наименованию города."""
@@ -26,7 +112,7 @@ class YandexWeatherAPIView(GenericAPIView):
         )
 
     def get_queryset(self):
-        return self.model.objects.select_for_update()
+        return self.model.objects.without_forecast()
 
     @extend_schema(
         parameters=[CityQueryParamsSerializer],
@@ -37,26 +123,531 @@ class YandexWeatherAPIView(GenericAPIView):
             data=request.query_params
         )
         filter_serializer.is_valid(raise_exception=True)
+        city = filter_serializer.validated_data["city"]
+        record_weather_request(city)
         try:
-            with transaction.atomic():
-                self.kwargs[
-                    self.lookup_field
-                ] = filter_serializer.validated_data["city"]
-                weather = self.get_object()
-                if weather.is_need_update:
-                    weather_from_yandex = request_weather_from_yandex_api(
-                        latitude=weather.latitude, longitude=weather.longitude
-                    )
-                    serializer = self.get_serializer(
-                        weather, data=weather_from_yandex
-                    )
-                    serializer.is_valid(raise_exception=True)
-                    serializer.save(updated_at=timezone.now())
-                else:
-                    serializer = self.get_serializer(weather)
-            return Response(
-                data=serializer.data,
-                status=status.HTTP_200_OK,
+            weather = weather_cache.get_or_load(
+                city, lambda: self.load_weather(city)
             )
         except (DatabaseError, RequestYandexWeatherError):
             return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        headers = get_weather_headers(weather["updated_at"])
+        if "X-Weather-Stale" in headers:
+            schedule_weather_refresh(city)
+        not_modified = get_not_modified_response(
+            request, weather["updated_at"], headers
+        )
+        if not_modified is not None:
+            return not_modified
+        return Response(
+            data=weather["data"],
+            status=status.HTTP_200_OK,
+            headers=headers,
+        )
+
+    def load_weather(self, city):
+        """Возвращает данные о погоде из БД, при необходимости обновляя их.
+
+        Запрос к yandex выполняется вне транзакции и без блокировки строки.
+        """
+        self.kwargs[self.lookup_field] = normalize_city_name(city)
+        weather = get_servable_weather(self.get_object())
+        with timed("serialize"):
+            data = self.get_serializer(weather).data
+        return data, weather.updated_at
+
+
+def get_cached_weather_view(api_view):
+    """Возвращает view, отдающее погоду из кэша готовым JSON без DRF.
+
+    Запросы без записи в кэше, с неверными параметрами или запрашивающие
+    HTML-представление передаются в api_view.
+    """
+
+    def view(request, *args, **kwargs):
+        city = request.GET.get("city")
+        if (
+            request.method != "GET"
+            or not city
+            or "text/html" in request.headers.get("Accept", "")
+        ):
+            return api_view(request, *args, **kwargs)
+        entry = weather_cache.get(city, count_miss=False)
+        if entry is None or "body" not in entry:
+            return api_view(request, *args, **kwargs)
+        record_weather_request(city)
+        headers = get_weather_headers(entry["updated_at"])
+        if "X-Weather-Stale" in headers:
+            schedule_weather_refresh(city)
+        return get_not_modified_response(
+            request, entry["updated_at"], headers
+        ) or HttpResponse(
+            entry["body"], content_type="application/json", headers=headers
+        )
+
+    return update_wrapper(view, api_view)
+
+
+class YandexWeatherAsyncView(View):
+    """Асинхронно возвращает текущую погоду с Yandex для выбранного города.
+
+    Формат ответа совпадает с YandexWeatherAPIView.
+    """
+
+    serializer_class = YandexWeatherAPIView.serializer_class
+    model = YandexWeatherAPIView.model
+    lookup_field = YandexWeatherAPIView.lookup_field
+    http_method_names = ["get", "options"]
+
+    async def get(self, request):
+        filter_serializer = YandexWeatherAPIView.CityQueryParamsSerializer(
+            data=request.GET
+        )
+        if not filter_serializer.is_valid():
+            return self.error_response(
+                filter_serializer.errors, status.HTTP_400_BAD_REQUEST
+            )
+        city = filter_serializer.validated_data["city"]
+        record_weather_request(city)
+        try:
+            weather = await weather_cache.aget(city)
+            if weather is None:
+                weather = await self.load_weather(city)
+        except self.model.DoesNotExist:
+            return self.error_response(
+                {"detail": NotFound().detail}, status.HTTP_404_NOT_FOUND
+            )
+        except (DatabaseError, RequestYandexWeatherError):
+            return HttpResponse(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        headers = get_weather_headers(weather["updated_at"])
+        if "X-Weather-Stale" in headers:
+            schedule_weather_refresh(city)
+        return get_not_modified_response(
+            request, weather["updated_at"], headers
+        ) or HttpResponse(
+            weather["body"], content_type="application/json", headers=headers
+        )
+
+    async def load_weather(self, city):
+        """Асинхронно возвращает данные о погоде из БД или с yandex."""
+        weather = await self.model.objects.without_forecast().aget(
+            **{self.lookup_field: normalize_city_name(city)}
+        )
+        if weather.is_need_sync_update:
+            try:
+                weather = await arefresh_weather(weather)
+            except UpstreamUnavailableError:
+                if not weather.is_servable:
+                    raise
+        with timed("serialize"):
+            data = self.serializer_class(weather).data
+        await weather_cache.aset(city, data, weather.updated_at)
+        return weather_cache.make_entry(data, weather.updated_at)
+
+    def error_response(self, error, status_code):
+        return JsonResponse(
+            get_error_payload(error, status_code, self),
+            status=status_code,
+            json_dumps_params={"ensure_ascii": False},
+        )
+
+
+class YandexWeatherBatchAPIView(GenericAPIView):
+    """Возвращает текущую погоду с Yandex для списка городов.
+
+    Города без кэша загружаются из БД одним запросом, устаревшие данные
+    обновляются с yandex параллельно, но не более
+    WEATHER_BATCH_CONCURRENCY запросов одновременно.
+    """
+
+    serializer_class = YandexWeatherSerializer
+    model = serializer_class.Meta.model
+
+    class CitiesSerializer(serializers.Serializer):
+        """Список наименований городов пакетного запроса."""
+
+        cities = serializers.ListField(
+            child=serializers.CharField(),
+            min_length=1,
+            max_length=WEATHER_BATCH_MAX_CITIES,
+        )
+
+    def get_queryset(self):
+        return self.model.objects.without_forecast()
+
+    @extend_schema(
+        request=CitiesSerializer,
+        responses=OpenApiTypes.OBJECT,
+    )
+    def post(self, request):
+        cities_serializer = self.CitiesSerializer(data=request.data)
+        cities_serializer.is_valid(raise_exception=True)
+        cities = list(
+            dict.fromkeys(cities_serializer.validated_data["cities"])
+        )
+        results = {}
+        missed = {}
+        for city in cities:
+            city_serializer = YandexWeatherAPIView.CityQueryParamsSerializer(
+                data={"city": city}
+            )
+            if not city_serializer.is_valid():
+                results[city] = self.get_error_result(
+                    city_serializer.errors, status.HTTP_400_BAD_REQUEST
+                )
+                continue
+            valid_city = city_serializer.validated_data["city"]
+            record_weather_request(valid_city)
+            entry = weather_cache.get(valid_city)
+            if entry is None:
+                missed[city] = valid_city
+            else:
+                results[city] = self.get_weather_result(valid_city, entry)
+        results.update(self.load_weathers(missed))
+        return Response(
+            data={city: results[city] for city in cities},
+            status=status.HTTP_200_OK,
+        )
+
+    def load_weathers(self, cities):
+        """Загружает данные о погоде для городов одним запросом к БД."""
+        if not cities:
+            return {}
+        try:
+            weathers = {
+                weather.city_normalized: weather
+                for weather in self.get_queryset().filter(
+                    **{
+                        f"{self.model.CITYNAME_NORMALIZED_FIELD}__in": [
+                            normalize_city_name(city)
+                            for city in cities.values()
+                        ]
+                    }
+                )
+            }
+        except DatabaseError:
+            return {
+                city: self.get_unavailable_result() for city in cities.keys()
+            }
+        results = {}
+        stale = {}
+        for city, valid_city in cities.items():
+            weather = weathers.get(normalize_city_name(valid_city))
+            if weather is None:
+                results[city] = self.get_error_result(
+                    {"detail": NotFound().detail}, status.HTTP_404_NOT_FOUND
+                )
+            elif weather.is_need_sync_update:
+                stale[city] = weather
+            else:
+                results[city] = self.get_loaded_result(weather)
+        if stale:
+            with ThreadPoolExecutor(
+                max_workers=min(WEATHER_BATCH_CONCURRENCY, len(stale))
+            ) as executor:
+                results.update(
+                    zip(
+                        stale.keys(),
+                        executor.map(self.refresh_in_thread, stale.values()),
+                    )
+                )
+        return results
+
+    def refresh_in_thread(self, weather):
+        try:
+            return self.get_loaded_result(weather)
+        finally:
+            connection.close()
+
+    def get_loaded_result(self, weather):
+        try:
+            weather = get_servable_weather(weather)
+        except (DatabaseError, RequestYandexWeatherError, ValidationError):
+            return self.get_unavailable_result()
+        data = self.get_serializer(weather).data
+        weather_cache.set(weather.city, data, weather.updated_at)
+        return self.get_weather_result(
+            weather.city, {"data": data, "updated_at": weather.updated_at}
+        )
+
+    def get_weather_result(self, city, entry):
+        age, is_stale = get_weather_age(entry["updated_at"])
+        if is_stale:
+            schedule_weather_refresh(city)
+        return {
+            "status_code": status.HTTP_200_OK,
+            "weather": entry["data"],
+            "age": age,
+            "stale": is_stale,
+        }
+
+    def get_error_result(self, error, status_code):
+        return {"status_code": status_code, "error": error}
+
+    def get_unavailable_result(self):
+        return self.get_error_result(
+            {"detail": _("Weather service unavailable.")},
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+
+
+class YandexForecastAPIView(GenericAPIView):
+    """Возвращает прогноз погоды по дням и часам для выбранного города.
+
+    Прогноз сохраняется вместе с текущей погодой и отдается из БД,
+    пока данные о погоде не устарели.
+    """
+
+    serializer_class = YandexWeatherSerializer
+    model = serializer_class.Meta.model
+    lookup_field = model.CITYNAME_NORMALIZED_FIELD
+
+    class ForecastQueryParamsSerializer(
+        YandexWeatherAPIView.CityQueryParamsSerializer
+    ):
+        """Query параметры запроса прогноза погоды."""
+
+        hours = serializers.IntegerField(min_value=0, max_value=48, default=12)
+        days = serializers.IntegerField(min_value=0, max_value=10, default=7)
+
+    def get_queryset(self):
+        return self.model.objects.all()
+
+    @extend_schema(
+        parameters=[ForecastQueryParamsSerializer],
+        responses=OpenApiTypes.OBJECT,
+    )
+    def get(self, request):
+        query_serializer = self.ForecastQueryParamsSerializer(
+            data=request.query_params
+        )
+        query_serializer.is_valid(raise_exception=True)
+        city = query_serializer.validated_data["city"]
+        record_weather_request(city)
+        self.kwargs[self.lookup_field] = normalize_city_name(city)
+        try:
+            weather = get_servable_weather(self.get_object())
+        except (DatabaseError, RequestYandexWeatherError):
+            return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        headers = get_weather_headers(weather.updated_at)
+        if "X-Weather-Stale" in headers:
+            schedule_weather_refresh(city)
+        forecast = weather.forecast or {}
+        current_hour = int(timezone.now().timestamp()) // 3600 * 3600
+        hours = [
+            hour
+            for hour in get_forecast_rows(forecast.get("hours", {}))
+            if hour["hour_ts"] >= current_hour
+        ]
+        return Response(
+            data={
+                "city": weather.city,
+                "days": get_forecast_rows(forecast.get("days", {}))[
+                    : query_serializer.validated_data["days"]
+                ],
+                "hours": hours[: query_serializer.validated_data["hours"]],
+            },
+            status=status.HTTP_200_OK,
+            headers=headers,
+        )
+
+
+class WeatherHistoryAPIView(APIView):
+    """Возвращает историю погоды в городе, агрегированную по часам или дням.
+
+    Минимум, максимум и среднее вычисляются в БД по индексу
+    (city, observed_at).
+    """
+
+    model = WeatherObservationModel
+    default_periods = {"hour": timedelta(days=1), "day": timedelta(days=30)}
+
+    class HistoryQueryParamsSerializer(
+        YandexWeatherAPIView.CityQueryParamsSerializer
+    ):
+        """Query параметры запроса истории погоды."""
+
+        interval = serializers.ChoiceField(
+            choices=("hour", "day"), default="hour"
+        )
+        start = serializers.DateTimeField(required=False)
+        end = serializers.DateTimeField(required=False)
+
+        def validate(self, attrs):
+            attrs.setdefault("end", timezone.now())
+            attrs.setdefault(
+                "start",
+                attrs["end"]
+                - WeatherHistoryAPIView.default_periods[attrs["interval"]],
+            )
+            if attrs["start"] >= attrs["end"]:
+                raise ValidationError(
+                    {"start": _("Start must be earlier than end.")}
+                )
+            return attrs
+
+    @extend_schema(
+        parameters=[HistoryQueryParamsSerializer],
+        responses=OpenApiTypes.OBJECT,
+    )
+    def get(self, request):
+        query_serializer = self.HistoryQueryParamsSerializer(
+            data=request.query_params
+        )
+        query_serializer.is_valid(raise_exception=True)
+        params = query_serializer.validated_data
+        city = (
+            YandexWeatherModel.objects.filter(
+                city_normalized=normalize_city_name(params["city"])
+            )
+            .values_list("pk", "city")
+            .first()
+        )
+        if city is None:
+            raise NotFound()
+        history = (
+            self.model.objects.filter(
+                city_id=city[0],
+                observed_at__gte=params["start"],
+                observed_at__lt=params["end"],
+            )
+            .annotate(time=Trunc("observed_at", params["interval"]))
+            .values("time")
+            .annotate(
+                temp_min=Min("temp"),
+                temp_max=Max("temp"),
+                temp_avg=Avg("temp"),
+                pressure_mm_avg=Avg("pressure_mm"),
+                wind_speed_avg=Avg("wind_speed"),
+                observations=Count("pk"),
+            )
+            .order_by("time")
+        )
+        return Response(
+            data={
+                "city": city[1],
+                "interval": params["interval"],
+                "results": list(history),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class YandexWeatherNearestAPIView(GenericAPIView):
+    """Возвращает погоду в ближайших к координатам городах.
+
+    Ближайшие города ищутся по индексу в памяти процесса,
+    погода загружается так же, как в YandexWeatherAPIView.
+    """
+
+    serializer_class = YandexWeatherSerializer
+    model = serializer_class.Meta.model
+
+    class CoordsQueryParamsSerializer(serializers.Serializer):
+        """Query параметры запроса по координатам."""
+
+        lat = serializers.FloatField(min_value=-90, max_value=90)
+        lon = serializers.FloatField(min_value=-180, max_value=180)
+        k = serializers.IntegerField(
+            min_value=1, max_value=WEATHER_NEAREST_MAX_CITIES, default=1
+        )
+
+    def get_queryset(self):
+        return self.model.objects.without_forecast()
+
+    @extend_schema(
+        parameters=[CoordsQueryParamsSerializer],
+        responses=OpenApiTypes.OBJECT,
+    )
+    def get(self, request):
+        query_serializer = self.CoordsQueryParamsSerializer(
+            data=request.query_params
+        )
+        query_serializer.is_valid(raise_exception=True)
+        nearest = city_nearest_index.nearest(
+            query_serializer.validated_data["lat"],
+            query_serializer.validated_data["lon"],
+            query_serializer.validated_data["k"],
+        )
+        if not nearest:
+            raise NotFound()
+        results = []
+        for city in nearest:
+            record_weather_request(city["city"])
+            try:
+                weather = weather_cache.get_or_load(
+                    city["city"], lambda: self.load_weather(city["pk"])
+                )
+            except self.model.DoesNotExist:
+                continue
+            except (DatabaseError, RequestYandexWeatherError):
+                return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            age, is_stale = get_weather_age(weather["updated_at"])
+            if is_stale:
+                schedule_weather_refresh(city["city"])
+            results.append(
+                {
+                    "city": city["city"],
+                    "distance_km": city["distance_km"],
+                    "weather": weather["data"],
+                    "age": age,
+                    "stale": is_stale,
+                }
+            )
+        return Response(data={"results": results}, status=status.HTTP_200_OK)
+
+    def load_weather(self, pk):
+        """Возвращает данные о погоде из БД, при необходимости обновляя их."""
+        weather = get_servable_weather(self.get_queryset().get(pk=pk))
+        return self.get_serializer(weather).data, weather.updated_at
+
+
+class CitySuggestAPIView(APIView):
+    """Возвращает подсказки наименований городов по началу или с опечаткой.
+
+    Подсказки ищутся по индексу в памяти процесса без запросов к БД.
+    """
+
+    class SuggestQueryParamsSerializer(serializers.Serializer):
+        """Query параметры запроса подсказок городов."""
+
+        q = serializers.CharField(max_length=150)
+        limit = serializers.IntegerField(
+            min_value=1,
+            max_value=CITY_SUGGEST_LIMIT,
+            default=CITY_SUGGEST_LIMIT,
+        )
+
+    @extend_schema(
+        parameters=[SuggestQueryParamsSerializer],
+        responses=OpenApiTypes.OBJECT,
+    )
+    def get(self, request):
+        query_serializer = self.SuggestQueryParamsSerializer(
+            data=request.query_params
+        )
+        query_serializer.is_valid(raise_exception=True)
+        return Response(
+            data={
+                "results": city_suggest_index.suggest(
+                    query_serializer.validated_data["q"],
+                    query_serializer.validated_data["limit"],
+                )
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class UpstreamStatusAPIView(APIView):
+    """Возвращает состояние запросов к Yandex, режим, квоту и кэш погоды."""
+
+    def get(self, request):
+        return Response(
+            data={
+                "circuit_breaker": yandex_circuit_breaker.snapshot(),
+                "quota": upstream_quota.snapshot(),
+                "mode": upstream_archive.mode,
+                "cache": weather_cache.stats(),
+            },
+            status=status.HTTP_200_OK,
+        )
@@ -0,0 +1,157 @@
+import logging
+import time
+from collections import deque
+from threading import Lock
+from typing import Any, Callable, Deque, Dict, Tuple, Type
+
+from core.exceptions import CircuitBreakerOpenError
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Автоматический выключатель запросов к внешнему сервису.
+
+    В состоянии closed учитывает результаты последних window_size
+    вызовов и при доле ошибок не ниже failure_rate_threshold
+    переходит в open. В состоянии open вызовы сразу завершаются
+    ошибкой CircuitBreakerOpenError, по истечении cooldown секунд
+    допускается half_open_max_calls пробных вызовов: успех замыкает
+    цепь, ошибка снова ее размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        window_size: int = 20,
+        minimum_calls: int = 10,
+        cooldown: float = 30.0,
+        half_open_max_calls: int = 1,
+        failure_exceptions: Tuple[Type[BaseException], ...] = (Exception,),
+    ) -> None:
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.cooldown = cooldown
+        self.half_open_max_calls = half_open_max_calls
+        self.failure_exceptions = failure_exceptions
+        self.transitions: Deque[Dict[str, Any]] = deque(maxlen=20)
+        self._results: Deque[bool] = deque(maxlen=window_size)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._get_state()
+
+    def _get_state(self) -> str:
+        if (
+            self._state == self.OPEN
+            and time.monotonic() - self._opened_at >= self.cooldown
+        ):
+            self._transition(self.HALF_OPEN)
+        return self._state
+
+    def _transition(self, state: str) -> None:
+        logger.warning(
+            "Circuit breaker %s: %s -> %s", self.name, self._state, state
+        )
+        self.transitions.append(
+            {"from": self._state, "to": state, "at": time.time()}
+        )
+        self._state = state
+        self._half_open_calls = 0
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+        elif state == self.CLOSED:
+            self._results.clear()
+
+    def _before_call(self) -> None:
+        with self._lock:
+            state = self._get_state()
+            if state == self.OPEN or (
+                state == self.HALF_OPEN
+                and self._half_open_calls >= self.half_open_max_calls
+            ):
+                raise CircuitBreakerOpenError(
+                    f"Цепь запросов к {self.name} разомкнута"
+                )
+            if state == self.HALF_OPEN:
+                self._half_open_calls += 1
+
+    def _on_result(self, is_success: bool) -> None:
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._transition(self.CLOSED if is_success else self.OPEN)
+                return
+            self._results.append(is_success)
+            if (
+                self._state == self.CLOSED
+                and len(self._results) >= self.minimum_calls
+                and self.failure_rate >= self.failure_rate_threshold
+            ):
+                self._transition(self.OPEN)
+
+    def _on_abort(self) -> None:
+        """Освобождает пробный вызов, прерванный неучтенной ошибкой.
+
+        Исключения вне failure_exceptions (в том числе отмена задачи)
+        в окне не учитываются, но пробный вызов ими не подтверждает
+        работоспособность сервиса: цепь снова размыкается.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._transition(self.OPEN)
+
+    @property
+    def failure_rate(self) -> float:
+        if not self._results:
+            return 0.0
+        return self._results.count(False) / len(self._results)
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполняет вызов через выключатель."""
+        self._before_call()
+        try:
+            result = func(*args, **kwargs)
+        except self.failure_exceptions:
+            self._on_result(False)
+            raise
+        except BaseException:
+            self._on_abort()
+            raise
+        self._on_result(True)
+        return result
+
+    async def acall(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполняет асинхронный вызов через выключатель."""
+        self._before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except self.failure_exceptions:
+            self._on_result(False)
+            raise
+        except BaseException:
+            self._on_abort()
+            raise
+        self._on_result(True)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Возвращает состояние выключателя для мониторинга."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self._get_state(),
+                "failure_rate": self.failure_rate,
+                "calls_in_window": len(self._results),
+                "transitions": list(self.transitions),
+            }
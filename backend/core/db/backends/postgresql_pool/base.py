@@ -0,0 +1,34 @@
+from django.db.backends.postgresql import base
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Бэкенд PostgreSQL с пулом соединений процесса.
+
+    Вместо открытия и закрытия соединения берется из пула и возвращается
+    в него. Размер пула и время ожидания соединения задаются ключом
+    POOL настроек БД: {"MAX_SIZE": 10, "TIMEOUT": 5.0}.
+    """
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get("POOL", {})
+        return get_pool(
+            self.alias,
+            connect=self._connect_new,
+            max_size=options.get("MAX_SIZE", 10),
+            timeout=options.get("TIMEOUT", 5.0),
+            health_check=self.settings_dict["CONN_HEALTH_CHECKS"],
+        )
+
+    def get_new_connection(self, conn_params):
+        return self.pool.acquire()
+
+    def _connect_new(self):
+        return super().get_new_connection(self.get_connection_params())
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
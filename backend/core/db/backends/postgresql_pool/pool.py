@@ -0,0 +1,152 @@
+import os
+import time
+from collections import deque
+from threading import Condition, Lock
+from typing import Any, Callable, Dict, List
+
+from psycopg2 import Error, OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class PoolTimeoutError(OperationalError):
+    """Класс ошибки ожидания свободного соединения пула."""
+
+
+class ConnectionPool:
+    """Пул соединений psycopg2 процесса, общий для потоков.
+
+    Открыто не больше max_size соединений. Если свободных соединений
+    нет, а пул заполнен, соединение ожидается не дольше timeout секунд,
+    после чего вызывается PoolTimeoutError. При health_check соединение
+    перед выдачей проверяется запросом SELECT 1.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        max_size: int = 10,
+        timeout: float = 5.0,
+        health_check: bool = True,
+    ) -> None:
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check = health_check
+        self.size = 0
+        self.stats = dict.fromkeys(
+            ("connects", "reuses", "waits", "timeouts", "discards"), 0
+        )
+        self._idle: deque = deque()
+        self._condition = Condition()
+
+    def acquire(self) -> Any:
+        """Возвращает свободное или новое соединение."""
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while not self._idle and self.size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"Нет свободных соединений с БД за {self.timeout} с"
+                    )
+                self.stats["waits"] += 1
+                self._condition.wait(remaining)
+            connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                self.size += 1
+        if connection is not None:
+            if self.is_usable(connection):
+                self.stats["reuses"] += 1
+                return connection
+            # Слот неисправного соединения занимает новое соединение.
+            self._close(connection)
+            self.stats["discards"] += 1
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._condition:
+                self.size -= 1
+                self._condition.notify()
+            raise
+        self.stats["connects"] += 1
+        return connection
+
+    def release(self, connection: Any) -> None:
+        """Возвращает соединение в пул, неисправное закрывает."""
+        if not self._reset(connection):
+            self._close(connection)
+            with self._condition:
+                self.stats["discards"] += 1
+                self.size -= 1
+                self._condition.notify()
+            return
+        with self._condition:
+            self._idle.append(connection)
+            self._condition.notify()
+
+    def close(self) -> None:
+        """Закрывает свободные соединения."""
+        with self._condition:
+            while self._idle:
+                self._close(self._idle.pop())
+                self.size -= 1
+            self._condition.notify_all()
+
+    def is_usable(self, connection: Any) -> bool:
+        if connection.closed:
+            return False
+        if not self.health_check:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except Error:
+            return False
+        return True
+
+    @staticmethod
+    def _reset(connection: Any) -> bool:
+        if connection.closed:
+            return False
+        try:
+            if connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Error:
+            return False
+        return connection.info.transaction_status == TRANSACTION_STATUS_IDLE
+
+    @staticmethod
+    def _close(connection: Any) -> None:
+        try:
+            connection.close()
+        except Error:
+            pass
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = Lock()
+# Соединения родителя после fork не закрываются: закрытие из дочернего
+# процесса завершило бы сеанс, которым продолжает пользоваться родитель.
+_inherited: List[ConnectionPool] = []
+
+
+def get_pool(alias: str, **kwargs) -> ConnectionPool:
+    """Возвращает пул соединений процесса для алиаса БД."""
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = ConnectionPool(**kwargs)
+    return pool
+
+
+def reset_pools() -> None:
+    global _pools_lock
+    _inherited.extend(_pools.values())
+    _pools.clear()
+    _pools_lock = Lock()
+
+
+os.register_at_fork(after_in_child=reset_pools)
@@ -7,6 +7,18 @@ class RequestYandexWeatherError(Exception):
     """Класс ошибки получения информация с сервиса yandex."""
 
 
+class UpstreamUnavailableError(RequestYandexWeatherError):
+    """Класс ошибки, при которой запрос к сервису не выполнялся."""
+
+
+class CircuitBreakerOpenError(UpstreamUnavailableError):
+    """Класс ошибки запроса к сервису при разомкнутой цепи."""
+
+
+class UpstreamQuotaExceededError(UpstreamUnavailableError):
+    """Класс ошибки запроса к сервису при исчерпанной квоте."""
+
+
 def core_exception_handler(exc, context):
     """Обработчик ошибок REST framework."""
     handlers = {
@@ -17,21 +29,27 @@ def core_exception_handler(exc, context):
     }
     response = exception_handler(exc, context)
     if response is not None:
-        response_payload = {
-            "error": response.data,
-            "message": str(response.data),
-            "status_code": response.status_code,
-            "reason": http.client.responses.get(response.status_code),
-            "view_name": context["view"].__class__.__name__,
-            "view_desc": context["view"].__class__.__doc__,
-        }
-        response.data = response_payload
+        response.data = get_error_payload(
+            response.data, response.status_code, context["view"]
+        )
     exception_class = exc.__class__.__name__
     if exception_class in handlers:
         return handlers[exception_class](exc, context, response)
     return response
 
 
+def get_error_payload(error, status_code, view):
+    """Возвращает тело ответа с описанием ошибки."""
+    return {
+        "error": error,
+        "message": str(error),
+        "status_code": status_code,
+        "reason": http.client.responses.get(status_code),
+        "view_name": view.__class__.__name__,
+        "view_desc": view.__class__.__doc__,
+    }
+
+
 def _handle_validation_error(exc, context, response):
     """Обработка ошибок валидации."""
     return response
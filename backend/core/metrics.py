@@ -0,0 +1,388 @@
+import atexit
+import fcntl
+import json
+import os
+import secrets
+import tempfile
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from yandex_weather.settings.base import METRICS_DIR, METRICS_FLUSH_INTERVAL
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Labels = Tuple[str, ...]
+
+ARCHIVE_FILE = "archive.json"
+
+
+class Metric:
+    """Базовый класс метрики с набором меток."""
+
+    type_name = ""
+
+    def __init__(self, registry, name: str, documentation: str, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Labels, object] = {}
+        registry.register(self)
+
+    def get_labels(self, labels: Dict[str, object]) -> Labels:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def format_labels(self, labels: Labels, **extra) -> str:
+        pairs = [*zip(self.labelnames, labels), *extra.items()]
+        if not pairs:
+            return ""
+        return (
+            "{"
+            + ",".join(
+                f'{name}="{value}"'.replace("\n", " ") for name, value in pairs
+            )
+            + "}"
+        )
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик."""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.get_labels(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.ensure_flusher()
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+    def render(self, values) -> Iterator[str]:
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{self.format_labels(labels)} {value}"
+
+
+class Histogram(Metric):
+    """Гистограмма с фиксированными границами корзин.
+
+    Значение для набора меток хранится как список: счетчики корзин
+    (последняя - +Inf), сумма и количество наблюдений.
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, *args, buckets=LATENCY_BUCKETS, **kwargs) -> None:
+        self.buckets = tuple(buckets)
+        super().__init__(*args, **kwargs)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.get_labels(labels)
+        index = bisect_left(self.buckets, value)
+        with self.registry.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * (len(self.buckets) + 3)
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+        self.registry.ensure_flusher()
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return list(value)
+        return [left + right for left, right in zip(total, value)]
+
+    def render(self, values) -> Iterator[str]:
+        for labels, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), state):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket"
+                    f"{self.format_labels(labels, le=bound)} {cumulative}"
+                )
+            yield f"{self.name}_sum{self.format_labels(labels)} {state[-2]}"
+            yield f"{self.name}_count{self.format_labels(labels)} {state[-1]}"
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса в текстовом формате Prometheus.
+
+    Метрики накапливаются в памяти процесса. Если задан каталог
+    METRICS_DIR, фоновый поток процесса раз в METRICS_FLUSH_INTERVAL
+    секунд, а также процесс при завершении записывает значения в файл
+    <pid>-<token>.json, а при выдаче метрик значения из файлов всех
+    процессов суммируются. Токен отличает процесс от завершившегося
+    процесса с тем же pid. Файлы завершившихся процессов переносятся
+    в archive.json, чтобы счетчики не уменьшались, а файлы
+    не накапливались.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = METRICS_DIR,
+        flush_interval: float = METRICS_FLUSH_INTERVAL,
+    ) -> None:
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = Lock()
+        self.metrics: Dict[str, Metric] = {}
+        self.derived: List[Tuple[str, str, Callable]] = []
+        self._token = secrets.token_hex(4)
+        self._flusher_pid: Optional[int] = None
+        self._flusher_lock = Lock()
+        self._stopped = Event()
+
+    def reset(self) -> None:
+        """Сбрасывает значения метрик, например в дочернем процессе."""
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.values = {}
+        self._token = secrets.token_hex(4)
+        # Поток записи родителя не переживает fork, он запускается
+        # в дочернем процессе при первом изменении метрик.
+        self._flusher_pid = None
+        self._flusher_lock = Lock()
+        self._stopped = Event()
+
+    @property
+    def file_name(self) -> str:
+        return f"{os.getpid()}-{self._token}.json"
+
+    def register(self, metric: Metric) -> None:
+        self.metrics[metric.name] = metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return Counter(self, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), **kwargs):
+        return Histogram(self, name, documentation, labelnames, **kwargs)
+
+    def gauge_from(self, name: str, documentation: str, function) -> None:
+        """Добавляет вычисляемую метрику по суммарным значениям."""
+        self.derived.append((name, documentation, function))
+
+    def ensure_flusher(self) -> None:
+        """Запускает фоновую запись метрик процесса в METRICS_DIR."""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._flusher_lock:
+            if self._flusher_pid == os.getpid():
+                return
+            Thread(
+                target=self._flush_periodically,
+                args=(self._stopped,),
+                name="metrics-flush",
+                daemon=True,
+            ).start()
+            self._flusher_pid = os.getpid()
+
+    def stop(self) -> None:
+        """Останавливает фоновую запись метрик."""
+        self._stopped.set()
+
+    def _flush_periodically(self, stopped: Event) -> None:
+        while not stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def snapshot(self) -> Dict[str, Dict[Labels, object]]:
+        with self.lock:
+            return {
+                name: {
+                    labels: list(value) if isinstance(value, list) else value
+                    for labels, value in metric.values.items()
+                }
+                for name, metric in self.metrics.items()
+            }
+
+    def flush(self) -> None:
+        """Записывает значения метрик процесса в файл каталога METRICS_DIR."""
+        self._write(self.file_name, self.snapshot())
+
+    def flush_on_exit(self) -> None:
+        self.stop()
+        if self.directory:
+            self.flush()
+
+    def collect(self) -> Dict[str, Dict[Labels, object]]:
+        """Возвращает значения метрик, суммированные по всем процессам."""
+        if not self.directory:
+            return self.snapshot()
+        self.flush()
+        self.archive_dead()
+        totals: Dict[str, Dict[Labels, object]] = {}
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(".json"):
+                self._merge_file(totals, file_name)
+        return totals
+
+    def archive_dead(self) -> None:
+        """Переносит значения завершившихся процессов в archive.json."""
+        if not any(map(self._is_dead, os.listdir(self.directory))):
+            return
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = [
+                file_name
+                for file_name in os.listdir(self.directory)
+                if self._is_dead(file_name)
+            ]
+            totals: Dict[str, Dict[Labels, object]] = {}
+            for file_name in (ARCHIVE_FILE, *dead):
+                self._merge_file(totals, file_name)
+            self._write(ARCHIVE_FILE, totals)
+            for file_name in dead:
+                os.remove(os.path.join(self.directory, file_name))
+
+    def _is_dead(self, file_name: str) -> bool:
+        """Проверяет, что файл метрик записан завершившимся процессом."""
+        pid = file_name.split("-", 1)[0]
+        if not file_name.endswith(".json") or not pid.isdigit():
+            return False
+        if int(pid) == os.getpid():
+            return file_name != self.file_name
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def _write(self, file_name: str, values) -> None:
+        data = {
+            name: [[list(labels), value] for labels, value in items.items()]
+            for name, items in values.items()
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.directory, suffix=".tmp", delete=False
+        ) as file:
+            json.dump(data, file)
+        os.replace(file.name, os.path.join(self.directory, file_name))
+
+    def _merge_file(self, totals, file_name: str) -> None:
+        try:
+            with open(os.path.join(self.directory, file_name)) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        for name, values in data.items():
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue
+            merged = totals.setdefault(name, {})
+            for labels, value in values:
+                merged[tuple(labels)] = metric.merge(
+                    merged.get(tuple(labels)), value
+                )
+
+    def render(self) -> str:
+        """Возвращает метрики в текстовом формате Prometheus."""
+        values = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type_name}")
+            lines.extend(metric.render(values.get(name, {})))
+        for name, documentation, function in self.derived:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {function(values)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Дочерний процесс воркера не должен повторно учитывать значения родителя.
+os.register_at_fork(after_in_child=registry.reset)
+
+atexit.register(registry.flush_on_exit)
+
+http_request_duration = registry.histogram(
+    "weather_http_request_duration_seconds",
+    "Request processing time by URL name and status code.",
+    ("view", "status"),
+)
+http_request_queries = registry.histogram(
+    "weather_http_request_db_queries",
+    "Database queries per request by URL name.",
+    ("view",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+upstream_request_duration = registry.histogram(
+    "weather_upstream_request_duration_seconds",
+    "Yandex weather request time including retries.",
+)
+upstream_errors = registry.counter(
+    "weather_upstream_errors_total",
+    "Failed Yandex weather requests by error type.",
+    ("error",),
+)
+refresh_wait_duration = registry.histogram(
+    "weather_refresh_wait_seconds",
+    "Time spent waiting for a concurrent refresh of the same grid cell.",
+)
+refreshes = registry.counter(
+    "weather_refreshes_total",
+    "Weather refreshes from Yandex by city popularity bucket.",
+    ("bucket",),
+)
+cache_requests = registry.counter(
+    "weather_cache_requests_total",
+    "Weather cache lookups by result.",
+    ("result",),
+)
+
+
+def get_cache_hit_ratio(values) -> float:
+    hits = values.get(cache_requests.name, {}).get(("hit",), 0)
+    misses = values.get(cache_requests.name, {}).get(("miss",), 0)
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+registry.gauge_from(
+    "weather_cache_hit_ratio",
+    "Share of weather cache lookups served from the cache.",
+    get_cache_hit_ratio,
+)
+
+
+def get_popularity_bucket(requests_count: int) -> str:
+    """Возвращает корзину популярности города: 0, 1+, 10+, 100+ и т.д."""
+    if requests_count <= 0:
+        return "0"
+    return f"{10 ** (len(str(requests_count)) - 1)}+"
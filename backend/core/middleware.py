@@ -0,0 +1,223 @@
+import logging
+import os
+import random
+import threading
+import time
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from core.metrics import http_request_duration, http_request_queries
+from core.profiler import profiler
+from core.timing import (
+    get_server_timing,
+    request_queries,
+    request_timings,
+    timed,
+)
+from yandex_weather.settings.base import (
+    PROFILER_SAMPLE_RATE,
+    PROFILER_TOKEN,
+    SERVER_TIMING_ENABLED,
+    SLOW_REQUEST_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+REQUEST_MESSAGE = "Запрос {method} {path}: {timing}"
+
+SLOW_REQUEST_MESSAGE = "Медленный запрос {method} {path}: {timing}"
+
+
+def reset_request_context(timings_token, queries_token):
+    request_timings.reset(timings_token)
+    request_queries.reset(queries_token)
+
+
+def get_view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None or not match.url_name:
+        return "unknown"
+    return match.view_name
+
+
+def count_query(execute, sql, params, many, context):
+    """Учитывает запрос к БД в счетчике и времени текущего запроса."""
+    queries = request_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    queries[0] += 1
+    with timed("db"):
+        return execute(sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+# Запросы асинхронных представлений выполняются в потоках sync_to_async,
+# поэтому счетчик подключается к каждому соединению, а текущий запрос
+# определяется по контекстным переменным.
+connection_created.connect(install_query_counter)
+
+
+class MetricsMiddleware:
+    """Учитывает время обработки запроса и количество запросов к БД.
+
+    Время этапов (БД, yandex, сериализация, ожидание блокировок)
+    отдается в заголовке Server-Timing и пишется в лог: для медленных
+    запросов - с уровнем WARNING, для остальных - DEBUG.
+    Работает и в синхронной, и в асинхронной цепочке middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            install_query_counter(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, queries = {}, [0]
+        tokens = request_timings.set(timings), request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_request_context(*tokens)
+        total = time.perf_counter() - started
+        self.process_response(request, response, timings, queries[0], total)
+        return response
+
+    async def __acall__(self, request):
+        timings, queries = {}, [0]
+        tokens = request_timings.set(timings), request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_request_context(*tokens)
+        total = time.perf_counter() - started
+        self.process_response(request, response, timings, queries[0], total)
+        return response
+
+    def process_response(self, request, response, timings, queries, total):
+        """Записывает метрики, заголовок Server-Timing и сообщение в лог."""
+        view = get_view_name(request)
+        http_request_duration.observe(
+            total, view=view, status=response.status_code
+        )
+        http_request_queries.observe(queries, view=view)
+        timing = get_server_timing(timings, queries, total)
+        if SERVER_TIMING_ENABLED:
+            response["Server-Timing"] = timing
+        level, message = (
+            (logging.WARNING, SLOW_REQUEST_MESSAGE)
+            if total >= SLOW_REQUEST_SECONDS
+            else (logging.DEBUG, REQUEST_MESSAGE)
+        )
+        if logger.isEnabledFor(level):
+            logger.log(
+                level,
+                message.format(
+                    method=request.method, path=request.path, timing=timing
+                ),
+                extra={
+                    "timings": {
+                        "view": view,
+                        "status": response.status_code,
+                        "queries": queries,
+                        "total_ms": round(total * 1000, 2),
+                        **{
+                            f"{name}_ms": round(value * 1000, 2)
+                            for name, value in timings.items()
+                        },
+                    }
+                },
+            )
+
+
+class SamplingProfilerMiddleware:
+    """Профилирует долю запросов и запросы с заголовком X-Profile.
+
+    Для запросов с заголовком стеки сохраняются всегда, имя файла
+    возвращается в заголовке X-Profile-File, для остальных - только
+    при длительности от SLOW_REQUEST_SECONDS. В асинхронной цепочке
+    снимаются стеки потока цикла событий, в них попадают и другие
+    выполняемые в нем запросы.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        is_requested = self.is_requested(request)
+        if not is_requested and not self.is_sampled():
+            return self.get_response(request)
+        key = profiler.start(threading.get_ident())
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = profiler.stop(key)
+        elapsed = time.perf_counter() - started
+        if is_requested or elapsed >= SLOW_REQUEST_SECONDS:
+            self.dump(request, response, stacks, elapsed, is_requested)
+        return response
+
+    async def __acall__(self, request):
+        is_requested = self.is_requested(request)
+        if not is_requested and not self.is_sampled():
+            return await self.get_response(request)
+        key = profiler.start(threading.get_ident())
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stacks = profiler.stop(key)
+        elapsed = time.perf_counter() - started
+        if is_requested or elapsed >= SLOW_REQUEST_SECONDS:
+            await sync_to_async(self.dump, thread_sensitive=False)(
+                request, response, stacks, elapsed, is_requested
+            )
+        return response
+
+    @staticmethod
+    def is_requested(request):
+        return bool(PROFILER_TOKEN) and (
+            request.headers.get("X-Profile") == PROFILER_TOKEN
+        )
+
+    @staticmethod
+    def is_sampled():
+        return bool(PROFILER_SAMPLE_RATE) and (
+            random.random() < PROFILER_SAMPLE_RATE
+        )
+
+    @staticmethod
+    def dump(request, response, stacks, elapsed, is_requested):
+        path = profiler.dump(
+            stacks,
+            f"{get_view_name(request).replace(':', '-')}"
+            f"-{elapsed * 1000:.0f}ms",
+        )
+        if is_requested:
+            response["X-Profile-File"] = os.path.basename(path)
@@ -0,0 +1,97 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from yandex_weather.settings.base import PROFILER_DIR, PROFILER_INTERVAL
+
+
+def get_folded_stack(frame) -> str:
+    """Возвращает стек кадра в формате folded, начиная с корня."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(
+            f"{frame.f_globals.get('__name__', '?')}.{code.co_qualname}"
+        )
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """Семплирующий профилировщик потоков, обрабатывающих запросы.
+
+    Фоновый поток раз в interval секунд снимает стеки зарегистрированных
+    потоков через sys._current_frames() и считает одинаковые стеки.
+    Результат сохраняется в формате folded (flamegraph.pl, speedscope).
+    Поток работает, только пока есть профилируемые запросы. Один поток
+    может профилироваться несколькими запросами одновременно (запросы
+    асинхронных представлений в потоке цикла событий).
+    """
+
+    def __init__(
+        self,
+        interval: float = PROFILER_INTERVAL,
+        directory: str = PROFILER_DIR,
+    ) -> None:
+        self.interval = interval
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._stacks: Dict[object, Tuple[int, Counter]] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def reset(self) -> None:
+        """Сбрасывает состояние, унаследованное дочерним процессом."""
+        self._lock = threading.Lock()
+        self._stacks = {}
+        self._thread = None
+
+    def start(self, thread_id: int) -> object:
+        """Начинает профилирование потока thread_id, возвращает ключ."""
+        key = object()
+        with self._lock:
+            self._stacks[key] = (thread_id, Counter())
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="sampling-profiler", daemon=True
+                )
+                self._thread.start()
+        return key
+
+    def stop(self, key: object) -> Counter:
+        """Завершает профилирование по ключу и возвращает стеки потока."""
+        with self._lock:
+            return self._stacks.pop(key, (None, Counter()))[1]
+
+    def dump(self, stacks: Counter, name: str) -> str:
+        """Записывает стеки в файл каталога directory, возвращает путь."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(
+            self.directory,
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{name}.folded",
+        )
+        with open(path, "w") as file:
+            for stack, count in stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        return path
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._stacks:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, stacks in self._stacks.values():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[get_folded_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+profiler = SamplingProfiler()
+
+os.register_at_fork(after_in_child=profiler.reset)
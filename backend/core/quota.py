@@ -0,0 +1,145 @@
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Dict, Iterator, Optional
+
+from core.timing import timed
+from yandex_weather.settings.base import (
+    YANDEX_QUOTA_BACKGROUND_RESERVE,
+    YANDEX_QUOTA_FILE,
+    YANDEX_QUOTA_PER_DAY,
+    YANDEX_QUOTA_PER_SECOND,
+)
+
+USER_PRIORITY = "user"
+BACKGROUND_PRIORITY = "background"
+
+upstream_priority: ContextVar[str] = ContextVar(
+    "upstream_priority", default=USER_PRIORITY
+)
+
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """Помечает запросы к сервису yandex внутри блока как фоновые."""
+    token = upstream_priority.set(BACKGROUND_PRIORITY)
+    try:
+        yield
+    finally:
+        upstream_priority.reset(token)
+
+
+class UpstreamQuota:
+    """Квота запросов к сервису yandex, общая для процессов на хосте.
+
+    Секундный лимит - token bucket емкостью per_second токенов,
+    суточный - счетчик запросов за текущие сутки UTC. Состояние хранится
+    в файле path и изменяется под блокировкой flock. Фоновые запросы
+    не используют долю background_reserve каждого лимита.
+    """
+
+    def __init__(
+        self,
+        path: str = YANDEX_QUOTA_FILE,
+        per_second: float = YANDEX_QUOTA_PER_SECOND,
+        per_day: int = YANDEX_QUOTA_PER_DAY,
+        background_reserve: float = YANDEX_QUOTA_BACKGROUND_RESERVE,
+    ) -> None:
+        self.path = path
+        self.per_second = per_second
+        self.per_day = per_day
+        self.background_reserve = background_reserve
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+        self._lock = Lock()
+
+    @property
+    def is_enabled(self) -> bool:
+        return bool(self.per_second or self.per_day)
+
+    def _get_fd(self) -> int:
+        # Блокировка flock относится к открытому файлу, поэтому
+        # после fork файл открывается заново.
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        return self._fd
+
+    @contextmanager
+    def _locked_state(self) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            fd = self._get_fd()
+            with timed("lock"):
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                raw = os.pread(fd, 4096, 0)
+                try:
+                    state = json.loads(raw) if raw else {}
+                except ValueError:
+                    state = {}
+                self._refill(state, time.time())
+                yield state
+                data = json.dumps(state).encode()
+                os.ftruncate(fd, 0)
+                os.pwrite(fd, data, 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _refill(self, state: Dict[str, Any], now: float) -> None:
+        day = time.strftime("%Y-%m-%d", time.gmtime(now))
+        if state.get("day") != day:
+            state["day"] = day
+            state["day_used"] = 0
+        elapsed = max(now - state.get("updated_at", now), 0)
+        state["tokens"] = min(
+            self.per_second,
+            state.get("tokens", self.per_second) + elapsed * self.per_second,
+        )
+        state["updated_at"] = now
+
+    def acquire(self, priority: Optional[str] = None) -> bool:
+        """Списывает один запрос, возвращает False при исчерпанной квоте."""
+        if not self.is_enabled:
+            return True
+        priority = priority or upstream_priority.get()
+        reserve = (
+            self.background_reserve if priority == BACKGROUND_PRIORITY else 0.0
+        )
+        with self._locked_state() as state:
+            if self.per_second and (
+                state["tokens"] < 1 + reserve * self.per_second
+            ):
+                return False
+            if self.per_day and (
+                state["day_used"] >= self.per_day * (1 - reserve)
+            ):
+                return False
+            state["tokens"] -= 1 if self.per_second else 0
+            state["day_used"] += 1
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Возвращает лимиты и остаток квоты."""
+        if not self.is_enabled:
+            return {"enabled": False}
+        with self._locked_state() as state:
+            return {
+                "enabled": True,
+                "per_second": self.per_second,
+                "per_second_remaining": int(state["tokens"]),
+                "per_day": self.per_day,
+                "per_day_remaining": (
+                    max(self.per_day - state["day_used"], 0)
+                    if self.per_day
+                    else None
+                ),
+                "day_used": state["day_used"],
+                "background_reserve": self.background_reserve,
+            }
+
+
+upstream_quota = UpstreamQuota()
@@ -0,0 +1,11 @@
+from rest_framework.renderers import JSONRenderer
+
+from core.timing import timed
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer, учитывающий время рендеринга в этапе serialize."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed("serialize"):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,89 @@
+import asyncio
+from concurrent.futures import Future
+from functools import partial
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable
+
+from core.timing import timed
+
+
+class SingleFlight:
+    """Объединяет конкурентные вызовы с одинаковым ключом в один.
+
+    Первый вызов выполняет функцию, остальные ожидают его результат.
+    Время ожидания учитывается в гистограмме wait_metric, если она задана,
+    и в этапе lock текущего запроса.
+    """
+
+    def __init__(self, wait_metric=None) -> None:
+        self._lock = Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.wait_metric = wait_metric
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self._calls[key] = Future()
+        if not is_leader:
+            with timed("lock"):
+                if self.wait_metric is None:
+                    return future.result()
+                with self.wait_metric.time():
+                    return future.result()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        """Возвращает количество выполняемых вызовов."""
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """Асинхронный аналог SingleFlight в пределах цикла событий.
+
+    Функция выполняется отдельной задачей: отмена вызова, запустившего
+    ее, не отменяет выполнение, и ожидающие вызовы получают результат.
+    """
+
+    def __init__(self, wait_metric=None) -> None:
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.wait_metric = wait_metric
+
+    async def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+        task = self._calls.get(call_key)
+        if task is None:
+            task = self._calls[call_key] = asyncio.ensure_future(
+                func(*args, **kwargs)
+            )
+            task.add_done_callback(partial(self._on_done, call_key))
+            return await asyncio.shield(task)
+        with timed("lock"):
+            if self.wait_metric is None:
+                return await asyncio.shield(task)
+            with self.wait_metric.time():
+                return await asyncio.shield(task)
+
+    def _on_done(self, call_key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(call_key) is task:
+            del self._calls[call_key]
+        if not task.cancelled():
+            # Исключение получают вызывающие, ожидающих может не быть.
+            task.exception()
+
+    def in_flight(self) -> int:
+        """Возвращает количество выполняемых вызовов."""
+        return len(self._calls)
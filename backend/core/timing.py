@@ -0,0 +1,49 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+# Время этапов обработки текущего запроса в секундах, None вне запроса.
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "request_timings", default=None
+)
+
+# Счетчик запросов к БД текущего запроса, None вне запроса.
+request_queries: ContextVar[Optional[List[int]]] = ContextVar(
+    "request_queries", default=None
+)
+
+TIMING_DESCRIPTIONS = {
+    "db": "Database",
+    "upstream": "Yandex weather",
+    "serialize": "Serialization",
+    "lock": "Lock wait",
+}
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Добавляет время выполнения блока к этапу name текущего запроса."""
+    timings = request_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def get_server_timing(
+    timings: Dict[str, float], queries: int, total: float
+) -> str:
+    """Возвращает значение заголовка Server-Timing."""
+    metrics = [
+        f'{name};dur={timings[name] * 1000:.2f};desc="{description}"'
+        for name, description in TIMING_DESCRIPTIONS.items()
+        if name in timings
+    ]
+    metrics.append(f'queries;desc="{queries}"')
+    metrics.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(metrics)
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import random
+import time
+from importlib.util import find_spec
+from threading import Lock
+from typing import Optional
+from weakref import WeakKeyDictionary
+
+from httpx import (
+    AsyncClient,
+    Client,
+    Limits,
+    Response,
+    Timeout,
+    TransportError,
+)
+
+from asgiref.sync import sync_to_async
+from core.circuit_breaker import CircuitBreaker
+from core.exceptions import RequestYandexWeatherError
+from core.quota import UpstreamQuota, upstream_quota
+from yandex_weather.settings.base import (
+    YANDEX_BREAKER_COOLDOWN,
+    YANDEX_BREAKER_FAILURE_RATE,
+    YANDEX_BREAKER_HALF_OPEN_CALLS,
+    YANDEX_BREAKER_MINIMUM_CALLS,
+    YANDEX_BREAKER_WINDOW_SIZE,
+    YANDEX_HTTP2,
+    YANDEX_HTTP_BACKOFF,
+    YANDEX_HTTP_BACKOFF_MAX,
+    YANDEX_HTTP_CONNECT_TIMEOUT,
+    YANDEX_HTTP_KEEPALIVE_EXPIRY,
+    YANDEX_HTTP_MAX_CONNECTIONS,
+    YANDEX_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    YANDEX_HTTP_READ_TIMEOUT,
+    YANDEX_HTTP_RETRIES,
+)
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def get_upstream_limits() -> Limits:
+    return Limits(
+        max_connections=YANDEX_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=YANDEX_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=YANDEX_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_upstream_timeout() -> Timeout:
+    return Timeout(
+        YANDEX_HTTP_READ_TIMEOUT,
+        connect=YANDEX_HTTP_CONNECT_TIMEOUT,
+        read=YANDEX_HTTP_READ_TIMEOUT,
+    )
+
+
+def is_http2_enabled() -> bool:
+    """HTTP/2 используется, если он включен и установлен пакет h2."""
+    return YANDEX_HTTP2 and find_spec("h2") is not None
+
+
+def get_backoff(attempt: int) -> float:
+    """Возвращает задержку перед повтором запроса (full jitter)."""
+    return random.uniform(
+        0, min(YANDEX_HTTP_BACKOFF_MAX, YANDEX_HTTP_BACKOFF * 2**attempt)
+    )
+
+
+class UpstreamClient:
+    """HTTP-клиент процесса с пулом соединений к сервису yandex.
+
+    Клиент создается лениво и пересоздается в дочернем процессе
+    после fork, чтобы воркеры gunicorn не делили сокеты родителя.
+    Каждый повтор запроса списывается из квоты quota, без токена
+    возвращается последний ответ или вызывается последняя ошибка.
+    """
+
+    def __init__(
+        self,
+        retries: int = YANDEX_HTTP_RETRIES,
+        quota: Optional[UpstreamQuota] = None,
+    ) -> None:
+        self.retries = retries
+        self.quota = quota
+        self._client: Optional[Client] = None
+        self._pid: Optional[int] = None
+        self._lock = Lock()
+
+    @property
+    def client(self) -> Client:
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self._client = Client(
+                        http2=is_http2_enabled(),
+                        limits=get_upstream_limits(),
+                        timeout=get_upstream_timeout(),
+                    )
+                    self._pid = os.getpid()
+        return self._client
+
+    def get(self, url: str, **kwargs) -> Response:
+        """Выполняет GET запрос с повторами при временных ошибках."""
+        attempt = 0
+        while True:
+            try:
+                response = self.client.get(url, **kwargs)
+            except TransportError:
+                if not self.can_retry(attempt):
+                    raise
+            else:
+                if (
+                    response.status_code not in RETRY_STATUS_CODES
+                    or not self.can_retry(attempt)
+                ):
+                    return response
+                response.close()
+            time.sleep(get_backoff(attempt))
+            attempt += 1
+
+    def can_retry(self, attempt: int) -> bool:
+        """Списывает повтор из квоты, если попытки не исчерпаны."""
+        return attempt < self.retries and (
+            self.quota is None or self.quota.acquire()
+        )
+
+    def reset(self) -> None:
+        """Сбрасывает унаследованный после fork клиент без закрытия."""
+        self._client = None
+        self._pid = None
+        self._lock = Lock()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._pid = None
+
+
+class AsyncUpstreamClient:
+    """Асинхронный HTTP-клиент с пулом соединений к сервису yandex.
+
+    httpx.AsyncClient привязан к циклу событий, поэтому
+    для каждого цикла событий создается свой клиент.
+    """
+
+    def __init__(
+        self,
+        retries: int = YANDEX_HTTP_RETRIES,
+        quota: Optional[UpstreamQuota] = None,
+    ) -> None:
+        self.retries = retries
+        self.quota = quota
+        self._clients: WeakKeyDictionary = WeakKeyDictionary()
+
+    @property
+    def client(self) -> AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = AsyncClient(
+                http2=is_http2_enabled(),
+                limits=get_upstream_limits(),
+                timeout=get_upstream_timeout(),
+            )
+        return client
+
+    async def get(self, url: str, **kwargs) -> Response:
+        """Выполняет GET запрос с повторами при временных ошибках."""
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.get(url, **kwargs)
+            except TransportError:
+                if not await self.can_retry(attempt):
+                    raise
+            else:
+                if (
+                    response.status_code not in RETRY_STATUS_CODES
+                    or not await self.can_retry(attempt)
+                ):
+                    return response
+                await response.aclose()
+            await asyncio.sleep(get_backoff(attempt))
+            attempt += 1
+
+    async def can_retry(self, attempt: int) -> bool:
+        """Списывает повтор из квоты, если попытки не исчерпаны."""
+        if attempt >= self.retries:
+            return False
+        if self.quota is None or not self.quota.is_enabled:
+            return True
+        # flock и чтение файла квоты блокируют поток.
+        return await sync_to_async(
+            self.quota.acquire, thread_sensitive=False
+        )()
+
+    def reset(self) -> None:
+        """Сбрасывает унаследованные после fork клиенты без закрытия."""
+        self._clients = WeakKeyDictionary()
+
+    async def aclose(self) -> None:
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+upstream_client = UpstreamClient(quota=upstream_quota)
+
+async_upstream_client = AsyncUpstreamClient(quota=upstream_quota)
+
+os.register_at_fork(after_in_child=upstream_client.reset)
+
+os.register_at_fork(after_in_child=async_upstream_client.reset)
+
+yandex_circuit_breaker = CircuitBreaker(
+    "yandex",
+    failure_rate_threshold=YANDEX_BREAKER_FAILURE_RATE,
+    window_size=YANDEX_BREAKER_WINDOW_SIZE,
+    minimum_calls=YANDEX_BREAKER_MINIMUM_CALLS,
+    cooldown=YANDEX_BREAKER_COOLDOWN,
+    half_open_max_calls=YANDEX_BREAKER_HALF_OPEN_CALLS,
+    failure_exceptions=(RequestYandexWeatherError,),
+)
@@ -0,0 +1,132 @@
+import fcntl
+import gzip
+import json
+import zlib
+from itertools import count
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from httpx import Request, Response
+
+from core.exceptions import RequestYandexWeatherError
+from yandex_weather.settings.base import (
+    YANDEX_REPLAY_SPEED,
+    YANDEX_UPSTREAM_ARCHIVE,
+    YANDEX_UPSTREAM_MODE,
+    YANDEX_WEATHER_URL,
+)
+
+LIVE_MODE = "live"
+RECORD_MODE = "record"
+REPLAY_MODE = "replay"
+
+
+def get_archive_key(latitude: float, longitude: float) -> str:
+    return f"{latitude:.6f},{longitude:.6f}"
+
+
+class UpstreamArchive:
+    """Архив ответов сервиса yandex для записи и воспроизведения.
+
+    Архив - файл JSON Lines в gzip: каждая запись дописывается отдельным
+    членом gzip под блокировкой flock, поэтому воркеры могут писать
+    в один файл. При воспроизведении ответы по одним координатам отдаются
+    по кругу, для координат без записей ответ выбирается по ключу
+    из всех записей архива. Задержка ответа делится на speed,
+    при speed=0 ответ отдается без задержки.
+    """
+
+    def __init__(
+        self,
+        path: str = YANDEX_UPSTREAM_ARCHIVE,
+        mode: str = YANDEX_UPSTREAM_MODE,
+        speed: float = YANDEX_REPLAY_SPEED,
+    ) -> None:
+        if mode not in (LIVE_MODE, RECORD_MODE, REPLAY_MODE):
+            raise ValueError(f"Неизвестный режим работы с yandex: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._records: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._counters: Dict[str, count] = {}
+        self._lock = Lock()
+
+    @property
+    def is_recording(self) -> bool:
+        return self.mode == RECORD_MODE
+
+    @property
+    def is_replaying(self) -> bool:
+        return self.mode == REPLAY_MODE
+
+    def record(
+        self,
+        latitude: float,
+        longitude: float,
+        response: Response,
+        elapsed: float,
+    ) -> None:
+        """Дописывает ответ сервиса yandex в архив."""
+        line = json.dumps(
+            {
+                "key": get_archive_key(latitude, longitude),
+                "status": response.status_code,
+                "elapsed": round(elapsed, 6),
+                "body": response.text,
+            },
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        with self._lock, open(self.path, "ab") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                with gzip.GzipFile(fileobj=file, mode="ab") as archive:
+                    archive.write(line.encode() + b"\n")
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def load(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Читает записи архива, сгруппированные по координатам."""
+        records: Dict[str, List[Dict[str, Any]]] = {}
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as archive:
+                for line in archive:
+                    record = json.loads(line)
+                    records.setdefault(record["key"], []).append(record)
+        except FileNotFoundError:
+            pass
+        except (EOFError, gzip.BadGzipFile, zlib.error, ValueError):
+            # Последняя запись могла быть не дописана.
+            pass
+        return records
+
+    def replay(
+        self, latitude: float, longitude: float
+    ) -> Tuple[Response, float]:
+        """Возвращает записанный ответ и задержку его воспроизведения."""
+        with self._lock:
+            if self._records is None:
+                self._records = self.load()
+            if not self._records:
+                raise RequestYandexWeatherError(
+                    f"Архив ответов yandex {self.path} пуст!"
+                )
+            key = get_archive_key(latitude, longitude)
+            if key not in self._records:
+                keys = sorted(self._records)
+                key = keys[zlib.crc32(key.encode()) % len(keys)]
+            records = self._records[key]
+            counter = self._counters.setdefault(key, count())
+            record = records[next(counter) % len(records)]
+        response = Response(
+            record["status"],
+            content=record["body"].encode(),
+            headers={"Content-Type": "application/json"},
+            request=Request("GET", YANDEX_WEATHER_URL),
+        )
+        if not self.speed:
+            return response, 0.0
+        return response, record["elapsed"] / self.speed
+
+
+upstream_archive = UpstreamArchive()
@@ -1,14 +1,42 @@
+import asyncio
+import json
+import math
+import re
+import time
 from collections import OrderedDict
-from json import JSONDecodeError
-from typing import Any, Dict
+from json import JSONDecodeError, JSONDecoder
+from typing import IO, Any, Dict, Iterator, List, Tuple
 
 from django.shortcuts import _get_queryset
 from django.utils.translation import gettext_lazy as _
-from httpx import Client, HTTPError
+from httpx import HTTPError, Response
 from rest_framework.exceptions import ParseError, PermissionDenied
 
-from core.exceptions import RequestYandexWeatherError
-from yandex_weather.settings.base import X_YANDEX_API_KEY, YANDEX_WEATHER_URL
+from asgiref.sync import sync_to_async
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+from core.exceptions import (
+    RequestYandexWeatherError,
+    UpstreamQuotaExceededError,
+)
+from core.metrics import upstream_errors, upstream_request_duration
+from core.quota import upstream_quota
+from core.timing import timed
+from core.upstream import (
+    async_upstream_client,
+    upstream_client,
+    yandex_circuit_breaker,
+)
+from core.upstream_archive import upstream_archive
+from yandex_weather.settings.base import (
+    WEATHER_CELL_SIZE,
+    X_YANDEX_API_KEY,
+    YANDEX_WEATHER_URL,
+)
 
 REQUEST_HEADERS = {
     "X-Yandex-API-Key": X_YANDEX_API_KEY,
@@ -17,38 +45,315 @@ REQUEST_HEADERS = {
 }
 
 
+FACT_FIELDS = ("temp", "pressure_mm", "wind_speed")
+
+FORECAST_FIELDS = ("condition", "wind_speed", "pressure_mm", "prec_mm")
+
+CITY_SEPARATORS_RE = re.compile(r"[\s\-\u2010-\u2015]+")
+
+
+def normalize_city_name(city: str) -> str:
+    """Возвращает нормализованное наименование города.
+
+    Регистр и буквы ё/е не различаются, пробелы и любые тире
+    между частями наименования заменяются одним дефисом.
+    """
+    return "-".join(
+        CITY_SEPARATORS_RE.split(city.strip().lower().replace("ё", "е"))
+    ).strip("-")
+
+
+def dump_json(data: Any) -> bytes:
+    """Возвращает компактное JSON-представление data в UTF-8.
+
+    Использует orjson, если он установлен.
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def get_weather_cell(
+    latitude: float, longitude: float, cell_size: float = WEATHER_CELL_SIZE
+) -> Tuple[float, float]:
+    """Возвращает координаты центра ячейки сетки, содержащей точку."""
+    if not cell_size:
+        return latitude, longitude
+    return (
+        round((math.floor(latitude / cell_size) + 0.5) * cell_size, 6),
+        round((math.floor(longitude / cell_size) + 0.5) * cell_size, 6),
+    )
+
+
 def get_yandex_weather_query_params(
     latitude: float, longitude: float
 ) -> Dict[str, Any]:
     return {"lat": latitude, "lon": longitude, "lang": "ru_RU"}
 
 
+def acquire_upstream_quota() -> None:
+    """Списывает запрос из квоты ключа Yandex API."""
+    if not upstream_quota.acquire():
+        raise UpstreamQuotaExceededError("Исчерпана квота запросов к yandex!")
+
+
 def request_weather_from_yandex_api(
     latitude: float, longitude: float
 ) -> Dict[str, Any]:
-    """Возвращает данные о погоде c yandex."""
+    """Возвращает данные о погоде c yandex.
+
+    При разомкнутой цепи запросов сразу вызывает CircuitBreakerOpenError,
+    при исчерпанной квоте ключа - UpstreamQuotaExceededError.
+    В режиме replay ответ берется из архива upstream_archive.
+    """
+    try:
+        if upstream_archive.is_replaying:
+            response, delay = upstream_archive.replay(latitude, longitude)
+            with timed("upstream"):
+                time.sleep(delay)
+            return _get_replayed_weather(response)
+        acquire_upstream_quota()
+        return yandex_circuit_breaker.call(
+            _request_weather_from_yandex_api, latitude, longitude
+        )
+    except RequestYandexWeatherError as exc:
+        upstream_errors.inc(error=type(exc.__cause__ or exc).__name__)
+        raise
+
+
+def _request_weather_from_yandex_api(
+    latitude: float, longitude: float
+) -> Dict[str, Any]:
     try:
-        with Client() as client:
-            response = client.get(
+        started = time.perf_counter()
+        with upstream_request_duration.time(), timed("upstream"):
+            response = upstream_client.get(
                 YANDEX_WEATHER_URL,
                 headers=REQUEST_HEADERS,
                 params=get_yandex_weather_query_params(latitude, longitude),
             )
-            response.raise_for_status()
-            fact_wheater = response.json()["fact"]
-            return dict(
-                filter(
-                    lambda item: item[0]
-                    in ("temp", "pressure_mm", "wind_speed"),
-                    fact_wheater.items(),
-                )
+        if upstream_archive.is_recording:
+            upstream_archive.record(
+                latitude, longitude, response, time.perf_counter() - started
+            )
+        return get_weather_from_response(response)
+    except (JSONDecodeError, KeyError, TypeError, HTTPError) as exc:
+        raise RequestYandexWeatherError(
+            "Не получены данные о погоде с сервиса yandex!"
+        ) from exc
+
+
+async def arequest_weather_from_yandex_api(
+    latitude: float, longitude: float
+) -> Dict[str, Any]:
+    """Асинхронно возвращает данные о погоде c yandex."""
+    try:
+        if upstream_archive.is_replaying:
+            # Архив читается из файла gzip при первом воспроизведении.
+            response, delay = await sync_to_async(
+                upstream_archive.replay, thread_sensitive=False
+            )(latitude, longitude)
+            with timed("upstream"):
+                await asyncio.sleep(delay)
+            return _get_replayed_weather(response)
+        if upstream_quota.is_enabled:
+            # flock и чтение файла квоты блокируют поток.
+            await sync_to_async(
+                acquire_upstream_quota, thread_sensitive=False
+            )()
+        return await yandex_circuit_breaker.acall(
+            _arequest_weather_from_yandex_api, latitude, longitude
+        )
+    except RequestYandexWeatherError as exc:
+        upstream_errors.inc(error=type(exc.__cause__ or exc).__name__)
+        raise
+
+
+async def _arequest_weather_from_yandex_api(
+    latitude: float, longitude: float
+) -> Dict[str, Any]:
+    try:
+        started = time.perf_counter()
+        with upstream_request_duration.time(), timed("upstream"):
+            response = await async_upstream_client.get(
+                YANDEX_WEATHER_URL,
+                headers=REQUEST_HEADERS,
+                params=get_yandex_weather_query_params(latitude, longitude),
             )
+        if upstream_archive.is_recording:
+            await sync_to_async(
+                upstream_archive.record, thread_sensitive=False
+            )(latitude, longitude, response, time.perf_counter() - started)
+        return get_weather_from_response(response)
     except (JSONDecodeError, KeyError, TypeError, HTTPError) as exc:
         raise RequestYandexWeatherError(
             "Не получены данные о погоде с сервиса yandex!"
         ) from exc
 
 
+def _get_replayed_weather(response: Response) -> Dict[str, Any]:
+    try:
+        return get_weather_from_response(response)
+    except (JSONDecodeError, KeyError, TypeError, HTTPError) as exc:
+        raise RequestYandexWeatherError(
+            "Не получены данные о погоде из архива yandex!"
+        ) from exc
+
+
+def get_weather_from_response(response: Response) -> Dict[str, Any]:
+    """Возвращает текущую погоду и компактный прогноз из ответа yandex."""
+    response.raise_for_status()
+    payload = response.json()
+    weather = get_fact_weather(payload["fact"])
+    weather["forecast"] = get_compact_forecast(payload.get("forecasts", []))
+    return weather
+
+
+def get_fact_weather(fact_wheater: Dict[str, Any]) -> Dict[str, Any]:
+    """Возвращает текущую погоду из ответа сервиса yandex."""
+    return dict(
+        filter(
+            lambda item: item[0] in FACT_FIELDS,
+            fact_wheater.items(),
+        )
+    )
+
+
+def get_compact_forecast(forecasts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Возвращает прогноз по дням и часам в компактном виде.
+
+    Значения хранятся по столбцам, поэтому имена полей не повторяются
+    для каждого дня и часа прогноза.
+    """
+    days = []
+    for forecast in forecasts:
+        parts = forecast.get("parts", {})
+        day, night = parts.get("day", {}), parts.get("night", {})
+        days.append(
+            {
+                "date": forecast.get("date"),
+                "temp_min": min(
+                    (
+                        part["temp_min"]
+                        for part in (day, night)
+                        if part.get("temp_min") is not None
+                    ),
+                    default=None,
+                ),
+                "temp_max": day.get("temp_max"),
+                **{field: day.get(field) for field in FORECAST_FIELDS},
+            }
+        )
+    hours = [
+        hour for forecast in forecasts for hour in forecast.get("hours", [])
+    ]
+    return {
+        "days": get_forecast_columns(
+            days, ("date", "temp_min", "temp_max", *FORECAST_FIELDS)
+        ),
+        "hours": get_forecast_columns(
+            hours, ("hour_ts", "temp", *FORECAST_FIELDS)
+        ),
+    }
+
+
+def get_forecast_columns(rows, fields):
+    return {field: [row.get(field) for row in rows] for field in fields}
+
+
+def get_forecast_rows(columns: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Возвращает строки прогноза из компактного представления."""
+    return [
+        dict(zip(columns.keys(), values)) for values in zip(*columns.values())
+    ]
+
+
+def _read_chunk(file: IO[str], buffer: str, chunk_size: int):
+    chunk = file.read(chunk_size)
+    return buffer + chunk, not chunk
+
+
+def _read_json_array_start(file: IO[str], chunk_size: int):
+    buffer, is_eof = _skip_whitespace(file, "", False, chunk_size)
+    if not buffer.startswith("["):
+        raise JSONDecodeError("Expecting JSON array", buffer, 0)
+    return _skip_whitespace(file, buffer[1:], is_eof, chunk_size)
+
+
+def _skip_whitespace(file: IO[str], buffer: str, is_eof: bool, chunk_size):
+    buffer = buffer.lstrip()
+    while not buffer and not is_eof:
+        buffer, is_eof = _read_chunk(file, buffer, chunk_size)
+        buffer = buffer.lstrip()
+    return buffer, is_eof
+
+
+def _read_json_array_delimiter(
+    file: IO[str], buffer: str, is_eof: bool, chunk_size: int
+):
+    """Пропускает разделитель после элемента массива.
+
+    Возвращает остаток буфера и признак конца массива.
+    """
+    buffer, is_eof = _skip_whitespace(file, buffer, is_eof, chunk_size)
+    if buffer.startswith("]"):
+        return buffer, is_eof, True
+    if not buffer:
+        raise JSONDecodeError("Unterminated JSON array", buffer, 0)
+    if not buffer.startswith(","):
+        raise JSONDecodeError("Expecting ',' delimiter", buffer, 0)
+    buffer, is_eof = _skip_whitespace(file, buffer[1:], is_eof, chunk_size)
+    if buffer.startswith("]"):
+        raise JSONDecodeError("Expecting value", buffer, 0)
+    return buffer, is_eof, False
+
+
+def iter_json_array(
+    file: IO[str], chunk_size: int = 64 * 1024
+) -> Iterator[Any]:
+    """Последовательно возвращает элементы JSON-массива из файла.
+
+    Файл читается частями по chunk_size символов, поэтому расход памяти
+    не зависит от размера файла. Некорректный массив (в том числе
+    без запятых между элементами) вызывает JSONDecodeError.
+    """
+    decoder = JSONDecoder()
+    buffer, is_eof = _read_json_array_start(file, chunk_size)
+    if buffer.startswith("]"):
+        return
+    while True:
+        if not buffer and is_eof:
+            raise JSONDecodeError("Unterminated JSON array", buffer, 0)
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except JSONDecodeError:
+            if is_eof:
+                raise
+            buffer, is_eof = _read_chunk(file, buffer, chunk_size)
+            continue
+        if end == len(buffer) and not is_eof:
+            buffer, is_eof = _read_chunk(file, buffer, chunk_size)
+            continue
+        yield item
+        buffer, is_eof, is_end = _read_json_array_delimiter(
+            file, buffer[end:], is_eof, chunk_size
+        )
+        if is_end:
+            return
+
+
+def iter_batches(items: Iterator[Any], batch_size: int) -> Iterator[List]:
+    """Возвращает элементы items списками по batch_size элементов."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 def get_field_values_from_object(obj, *fields, **kwargs):
     """Возвращает кортеж из значений атрибутов fields объекта."""
     if not fields:
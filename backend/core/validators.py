@@ -1,7 +1,7 @@
 from django.core.validators import RegexValidator, _lazy_re_compile
 from django.utils.translation import gettext_lazy as _
 
-letter_only_re = _lazy_re_compile(r"^[а-яА-Я-]+$")
+letter_only_re = _lazy_re_compile(r"^[а-яА-ЯёЁ-]+$")
 validate_only_letters = RegexValidator(
     letter_only_re,
     _("Enter a valid string value consisting of only letters."),
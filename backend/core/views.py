@@ -1,7 +1,9 @@
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.utils.translation import gettext_lazy as _
 from rest_framework import status
 
+from core.metrics import registry
+
 
 def error_400(request, exception):
     """Обработка 400 ошибки для на стороне пользователя."""
@@ -34,3 +36,11 @@ def error_500(request):
     )
     response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
     return response
+
+
+def metrics(request):
+    """Метрики сервиса в текстовом формате Prometheus."""
+    return HttpResponse(
+        registry.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -1,12 +1,37 @@
+import atexit
+import copy
 import gzip
+import json
+import logging
 import os
 import pathlib
+import queue
+import random
 import shutil
-from datetime import time
-from logging.handlers import TimedRotatingFileHandler
+import threading
+from datetime import datetime, time, timezone
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    TimedRotatingFileHandler,
+)
 
 
-def get_logconfig(log_level: str) -> dict:
+def get_logconfig(
+    log_level: str,
+    log_format: str = "text",
+    debug_sample_rate: float = 1.0,
+    queue_size: int = 10000,
+) -> dict:
+    """Возвращает конфигурацию логирования.
+
+    Логгеры пишут в очередь, а обработчики console и *_to_file
+    выполняются в фоновом потоке QueueListener. При log_format="json"
+    записи выводятся одной строкой JSON, доля debug_sample_rate
+    записей уровня DEBUG отбрасывается до постановки в очередь.
+    """
+    logger_config = {"level": log_level, "handlers": ["queue"]}
+    formatter = "json" if log_format == "json" else "formatter"
     return {
         "version": 1,
         "disable_existing_loggers": False,
@@ -15,50 +40,178 @@ def get_logconfig(log_level: str) -> dict:
                 "format": "[{levelname} {asctime}] {message}",
                 "style": "{",
             },
+            "json": {"()": "yandex_weather.log_config.JsonFormatter"},
+        },
+        "filters": {
+            "debug_sampling": {
+                "()": "yandex_weather.log_config.DebugSamplingFilter",
+                "rate": debug_sample_rate,
+            },
         },
         "handlers": {
             "console": {
                 "level": "INFO",
-                "formatter": "formatter",
+                "formatter": formatter,
                 "class": "logging.StreamHandler",
             },
             "debug_to_file": {
                 "level": "DEBUG",
-                "formatter": "formatter",
+                "formatter": formatter,
                 "class": "yandex_weather.log_config.CustomHandler",
                 "filename": "../logs/debug/debug.log",
                 "when": "H",
                 "interval": 24,
+                "delay": True,
             },
             "error_to_file": {
                 "level": "ERROR",
-                "formatter": "formatter",
+                "formatter": formatter,
                 "class": "yandex_weather.log_config.CustomHandler",
                 "filename": "../logs/error/error.log",
                 "when": "H",
                 "interval": 24,
+                "delay": True,
             },
-        },
-        "loggers": {
-            "django": {
-                "level": log_level,
+            "queue": {
+                "()": "yandex_weather.log_config.BackgroundQueueHandler",
+                "filters": ["debug_sampling"],
                 "handlers": (
-                    ["console", "debug_to_file"]
+                    [
+                        "cfg://handlers.console",
+                        "cfg://handlers.debug_to_file",
+                    ]
                     if log_level == "DEBUG"
-                    else ["console", "error_to_file"]
+                    else [
+                        "cfg://handlers.console",
+                        "cfg://handlers.error_to_file",
+                    ]
                 ),
+                "maxsize": queue_size,
             },
         },
+        "loggers": {
+            "django": logger_config,
+            "api": logger_config,
+            "core": logger_config,
+        },
     }
 
 
-def rotator(source, dest):
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись лога одной строкой JSON.
+
+    Поля extra_fields, переданные в extra при записи, выводятся
+    отдельными ключами.
+    """
+
+    extra_fields = ("timings",)
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in self.extra_fields:
+            if hasattr(record, field):
+                data[field] = getattr(record, field)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Пропускает долю rate записей уровня DEBUG и все остальные записи."""
+
+    def __init__(self, rate: float = 1.0) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return (
+            record.levelno > logging.DEBUG
+            or self.rate >= 1
+            or random.random() < self.rate
+        )
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """Передает записи обработчикам handlers через фоновый поток.
+
+    Запись ставится в очередь без ожидания: при заполненной очереди
+    она отбрасывается и учитывается в dropped. После fork поток
+    QueueListener запускается в дочернем процессе заново.
+    """
+
+    def __init__(self, handlers, maxsize: int = 10000) -> None:
+        super().__init__(queue.Queue(maxsize))
+        # Элементы ConvertingList из dictConfig (cfg://handlers.*)
+        # преобразуются в обработчики только при доступе по индексу.
+        self.targets = [handlers[index] for index in range(len(handlers))]
+        self.dropped = 0
+        self.listener = None
+        self.start()
+        atexit.register(self.stop)
+        os.register_at_fork(after_in_child=self._restart_in_child)
+
+    def start(self) -> None:
+        self.listener = QueueListener(
+            self.queue, *self.targets, respect_handler_level=True
+        )
+        self.listener.start()
+
+    def stop(self) -> None:
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и трассировка вычисляются сразу, чтобы запись
+        # не ссылалась на изменяемые аргументы и кадры стека,
+        # а форматирование выполнялось обработчиками в фоновом потоке.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _restart_in_child(self) -> None:
+        self.queue = queue.Queue(self.queue.maxsize)
+        if self.listener is not None:
+            self.start()
+
+
+def compress(source: str, dest: str) -> None:
     with open(source, "rb") as f_in:
         with gzip.open(dest, "wb") as f_out:
             shutil.copyfileobj(f_in, f_out)
     os.remove(source)
 
 
+def rotator(source, dest):
+    """Переименовывает лог и сжимает его в отдельном потоке."""
+    rotated = dest.removesuffix(".gz")
+    os.rename(source, rotated)
+    threading.Thread(
+        target=compress, args=(rotated, dest), name="log-compress"
+    ).start()
+
+
 def namer(name):
     return name + ".gz"
 
@@ -76,8 +229,7 @@ class CustomHandler(TimedRotatingFileHandler):
         atTime: time | None = None,
         errors: str | None = None,
     ) -> None:
-        pathlib.Path("../logs/error/").mkdir(parents=True, exist_ok=True)
-        pathlib.Path("../logs/debug/").mkdir(parents=True, exist_ok=True)
+        pathlib.Path(filename).parent.mkdir(parents=True, exist_ok=True)
         self.rotator = rotator
         self.namer = namer
         super().__init__(
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from django.core.management.utils import get_random_secret_key
@@ -18,10 +19,135 @@ YANDEX_WEATHER_URL = os.getenv(
 
 X_YANDEX_API_KEY = os.getenv("X_YANDEX_API_KEY", get_random_secret_key())
 
+YANDEX_HTTP2 = os.getenv("YANDEX_HTTP2", "false").lower() == "true"
+
+YANDEX_HTTP_MAX_CONNECTIONS = int(os.getenv("YANDEX_HTTP_MAX_CONNECTIONS", 20))
+
+YANDEX_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("YANDEX_HTTP_MAX_KEEPALIVE_CONNECTIONS", 10)
+)
+
+YANDEX_HTTP_KEEPALIVE_EXPIRY = float(
+    os.getenv("YANDEX_HTTP_KEEPALIVE_EXPIRY", 30.0)
+)
+
+YANDEX_HTTP_CONNECT_TIMEOUT = float(
+    os.getenv("YANDEX_HTTP_CONNECT_TIMEOUT", 2.0)
+)
+
+YANDEX_HTTP_READ_TIMEOUT = float(os.getenv("YANDEX_HTTP_READ_TIMEOUT", 5.0))
+
+YANDEX_HTTP_RETRIES = int(os.getenv("YANDEX_HTTP_RETRIES", 2))
+
+# Базовая и максимальная задержка (в секундах) между повторами запроса.
+YANDEX_HTTP_BACKOFF = float(os.getenv("YANDEX_HTTP_BACKOFF", 0.2))
+
+YANDEX_HTTP_BACKOFF_MAX = float(os.getenv("YANDEX_HTTP_BACKOFF_MAX", 2.0))
+
+# Доля неудачных запросов к yandex в окне, при которой размыкается цепь.
+YANDEX_BREAKER_FAILURE_RATE = float(
+    os.getenv("YANDEX_BREAKER_FAILURE_RATE", 0.5)
+)
+
+YANDEX_BREAKER_WINDOW_SIZE = int(os.getenv("YANDEX_BREAKER_WINDOW_SIZE", 20))
+
+YANDEX_BREAKER_MINIMUM_CALLS = int(
+    os.getenv("YANDEX_BREAKER_MINIMUM_CALLS", 10)
+)
+
+# Время (в секундах) до пробного запроса после размыкания цепи.
+YANDEX_BREAKER_COOLDOWN = float(os.getenv("YANDEX_BREAKER_COOLDOWN", 30.0))
+
+YANDEX_BREAKER_HALF_OPEN_CALLS = int(
+    os.getenv("YANDEX_BREAKER_HALF_OPEN_CALLS", 1)
+)
+
+# Квота ключа Yandex API, общая для всех процессов на хосте
+# (0 - без ограничения). Фоновые обновления не используют
+# долю YANDEX_QUOTA_BACKGROUND_RESERVE квоты, оставленную пользователям.
+YANDEX_QUOTA_PER_SECOND = float(os.getenv("YANDEX_QUOTA_PER_SECOND", 10))
+
+YANDEX_QUOTA_PER_DAY = int(os.getenv("YANDEX_QUOTA_PER_DAY", 0))
+
+YANDEX_QUOTA_BACKGROUND_RESERVE = float(
+    os.getenv("YANDEX_QUOTA_BACKGROUND_RESERVE", 0.2)
+)
+
+YANDEX_QUOTA_FILE = os.getenv(
+    "YANDEX_QUOTA_FILE",
+    os.path.join(tempfile.gettempdir(), "yandex_weather_quota.json"),
+)
+
+# Режим работы с сервисом yandex: live - запросы к сервису, record - запросы
+# с записью ответов в архив YANDEX_UPSTREAM_ARCHIVE, replay - ответы
+# из архива без запросов к сервису и расхода квоты. При воспроизведении
+# исходная длительность ответа делится на YANDEX_REPLAY_SPEED
+# (2 - вдвое быстрее, 0 - без задержки).
+YANDEX_UPSTREAM_MODE = os.getenv("YANDEX_UPSTREAM_MODE", "live").lower()
+
+YANDEX_UPSTREAM_ARCHIVE = os.getenv(
+    "YANDEX_UPSTREAM_ARCHIVE",
+    os.path.join(tempfile.gettempdir(), "yandex_weather_upstream.jsonl.gz"),
+)
+
+YANDEX_REPLAY_SPEED = float(os.getenv("YANDEX_REPLAY_SPEED", 1.0))
+
 SECRET_KEY = os.getenv("SECRET_KEY", get_random_secret_key())
 
 TIMEOUT_YANDEX_UPDATE = 30
 
+# Окно (в минутах) после устаревания данных, в течение которого
+# отдаются устаревшие данные, а обновление выполняется в фоне.
+WEATHER_STALE_WHILE_REVALIDATE = int(
+    os.getenv("WEATHER_STALE_WHILE_REVALIDATE", 15)
+)
+
+# Максимальный возраст (в минутах) отдаваемых пользователю данных.
+WEATHER_MAX_STALE = int(os.getenv("WEATHER_MAX_STALE", 60))
+
+WEATHER_REFRESH_WORKERS = int(os.getenv("WEATHER_REFRESH_WORKERS", 4))
+
+WEATHER_BATCH_MAX_CITIES = int(os.getenv("WEATHER_BATCH_MAX_CITIES", 50))
+
+# Максимум параллельных запросов к yandex при пакетном запросе погоды.
+WEATHER_BATCH_CONCURRENCY = int(os.getenv("WEATHER_BATCH_CONCURRENCY", 8))
+
+# Период (в секундах) записи счетчиков популярности городов в БД.
+WEATHER_POPULARITY_FLUSH_INTERVAL = int(
+    os.getenv("WEATHER_POPULARITY_FLUSH_INTERVAL", 60)
+)
+
+# Период (в секундах) проверки изменений таблицы городов
+# для перестроения индексов в памяти процесса.
+CITY_INDEX_CHECK_INTERVAL = int(os.getenv("CITY_INDEX_CHECK_INTERVAL", 60))
+
+WEATHER_NEAREST_MAX_CITIES = int(os.getenv("WEATHER_NEAREST_MAX_CITIES", 10))
+
+CITY_SUGGEST_LIMIT = int(os.getenv("CITY_SUGGEST_LIMIT", 10))
+
+# Минимальная доля общих триграмм для подсказки города с опечаткой.
+CITY_SUGGEST_MIN_SIMILARITY = float(
+    os.getenv("CITY_SUGGEST_MIN_SIMILARITY", 0.3)
+)
+
+# Размер ячейки сетки координат (в градусах): города одной ячейки
+# получают погоду одним запросом к yandex по координатам ее центра.
+# 0 - запрашивать погоду по точным координатам каждого города.
+WEATHER_CELL_SIZE = float(os.getenv("WEATHER_CELL_SIZE", 0.05))
+
+# Срок хранения (в днях) истории наблюдений погоды.
+WEATHER_HISTORY_RETENTION_DAYS = int(
+    os.getenv("WEATHER_HISTORY_RETENTION_DAYS", 30)
+)
+
+WEATHER_CACHE_ALIAS = "weather"
+
+WEATHER_CACHE_BACKEND = os.getenv(
+    "WEATHER_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+)
+
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", 1000))
+
 ALLOWED_HOSTS = [
     "127.0.0.1",
     "localhost",
@@ -42,6 +168,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.SamplingProfilerMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -52,6 +180,33 @@ MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
 ]
 
+# Заголовок Server-Timing с временем этапов обработки запроса.
+SERVER_TIMING_ENABLED = (
+    os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+)
+
+# Запросы дольше SLOW_REQUEST_SECONDS записываются в лог с разбивкой
+# по этапам, а при профилировании для них сохраняются стеки.
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", 1.0))
+
+# Доля профилируемых запросов и токен заголовка X-Profile,
+# включающего профилирование запроса (без токена заголовок игнорируется).
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", 0))
+
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", 0.005))
+
+PROFILER_DIR = os.getenv(
+    "PROFILER_DIR", os.path.join(tempfile.gettempdir(), "weather_profiles")
+)
+
+# Каталог для метрик процессов при запуске нескольких воркеров,
+# без него метрики отдаются только для обработавшего запрос процесса.
+METRICS_DIR = os.getenv("METRICS_DIR")
+
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+
 ROOT_URLCONF = "yandex_weather.urls"
 
 TEMPLATES = [
@@ -80,9 +235,43 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", "postgres"),
         "HOST": os.getenv("DB_HOST", "localhost"),
         "PORT": os.getenv("DB_PORT", "5432"),
+        # Время жизни соединения в секундах: 0 - соединение на запрос,
+        # больше 0 - постоянное соединение потока с проверкой перед
+        # повторным использованием при CONN_HEALTH_CHECKS.
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": (
+            os.getenv("DB_CONN_HEALTH_CHECKS", "true").lower() == "true"
+        ),
+        # Пул соединений процесса для ENGINE
+        # core.db.backends.postgresql_pool: максимум соединений
+        # и время ожидания свободного соединения в секундах.
+        "POOL": {
+            "MAX_SIZE": int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+            "TIMEOUT": float(os.getenv("DB_POOL_TIMEOUT", 5.0)),
+        },
     }
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    WEATHER_CACHE_ALIAS: {
+        "BACKEND": WEATHER_CACHE_BACKEND,
+        "LOCATION": os.getenv("WEATHER_CACHE_LOCATION", "weather"),
+        "TIMEOUT": TIMEOUT_YANDEX_UPDATE * 60,
+        # Для LocMemCache вытесняется одна наименее востребованная запись.
+        "OPTIONS": (
+            {
+                "MAX_ENTRIES": WEATHER_CACHE_MAX_ENTRIES,
+                "CULL_FREQUENCY": WEATHER_CACHE_MAX_ENTRIES,
+            }
+            if WEATHER_CACHE_BACKEND.endswith("LocMemCache")
+            else {}
+        ),
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -127,7 +316,7 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.AllowAny",
     ],
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "core.renderers.TimedJSONRenderer",
         "rest_framework.renderers.BrowsableAPIRenderer",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
@@ -148,4 +337,15 @@ SPECTACULAR_SETTINGS = {
 
 LOG_LEVEL = os.getenv("LEVEL", "ERROR")
 
-LOGGING = get_logconfig(LOG_LEVEL)
+# Формат логов: text или json (одна строка JSON на запись).
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+# Доля записей уровня DEBUG, попадающих в лог (например, запросов SQL).
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", 1.0))
+
+# Размер очереди записей, при заполнении новые записи отбрасываются.
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+LOGGING = get_logconfig(
+    LOG_LEVEL, LOG_FORMAT, LOG_DEBUG_SAMPLE_RATE, LOG_QUEUE_SIZE
+)
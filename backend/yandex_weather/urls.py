@@ -7,8 +7,11 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
 )
 
+from core.views import metrics
+
 urlpatterns = [
     path("api/", include("api.urls", namespace="api")),
+    path("metrics/", metrics, name="metrics"),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/schema/swagger-ui/",
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from typing import Any
 
 from httpx import AsyncClient, HTTPError
@@ -11,21 +12,59 @@ REQUEST_HEADERS = {
 }
 
 
+WEATHER_CACHE_MAX_SIZE = 1000
+
+# Последние ответы сервиса погоды по городам с их ETag.
+_weather_cache: OrderedDict[str, tuple[str, dict[str, Any]]] = OrderedDict()
+
+
 def get_params_for_city(city: str) -> dict[str, Any]:
     return {"city": city}
 
 
+def get_cached_weather_headers(
+    cached: tuple[str, dict[str, Any]] | None
+) -> dict[str, str]:
+    """Возвращает заголовки для перепроверки сохраненного ответа."""
+    if cached is None:
+        return REQUEST_HEADERS
+    return {**REQUEST_HEADERS, "If-None-Match": cached[0]}
+
+
+def cache_weather(city: str, etag: str | None, weather: dict[str, Any]):
+    """Сохраняет ответ сервиса погоды для перепроверки по ETag."""
+    if etag is None:
+        return
+    _weather_cache[city.lower()] = (etag, weather)
+    _weather_cache.move_to_end(city.lower())
+    if len(_weather_cache) > WEATHER_CACHE_MAX_SIZE:
+        _weather_cache.popitem(last=False)
+
+
 async def get_weather_from_service(city: str) -> str:
     """Запрашивает информацию о погоде с сервиса."""
     try:
         async with AsyncClient() as client:
+            # Ответ берется до запроса: за время запроса его может
+            # вытеснить из кэша другой город.
+            cached = _weather_cache.get(city.lower())
             response = await client.get(
                 settings.url_weather_service,
-                headers=REQUEST_HEADERS,
+                headers=get_cached_weather_headers(cached),
                 params=get_params_for_city(city),
             )
-            response.raise_for_status()
-            weather = response.json()
+            if response.status_code == 304 and cached is None:
+                response = await client.get(
+                    settings.url_weather_service,
+                    headers=REQUEST_HEADERS,
+                    params=get_params_for_city(city),
+                )
+            if response.status_code == 304 and cached is not None:
+                weather = cached[1]
+            else:
+                response.raise_for_status()
+                weather = response.json()
+                cache_weather(city, response.headers.get("ETag"), weather)
             return (
                 f"Температура: {weather['temp']}, "
                 f"Давление: {weather['pressure_mm']}, "
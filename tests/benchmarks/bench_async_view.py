@@ -0,0 +1,95 @@
+"""Сравнение пропускной способности синхронного и асинхронного эндпоинтов.
+
+Каждый запрос выполняется для города с устаревшими данными,
+поэтому приводит к запросу к заглушке yandex с задержкой LATENCY.
+
+Запуск из корня проекта:
+python -m tests.benchmarks.bench_async_view
+"""
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import (
+    YandexStubServer,
+    create_cities,
+    create_test_database,
+    reset_weather,
+    setup_django,
+)
+
+CITIES = 400
+LATENCY = 0.1
+SYNC_THREADS = 8
+ASYNC_CONCURRENCY = 200
+
+
+def report(name, cities, elapsed, codes):
+    errors = sum(code != 200 for code in codes)
+    print(
+        f"{name}: {len(cities) / elapsed:.0f} запросов/с, "
+        f"{elapsed:.2f} с на {len(cities)} запросов, ошибок: {errors}"
+    )
+
+
+def run_sync(cities):
+    from django.db import connection
+    from django.test import Client
+
+    def request(city):
+        try:
+            return Client().get("/api/weather/", {"city": city}).status_code
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(SYNC_THREADS) as executor:
+        codes = list(executor.map(request, cities))
+    report(
+        f"WSGI, {SYNC_THREADS} потоков",
+        cities,
+        time.perf_counter() - started,
+        codes,
+    )
+
+
+async def run_async(cities):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(ASYNC_CONCURRENCY)
+
+    async def request(city):
+        async with semaphore:
+            response = await client.get("/api/weather/async/", {"city": city})
+            return response.status_code
+
+    started = time.perf_counter()
+    codes = await asyncio.gather(*(request(city) for city in cities))
+    report(
+        f"ASGI, {ASYNC_CONCURRENCY} конкурентных запросов",
+        cities,
+        time.perf_counter() - started,
+        codes,
+    )
+
+
+def main():
+    with YandexStubServer(
+        latency=LATENCY
+    ) as server, tempfile.TemporaryDirectory() as tmp:
+        setup_django(
+            YANDEX_WEATHER_URL=server.url,
+            YANDEX_HTTP_MAX_CONNECTIONS=str(ASYNC_CONCURRENCY),
+        )
+        create_test_database(os.path.join(tmp, "bench.sqlite3"))
+        cities = create_cities(CITIES)
+        run_sync(cities)
+        reset_weather()
+        asyncio.run(run_async(cities))
+
+
+if __name__ == "__main__":
+    main()
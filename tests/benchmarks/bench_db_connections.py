@@ -0,0 +1,138 @@
+"""Сравнение переиспользования соединений с PostgreSQL под нагрузкой.
+
+Режимы:
+- новое соединение на каждый запрос (CONN_MAX_AGE=0);
+- постоянные соединения потоков с проверкой перед повторным
+  использованием (CONN_MAX_AGE, CONN_HEALTH_CHECKS);
+- пул соединений процесса core.db.backends.postgresql_pool.
+
+CLIENTS потоков выполняют цикл запроса Django (сигналы request_started
+и request_finished) с одним запросом к БД. Для каждого режима выводятся
+пропускная способность, p50/p99 и количество открытых соединений.
+Ошибки потоков выводятся в stderr, бенчмарк завершается с ненулевым
+кодом.
+Каждый режим запускается в отдельном процессе, параметры подключения
+берутся из переменных DB_NAME, POSTGRES_USER, POSTGRES_PASSWORD,
+DB_HOST и DB_PORT.
+
+Запуск из корня проекта:
+python -m tests.benchmarks.bench_db_connections
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from .utils import percentile, setup_django
+
+CLIENTS = 16
+REQUESTS = 200
+POOL_MAX_SIZE = 8
+
+MODES = {
+    "Соединение на запрос": {
+        "DB_ENGINE": "django.db.backends.postgresql",
+        "DB_CONN_MAX_AGE": "0",
+    },
+    "Постоянные соединения": {
+        "DB_ENGINE": "django.db.backends.postgresql",
+        "DB_CONN_MAX_AGE": "60",
+        "DB_CONN_HEALTH_CHECKS": "true",
+    },
+    f"Пул на {POOL_MAX_SIZE} соединений": {
+        "DB_ENGINE": "core.db.backends.postgresql_pool",
+        "DB_CONN_MAX_AGE": "0",
+        "DB_POOL_MAX_SIZE": str(POOL_MAX_SIZE),
+    },
+}
+
+
+def run_mode():
+    """Выполняет нагрузку в текущем процессе, печатает результат в JSON."""
+    setup_django(DJANGO_SETTINGS_MODULE="yandex_weather.settings.base")
+    from django.core.signals import request_finished, request_started
+    from django.db import connection
+    from django.db.backends.postgresql import base
+
+    connects = [0]
+    connect = base.Database.connect
+
+    def counting_connect(*args, **kwargs):
+        connects[0] += 1
+        return connect(*args, **kwargs)
+
+    base.Database.connect = counting_connect
+    durations = []
+    errors = []
+    lock = threading.Lock()
+
+    def client():
+        results = []
+        try:
+            for _ in range(REQUESTS):
+                started = time.perf_counter()
+                request_started.send(sender=None)
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                finally:
+                    request_finished.send(sender=None)
+                results.append(time.perf_counter() - started)
+        except Exception as exc:
+            with lock:
+                errors.append(exc)
+        finally:
+            connection.close()
+        with lock:
+            durations.extend(results)
+
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        for error in errors:
+            print(f"{type(error).__name__}: {error}", file=sys.stderr)
+        sys.exit(1)
+    durations.sort()
+    print(
+        json.dumps(
+            {
+                "throughput": len(durations) / elapsed,
+                "p50": percentile(durations, 50) * 1000,
+                "p99": percentile(durations, 99) * 1000,
+                "connects": connects[0],
+            }
+        )
+    )
+
+
+def main():
+    for name, environ in MODES.items():
+        result = subprocess.run(
+            [sys.executable, "-m", __spec__.name, "--run"],
+            env={**os.environ, **environ},
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            sys.exit(f"{name}: {result.stderr.strip()}")
+        stats = json.loads(result.stdout.splitlines()[-1])
+        print(
+            f"{name}: {stats['throughput']:.0f} запросов/с, "
+            f"p50 {stats['p50']:.2f} мс, p99 {stats['p99']:.2f} мс, "
+            f"новых соединений: {stats['connects']} "
+            f"на {CLIENTS * REQUESTS} запросов"
+        )
+
+
+if __name__ == "__main__":
+    if "--run" in sys.argv:
+        run_mode()
+    else:
+        main()
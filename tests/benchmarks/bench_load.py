@@ -0,0 +1,249 @@
+"""Нагрузочный тест эндпоинта погоды с заглушкой сервиса yandex.
+
+Заглушка отвечает с задержкой --latency, долей ошибок --error-rate
+и размером ответа --payload-size, YANDEX_WEATHER_URL указывает на нее.
+--clients потоков выполняют --requests запросов к /api/weather/:
+доля --hot-share приходится на --hot-cities популярных городов,
+остальные - на --cold-cities редких городов в разных ячейках сетки.
+
+С --archive вместо заглушки воспроизводятся ответы yandex из архива,
+записанного в режиме YANDEX_UPSTREAM_MODE=record.
+
+Результат (пропускная способность, p50/p95/p99, ошибки) сравнивается
+с базовой линией --baseline того же сценария. При ухудшении больше
+--tolerance скрипт завершается с кодом 1.
+
+Запуск из корня проекта:
+python -m tests.benchmarks.bench_load
+Сохранение базовой линии:
+python -m tests.benchmarks.bench_load --save-baseline
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from .utils import (
+    YandexStubServer,
+    create_cities,
+    create_test_database,
+    percentile,
+    setup_django,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+SCENARIO_FIELDS = (
+    "clients",
+    "requests",
+    "hot_cities",
+    "cold_cities",
+    "hot_share",
+    "latency",
+    "error_rate",
+    "payload_size",
+    "seed",
+    "archive",
+)
+
+# Метрики результата и направление улучшения.
+HIGHER_IS_BETTER = {
+    "throughput": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+}
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--hot-cities", type=int, default=20)
+    parser.add_argument("--cold-cities", type=int, default=500)
+    parser.add_argument("--hot-share", type=float, default=0.8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--payload-size", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--archive")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    return parser
+
+
+def get_schedule(options, hot, cold):
+    """Возвращает список запросов (группа, город) в случайном порядке."""
+    generator = random.Random(options.seed)
+    return [
+        ("hot", generator.choice(hot))
+        if generator.random() < options.hot_share
+        else ("cold", generator.choice(cold))
+        for _ in range(options.requests)
+    ]
+
+
+def run_clients(schedule, clients):
+    """Выполняет запросы в clients потоках, возвращает замеры и время."""
+    from django.db import connection
+    from django.test import Client
+
+    samples = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients + 1)
+
+    def worker(requests):
+        client = Client(HTTP_ACCEPT="application/json")
+        results = []
+        barrier.wait()
+        try:
+            for group, city in requests:
+                started = time.perf_counter()
+                status_code = client.get(
+                    "/api/weather/", {"city": city}
+                ).status_code
+                results.append(
+                    (group, status_code, time.perf_counter() - started)
+                )
+        finally:
+            connection.close()
+            with lock:
+                samples.extend(results)
+
+    threads = [
+        threading.Thread(target=worker, args=(schedule[index::clients],))
+        for index in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def get_latency_stats(durations):
+    durations = sorted(durations)
+    return {
+        f"p{percent}_ms": round(percentile(durations, percent) * 1000, 2)
+        for percent in (50, 95, 99)
+    }
+
+
+def get_results(samples, elapsed, server):
+    from core.metrics import get_cache_hit_ratio, registry
+
+    results = {
+        "throughput": round(len(samples) / elapsed, 1),
+        **get_latency_stats(duration for _, _, duration in samples),
+        "errors": sum(status_code != 200 for _, status_code, _ in samples),
+        "upstream_requests": server.requests,
+        "upstream_errors": server.errors,
+        "cache_hit_ratio": round(get_cache_hit_ratio(registry.collect()), 3),
+    }
+    for group in ("hot", "cold"):
+        results[group] = get_latency_stats(
+            duration for name, _, duration in samples if name == group
+        )
+    return results
+
+
+def report(results):
+    print(
+        f"Пропускная способность: {results['throughput']} запросов/с, "
+        f"ошибок: {results['errors']}, "
+        f"запросов к yandex: {results['upstream_requests']} "
+        f"(ошибок {results['upstream_errors']}), "
+        f"попаданий в кэш: {results['cache_hit_ratio']:.1%}"
+    )
+    for name, stats in (
+        ("Все запросы", results),
+        ("Популярные города", results["hot"]),
+        ("Редкие города", results["cold"]),
+    ):
+        print(
+            f"{name}: p50 {stats['p50_ms']} мс, p95 {stats['p95_ms']} мс, "
+            f"p99 {stats['p99_ms']} мс"
+        )
+
+
+def compare(results, baseline, tolerance):
+    """Сравнивает результат с базовой линией, возвращает число регрессий."""
+    regressions = 0
+    for name, higher_is_better in HIGHER_IS_BETTER.items():
+        before, after = baseline[name], results[name]
+        if not before:
+            continue
+        change = (after - before) / before
+        regressed = (-change if higher_is_better else change) > tolerance
+        regressions += regressed
+        print(
+            f"{name}: {before} -> {after} ({change:+.1%})"
+            f"{' РЕГРЕССИЯ' if regressed else ''}"
+        )
+    return regressions
+
+
+def main(argv=None):
+    options = get_parser().parse_args(argv)
+    scenario = {field: getattr(options, field) for field in SCENARIO_FIELDS}
+    with YandexStubServer(
+        latency=options.latency,
+        error_rate=options.error_rate,
+        payload_size=options.payload_size,
+        seed=options.seed,
+    ) as server, tempfile.TemporaryDirectory() as tmp:
+        environ = {}
+        if options.archive:
+            environ.update(
+                YANDEX_UPSTREAM_MODE="replay",
+                YANDEX_UPSTREAM_ARCHIVE=options.archive,
+            )
+        setup_django(
+            YANDEX_WEATHER_URL=server.url,
+            YANDEX_HTTP_MAX_CONNECTIONS=str(options.clients),
+            **environ,
+        )
+        create_test_database(os.path.join(tmp, "bench.sqlite3"))
+
+        from api.services import popularity_tracker
+        from yandex_weather.settings.base import WEATHER_CELL_SIZE
+
+        popularity_tracker.flush_interval = float("inf")
+        cities = create_cities(
+            options.hot_cities + options.cold_cities,
+            spacing=WEATHER_CELL_SIZE * 1.5,
+        )
+        schedule = get_schedule(
+            options, cities[: options.hot_cities], cities[options.hot_cities :]
+        )
+        samples, elapsed = run_clients(schedule, options.clients)
+        results = get_results(samples, elapsed, server)
+    report(results)
+
+    if options.save_baseline:
+        with open(options.baseline, "w") as file:
+            json.dump(
+                {"scenario": scenario, "results": results}, file, indent=2
+            )
+        print(f"Базовая линия сохранена в {options.baseline}")
+        return 0
+    if not os.path.exists(options.baseline):
+        print("Базовая линия не найдена, сохраните ее --save-baseline")
+        return 0
+    with open(options.baseline) as file:
+        baseline = json.load(file)
+    if baseline["scenario"] != scenario:
+        print("Сценарий базовой линии отличается, сравнение пропущено")
+        return 0
+    return 1 if compare(results, baseline["results"], options.tolerance) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""Сравнение нового клиента на каждый запрос и пула соединений.
+
+Запуск из корня проекта:
+python -m tests.benchmarks.bench_upstream_client
+"""
+import time
+
+from .utils import YandexStubServer, setup_django
+
+REQUESTS = 500
+
+
+def run(name, server, request):
+    connections = server.connections
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        request().raise_for_status()
+    elapsed = time.perf_counter() - started
+    print(
+        f"{name}: {REQUESTS / elapsed:.0f} запросов/с, "
+        f"{elapsed / REQUESTS * 1000:.2f} мс/запрос, "
+        f"новых соединений: {server.connections - connections}"
+    )
+
+
+def main():
+    setup_django()
+    from httpx import Client
+
+    from core.upstream import upstream_client
+
+    with YandexStubServer() as server:
+
+        def request_with_new_client():
+            with Client() as client:
+                return client.get(server.url)
+
+        run("Новый клиент на запрос", server, request_with_new_client)
+        run("Пул соединений", server, lambda: upstream_client.get(server.url))
+        upstream_client.close()
+
+
+if __name__ == "__main__":
+    main()
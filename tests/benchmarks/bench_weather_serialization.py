@@ -0,0 +1,75 @@
+"""Сравнение стоимости ответа эндпоинта погоды из кэша.
+
+Сравниваются:
+- сериализация экземпляра модели YandexWeatherSerializer и JSONRenderer;
+- YandexWeatherAPIView при попадании в кэш (DRF, согласование рендерера);
+- быстрый путь get_cached_weather_view с готовым JSON из кэша.
+
+Запуск из корня проекта:
+python -m tests.benchmarks.bench_weather_serialization
+"""
+import os
+import tempfile
+import timeit
+
+from .utils import create_test_database, setup_django
+
+REQUESTS = 5000
+
+
+def report(name, elapsed):
+    print(
+        f"{name}: {elapsed / REQUESTS * 1e6:.1f} мкс на ответ, "
+        f"{REQUESTS / elapsed:.0f} ответов/с"
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django()
+        create_test_database(os.path.join(tmp, "bench.sqlite3"))
+
+        from django.test import RequestFactory
+        from django.utils import timezone
+        from rest_framework.renderers import JSONRenderer
+
+        from api.models import YandexWeatherModel
+        from api.serializers import YandexWeatherSerializer
+        from api.services import popularity_tracker
+        from api.views import YandexWeatherAPIView, get_cached_weather_view
+
+        popularity_tracker.flush_interval = float("inf")
+        weather = YandexWeatherModel.objects.create(
+            city="Москва",
+            latitude=55.75222,
+            longitude=37.61556,
+            updated_at=timezone.now(),
+            temp=5,
+            pressure_mm=745,
+            wind_speed=3.2,
+        )
+        request = RequestFactory().get(
+            "/api/weather/",
+            {"city": "Москва"},
+            HTTP_ACCEPT="application/json",
+        )
+        drf_view = YandexWeatherAPIView.as_view()
+        lean_view = get_cached_weather_view(drf_view)
+        assert lean_view(request).status_code == 200
+
+        def render_serializer():
+            JSONRenderer().render(YandexWeatherSerializer(weather).data)
+
+        def render_drf_view():
+            drf_view(request).render()
+
+        for name, function in (
+            ("Сериалайзер и JSONRenderer", render_serializer),
+            ("YandexWeatherAPIView из кэша", render_drf_view),
+            ("Готовый JSON из кэша", lambda: lean_view(request)),
+        ):
+            report(name, timeit.timeit(function, number=REQUESTS))
+
+
+if __name__ == "__main__":
+    main()
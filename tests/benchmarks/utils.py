@@ -0,0 +1,183 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..conftest import MANAGE_PATH
+
+
+def setup_django(**environ):
+    """Настраивает Django для запуска бенчмарка вне pytest."""
+    os.environ.update(environ)
+    # Бенчмарки измеряют сервис, а не квоту ключа Yandex API.
+    os.environ.setdefault("YANDEX_QUOTA_PER_SECOND", "0")
+    os.environ.setdefault(
+        "DJANGO_SETTINGS_MODULE", "yandex_weather.settings.migrate_test"
+    )
+    if MANAGE_PATH not in sys.path:
+        sys.path.insert(0, MANAGE_PATH)
+    import django
+
+    django.setup()
+
+
+def get_forecast_day(index):
+    """Возвращает день прогноза с почасовыми значениями."""
+    part = {"condition": "cloudy", "wind_speed": 3.2, "pressure_mm": 745}
+    return {
+        "date": f"2023-11-{index % 28 + 1:02d}",
+        "parts": {
+            "day": {**part, "temp_min": 2, "temp_max": 7, "prec_mm": 0.4},
+            "night": {**part, "temp_min": -1, "temp_max": 2, "prec_mm": 0},
+        },
+        "hours": [
+            {
+                **part,
+                "hour_ts": 1700000000 + index * 86400 + hour * 3600,
+                "temp": 5,
+                "prec_mm": 0,
+            }
+            for hour in range(24)
+        ],
+    }
+
+
+def get_forecast_payload(size=0):
+    """Возвращает ответ, аналогичный ответу сервиса yandex.
+
+    Дни прогноза добавляются, пока ответ не достигнет size байт.
+    """
+    payload = {
+        "now": 1700000000,
+        "fact": {"temp": 5, "pressure_mm": 745, "wind_speed": 3.2},
+        "forecasts": [],
+    }
+    while len(json.dumps(payload)) < size:
+        payload["forecasts"].append(
+            get_forecast_day(len(payload["forecasts"]))
+        )
+    return payload
+
+
+class YandexStubHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов заглушки сервиса yandex."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+            failed = self.server.random.random() < self.server.error_rate
+            if failed:
+                self.server.errors += 1
+        if failed:
+            body = b'{"error": "stub"}'
+            self.send_response(503)
+        else:
+            body = self.server.body
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class YandexStubServer(ThreadingHTTPServer):
+    """Локальная заглушка сервиса yandex со счетчиком соединений.
+
+    latency - задержка ответа в секундах, error_rate - доля ответов
+    с кодом 503, payload_size - примерный размер ответа в байтах.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        error_rate=0.0,
+        payload_size=0,
+        seed=None,
+    ):
+        super().__init__((host, port), YandexStubHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.body = json.dumps(get_forecast_payload(payload_size)).encode()
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f"http://{host}:{port}/v2/forecast"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+def create_test_database(path):
+    """Создает тестовую БД SQLite в файле path с применением миграций."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.settings_dict["TEST"]["NAME"] = path
+    connection.creation.create_test_db(verbosity=0)
+
+
+def create_cities(count, spacing=0.001):
+    """Создает города без данных о погоде, возвращает их наименования.
+
+    Соседние города отстоят друг от друга на spacing градусов.
+    """
+    from api.models import YandexWeatherModel
+
+    YandexWeatherModel.objects.bulk_create(
+        YandexWeatherModel(
+            city=f"Город{chr(0x430 + index // 32)}{chr(0x430 + index % 32)}",
+            latitude=40 + index * spacing % 45,
+            longitude=40 + index * spacing % 45,
+        )
+        for index in range(count)
+    )
+    return list(YandexWeatherModel.objects.values_list("city", flat=True))
+
+
+def reset_weather():
+    """Сбрасывает данные о погоде и кэш, чтобы вызвать запросы к yandex."""
+    from api.cache import weather_cache
+    from api.models import YandexWeatherModel
+
+    YandexWeatherModel.objects.update(updated_at=None)
+    weather_cache.cache.clear()
+
+
+def percentile(values, percent):
+    """Возвращает перцентиль percent отсортированного списка values."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return values[index]
@@ -1,6 +1,8 @@
 import os
 import sys
 
+import pytest
+
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(root_dir)
 
@@ -28,4 +30,15 @@ if FILENAME not in project_dir_content:
 
 pytest_plugins = [
     "tests.fixtures.fixture_user",
+    "tests.fixtures.fixture_weather",
 ]
+
+
+def pytest_runtest_setup(item):
+    """Пропускает тесты с меткой postgres на других СУБД."""
+    if item.get_closest_marker("postgres") is None:
+        return
+    from django.db import connection
+
+    if connection.vendor != "postgresql":
+        pytest.skip("Тест требует PostgreSQL")
@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import pytest
+
+
+@pytest.fixture
+def city_weather():
+    from api.models import YandexWeatherModel
+
+    return YandexWeatherModel.objects.create(
+        city="Москва", latitude=55.75222, longitude=37.61556
+    )
+
+
+@pytest.fixture
+def yandex_weather(monkeypatch):
+    """Подменяет запрос к сервису yandex и считает количество вызовов."""
+    calls = []
+
+    def request_weather(latitude, longitude):
+        calls.append((latitude, longitude))
+        return {"temp": 5, "pressure_mm": 745, "wind_speed": 3.2}
+
+    monkeypatch.setattr(
+        "api.services.request_weather_from_yandex_api", request_weather
+    )
+    return calls
+
+
+@pytest.fixture(autouse=True)
+def clear_weather_cache():
+    from api.cache import weather_cache
+
+    weather_cache.cache.clear()
+    yield
+    weather_cache.cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_city_indexes():
+    from api.signals import CITY_INDEXES
+
+    yield
+    for index in CITY_INDEXES:
+        index.reset()
+
+
+@pytest.fixture
+def slow_yandex_weather(monkeypatch):
+    """Медленный сервис yandex, фиксирующий открытые транзакции БД."""
+    from django.db import connection
+
+    calls = []
+
+    def in_transaction():
+        if connection.in_atomic_block:
+            return True
+        if connection.connection is None:
+            return False
+        if connection.vendor == "sqlite":
+            return connection.connection.in_transaction
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+        return (
+            connection.connection.info.transaction_status
+            != TRANSACTION_STATUS_IDLE
+        )
+
+    def request_weather(latitude, longitude):
+        calls.append(in_transaction())
+        time.sleep(0.3)
+        return {"temp": 5, "pressure_mm": 745, "wind_speed": 3.2}
+
+    monkeypatch.setattr(
+        "api.services.request_weather_from_yandex_api", request_weather
+    )
+    return calls
+
+
+@pytest.fixture
+def async_yandex_weather(monkeypatch):
+    """Подменяет асинхронный запрос к сервису yandex с задержкой 0.2 с."""
+    calls = []
+
+    async def request_weather(latitude, longitude):
+        calls.append((latitude, longitude))
+        await asyncio.sleep(0.2)
+        return {"temp": 5, "pressure_mm": 745, "wind_speed": 3.2}
+
+    monkeypatch.setattr(
+        "api.services.arequest_weather_from_yandex_api", request_weather
+    )
+    return calls
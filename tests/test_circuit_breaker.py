@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import pytest
+from core.circuit_breaker import CircuitBreaker
+from core.exceptions import CircuitBreakerOpenError
+
+
+class TestCircuitBreaker:
+    def fail(self):
+        raise ValueError
+
+    def test_open_and_recover(self):
+        breaker = CircuitBreaker(
+            "test", window_size=4, minimum_calls=4, cooldown=0.05
+        )
+        for _ in range(4):
+            with pytest.raises(ValueError):
+                breaker.call(self.fail)
+        assert (
+            breaker.state == CircuitBreaker.OPEN
+        ), "Проверьте, что цепь размыкается при превышении доли ошибок"
+        with pytest.raises(CircuitBreakerOpenError):
+            breaker.call(lambda: None)
+        time.sleep(0.06)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.call(lambda: 1) == 1
+        assert (
+            breaker.state == CircuitBreaker.CLOSED
+        ), "Проверьте, что успешный пробный вызов замыкает цепь"
+        assert [item["to"] for item in breaker.snapshot()["transitions"]] == [
+            CircuitBreaker.OPEN,
+            CircuitBreaker.HALF_OPEN,
+            CircuitBreaker.CLOSED,
+        ]
+
+    def get_half_open_breaker(self):
+        breaker = CircuitBreaker(
+            "test",
+            window_size=2,
+            minimum_calls=2,
+            cooldown=0.05,
+            failure_exceptions=(ValueError,),
+        )
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                breaker.call(self.fail)
+        time.sleep(0.06)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        return breaker
+
+    def test_unexpected_error_releases_probe(self):
+        breaker = self.get_half_open_breaker()
+
+        def probe():
+            raise KeyError
+
+        with pytest.raises(KeyError):
+            breaker.call(probe)
+        assert breaker.state == CircuitBreaker.OPEN, (
+            "Проверьте, что пробный вызов с неучтенной ошибкой "
+            "снова размыкает цепь"
+        )
+        time.sleep(0.06)
+        assert breaker.call(lambda: 1) == 1, (
+            "Проверьте, что после прерванного пробного вызова "
+            "допускается новый пробный вызов"
+        )
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_cancelled_probe_released(self):
+        breaker = self.get_half_open_breaker()
+
+        async def probe():
+            task = asyncio.ensure_future(breaker.acall(asyncio.sleep, 1))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(probe())
+        assert (
+            breaker.state == CircuitBreaker.OPEN
+        ), "Проверьте, что отмененный пробный вызов освобождается"
+        time.sleep(0.06)
+        assert breaker.call(lambda: 1) == 1
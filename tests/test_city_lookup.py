@@ -0,0 +1,212 @@
+from rest_framework import status
+from rest_framework.test import APIClient
+
+import pytest
+from core.utils import normalize_city_name
+
+
+class TestNormalizeCityName:
+    @pytest.mark.parametrize(
+        "city",
+        ("Вышний Волочёк", "вышний-волочек", " ВЫШНИЙ  –  Волочек "),
+    )
+    def test_normalize_city_name(self, city):
+        assert normalize_city_name(city) == "вышний-волочек", (
+            "Проверьте, что регистр, буквы ё/е, пробелы и тире "
+            "не влияют на нормализованное наименование города"
+        )
+
+
+@pytest.mark.django_db
+class TestCityLookup:
+    def test_lookup_uses_index(self, city_weather):
+        from django.db import connection
+
+        from api.models import YandexWeatherModel
+
+        if connection.vendor == "postgresql":
+            # На маленькой таблице планировщик предпочитает seqscan.
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan TO off")
+        plan = YandexWeatherModel.objects.filter(
+            city_normalized=normalize_city_name("москва")
+        ).explain()
+        assert "INDEX" in plan.upper() and "city_normalized" in plan, (
+            "Проверьте, что поиск города по нормализованному наименованию "
+            f"использует индекс. План запроса: {plan}"
+        )
+
+    def test_lookup_by_variant(self, yandex_weather):
+        from api.models import YandexWeatherModel
+
+        YandexWeatherModel.objects.create(
+            city="Вышний Волочёк", latitude=57.58333, longitude=34.56667
+        )
+        response = APIClient().get("/api/weather/", {"city": "Вышний-Волочек"})
+        assert (
+            response.status_code == status.HTTP_200_OK
+        ), "Проверьте, что город находится без учета букв ё/е и дефисов"
+
+
+@pytest.mark.django_db
+class TestCitySuggest:
+    def test_suggest_prefix_and_typo(
+        self, city_weather, django_assert_num_queries
+    ):
+        from api.models import YandexWeatherModel
+
+        client = APIClient()
+        client.get("/api/cities/suggest/", {"q": "м"})
+        YandexWeatherModel.objects.create(
+            city="Мурманск", latitude=68.97917, longitude=33.09251
+        )
+        with django_assert_num_queries(0):
+            prefix = client.get("/api/cities/suggest/", {"q": "Му"})
+            typo = client.get("/api/cities/suggest/", {"q": "Масква"})
+        assert prefix.json()["results"] == [
+            {"city": "Мурманск", "match": "prefix"}
+        ], (
+            "Проверьте, что подсказки ищутся по началу наименования "
+            "и индекс обновляется при добавлении города"
+        )
+        assert {"city": "Москва", "match": "similar"} in typo.json()[
+            "results"
+        ], "Проверьте, что подсказки находят города с опечаткой"
+
+    def test_index_rebuilt_after_import(self, city_weather, monkeypatch):
+        from api.importers import CityImporter
+        from api.indexes import city_suggest_index
+
+        assert city_suggest_index.suggest("Мос")[0]["city"] == "Москва"
+        CityImporter(upsert="coords").load(
+            [
+                {
+                    "city": "Москва-Сити",
+                    "latitude": city_weather.latitude,
+                    "longitude": city_weather.longitude,
+                }
+            ]
+        )
+        monkeypatch.setattr(city_suggest_index, "check_interval", 0)
+        assert city_suggest_index.suggest("Мос") == [
+            {"city": "Москва-Сити", "match": "prefix"}
+        ], (
+            "Проверьте, что индекс перестраивается после изменения "
+            "наименования города в обход сигналов"
+        )
+
+    def test_ranking_follows_popularity(self, city_weather, monkeypatch):
+        from django.db.models import F
+
+        from api.indexes import city_suggest_index
+        from api.models import YandexWeatherModel
+
+        moscow_region = YandexWeatherModel.objects.create(
+            city="Московский", latitude=55.6, longitude=37.35
+        )
+        assert city_suggest_index.suggest("Мос")[0]["city"] == "Москва"
+        YandexWeatherModel.objects.filter(pk=moscow_region.pk).update(
+            requests_count=F("requests_count") + 10
+        )
+        monkeypatch.setattr(city_suggest_index, "check_interval", 0)
+        assert city_suggest_index.suggest("Мос")[0]["city"] == "Московский", (
+            "Проверьте, что ранжирование подсказок учитывает популярность, "
+            "обновленную в обход сигналов"
+        )
+
+    def test_abstract_index(self):
+        from api.indexes import ModelIndex
+
+        with pytest.raises(TypeError):
+            ModelIndex()
+
+    def test_build_sorted(self):
+        from api.indexes import CitySuggestIndex
+
+        index = CitySuggestIndex()
+        index.build(
+            [
+                (3, "Тула", "тула", 0),
+                (1, "Омск", "омск", 0),
+                (2, "Орёл", "орел", 0),
+            ]
+        )
+        assert index._sorted == [("омск", 1), ("орел", 2), ("тула", 3)]
+        index.add((4, "Пермь", "пермь", 0))
+        assert [name for name, _ in index._sorted] == [
+            "омск",
+            "орел",
+            "пермь",
+            "тула",
+        ]
+
+
+@pytest.mark.django_db
+class TestNearestCity:
+    def test_nearest_weather(self, city_weather, yandex_weather):
+        from api.models import YandexWeatherModel
+
+        YandexWeatherModel.objects.bulk_create(
+            [
+                YandexWeatherModel(
+                    city="Тула", latitude=54.19609, longitude=37.61822
+                ),
+                YandexWeatherModel(
+                    city="Санкт-Петербург",
+                    latitude=59.93863,
+                    longitude=30.31413,
+                ),
+            ]
+        )
+        response = APIClient().get(
+            "/api/weather/nearest/", {"lat": 54.5, "lon": 37.5, "k": 2}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()["results"]
+        assert [result["city"] for result in results] == [
+            "Тула",
+            "Москва",
+        ], "Проверьте, что города отсортированы по удаленности"
+        assert 30 < results[0]["distance_km"] < 40
+        assert results[0]["weather"]["temp"] == 5
+
+    def test_kd_tree_matches_linear_scan(self):
+        import random
+
+        from api.indexes import (
+            CityNearestIndex,
+            get_chord_distance_km,
+            get_unit_vector,
+        )
+
+        generator = random.Random(0)
+        points = [
+            (
+                pk,
+                str(pk),
+                generator.uniform(-90, 90),
+                generator.uniform(-180, 180),
+            )
+            for pk in range(500)
+        ]
+        index = CityNearestIndex()
+        index.build(points)
+        index._checked_at = float("inf")
+        for _ in range(50):
+            latitude = generator.uniform(-90, 90)
+            longitude = generator.uniform(-180, 180)
+            target = get_unit_vector(latitude, longitude)
+            expected = sorted(
+                points,
+                key=lambda point: get_chord_distance_km(
+                    sum(
+                        (a - b) ** 2
+                        for a, b in zip(get_unit_vector(*point[2:]), target)
+                    )
+                ),
+            )[:3]
+            assert [
+                city["pk"] for city in index.nearest(latitude, longitude, 3)
+            ] == [
+                point[0] for point in expected
+            ], "Проверьте, что поиск по k-d дереву совпадает с перебором"
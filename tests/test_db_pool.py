@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+
+
+class FakeInfo:
+    def __init__(self):
+        self.transaction_status = 0
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, sql):
+        from psycopg2 import OperationalError
+
+        if self.connection.broken:
+            raise OperationalError("server closed the connection")
+
+
+class FakeConnection:
+    """Соединение psycopg2 без сервера БД."""
+
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.info = FakeInfo()
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.info.transaction_status = 0
+
+    def close(self):
+        self.closed = 1
+
+
+class TestConnectionPool:
+    def get_pool(self, **kwargs):
+        from core.db.backends.postgresql_pool.pool import ConnectionPool
+
+        return ConnectionPool(FakeConnection, **kwargs)
+
+    def test_connection_reused(self):
+        pool = self.get_pool(max_size=2)
+        connection = pool.acquire()
+        connection.info.transaction_status = 2
+        pool.release(connection)
+        assert (
+            pool.acquire() is connection
+        ), "Проверьте, что свободное соединение используется повторно"
+        assert (
+            connection.info.transaction_status == 0
+        ), "Проверьте, что незавершенная транзакция откатывается"
+        assert pool.stats["connects"] == 1
+        assert pool.stats["reuses"] == 1
+
+    def test_broken_connection_replaced(self):
+        pool = self.get_pool(max_size=1)
+        connection = pool.acquire()
+        pool.release(connection)
+        connection.broken = True
+        new_connection = pool.acquire()
+        assert (
+            new_connection is not connection
+        ), "Проверьте, что соединение проверяется перед выдачей"
+        assert connection.closed
+        assert pool.size == 1
+
+    def test_wait_timeout(self):
+        from core.db.backends.postgresql_pool.pool import PoolTimeoutError
+
+        pool = self.get_pool(max_size=1, timeout=0.05)
+        pool.acquire()
+        with pytest.raises(PoolTimeoutError):
+            pool.acquire()
+        assert pool.stats["timeouts"] == 1
+
+    def test_waiter_gets_released_connection(self):
+        pool = self.get_pool(max_size=1, timeout=1)
+        connection = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, (connection,))
+        timer.start()
+        started = time.monotonic()
+        assert (
+            pool.acquire() is connection
+        ), "Проверьте, что ожидающий поток получает освобожденное соединение"
+        assert time.monotonic() - started < 1
+        assert pool.stats["waits"] >= 1
+
+
+@pytest.mark.postgres
+@pytest.mark.django_db
+class TestPoolBackend:
+    alias = "pool_test"
+
+    @pytest.fixture
+    def wrapper(self, monkeypatch):
+        from django.db import connection
+
+        from core.db.backends.postgresql_pool import pool
+        from core.db.backends.postgresql_pool.base import DatabaseWrapper
+
+        monkeypatch.setattr(pool, "_pools", {})
+        wrapper = DatabaseWrapper(
+            {
+                **connection.settings_dict,
+                "ENGINE": "core.db.backends.postgresql_pool",
+                "POOL": {"MAX_SIZE": 1, "TIMEOUT": 1.0},
+            },
+            alias=self.alias,
+        )
+        yield wrapper
+        wrapper.close()
+        wrapper.pool.close()
+
+    def execute(self, wrapper, sql):
+        with wrapper.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchone()
+
+    def test_connection_returned_to_pool(self, wrapper):
+        pid = self.execute(wrapper, "SELECT pg_backend_pid()")
+        wrapper.close()
+        assert self.execute(wrapper, "SELECT pg_backend_pid()") == pid, (
+            "Проверьте, что после закрытия соединение Django возвращается "
+            "в пул и используется повторно"
+        )
+        assert wrapper.pool.stats["connects"] == 1
+        assert wrapper.pool.stats["reuses"] == 1
+
+    def test_open_transaction_rolled_back(self, wrapper):
+        wrapper.set_autocommit(False)
+        self.execute(wrapper, "CREATE TEMP TABLE pool_test (id int)")
+        wrapper.close()
+        assert self.execute(wrapper, "SELECT to_regclass('pool_test')") == (
+            None,
+        ), "Проверьте, что незавершенная транзакция откатывается в пуле"
+        assert wrapper.pool.stats["reuses"] == 1
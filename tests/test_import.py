@@ -0,0 +1,209 @@
+import io
+import json
+
+from django.core.management import call_command
+
+import pytest
+from api.models import YandexWeatherModel
+
+
+class TestIterJsonArray:
+    @pytest.mark.parametrize("chunk_size", [1, 3, 64 * 1024])
+    @pytest.mark.parametrize(
+        "data",
+        [
+            "[]",
+            " [ ] ",
+            '[{"city": "Москва"}, {"city": "Тула, Россия"}]',
+            '[12345678, [1, 2], \n"a" , null]',
+        ],
+    )
+    def test_stream_equals_json_load(self, data, chunk_size):
+        from core.utils import iter_json_array
+
+        assert list(iter_json_array(io.StringIO(data), chunk_size)) == (
+            json.loads(data)
+        ), "Проверьте, что потоковое чтение совпадает с json.load"
+
+    @pytest.mark.parametrize("chunk_size", [1, 64 * 1024])
+    @pytest.mark.parametrize(
+        "data",
+        [
+            '[{"a": 1} {"b": 2}]',
+            "[1 2]",
+            "[1,]",
+            "[,1]",
+            "[1,,2]",
+            "[1, 2",
+            '{"a": 1}',
+        ],
+    )
+    def test_malformed_array_rejected(self, data, chunk_size):
+        from core.utils import iter_json_array
+
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_json_array(io.StringIO(data), chunk_size))
+
+
+@pytest.mark.django_db
+class TestJsonImport:
+    cities = [
+        {"city": "Тула", "latitude": 54.2, "longitude": 37.6},
+        {"city": "Омск", "latitude": 54.98, "longitude": 73.37},
+        {"city": "Орёл", "latitude": 52.97, "longitude": 36.07},
+        {"city": "Сочи", "latitude": 43.6, "longitude": 39.73},
+        {"city": "Москва", "latitude": 1.0, "longitude": 2.0},
+    ]
+
+    def import_json(self, tmp_path, data, **kwargs):
+        path = tmp_path / "cities.json"
+        path.write_text(
+            data if isinstance(data, str) else json.dumps(data),
+            encoding="utf-8",
+        )
+        stdout = io.StringIO()
+        call_command(
+            "import_json",
+            path=str(path),
+            model="YandexWeatherModel",
+            stdout=stdout,
+            **kwargs,
+        )
+        return stdout.getvalue()
+
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_batches(self, tmp_path, stream):
+        output = self.import_json(
+            tmp_path, self.cities, stream=stream, batch_size=2
+        )
+        assert [
+            line.split(":")[1].split()[0] for line in output.splitlines()
+        ] == ["2", "4", "5"], (
+            "Проверьте, что записи загружаются пакетами по --batch-size, "
+            "включая неполный последний пакет"
+        )
+        assert YandexWeatherModel.objects.count() == len(self.cities)
+        assert YandexWeatherModel.objects.get(city="Орёл").city_normalized == (
+            "орел"
+        )
+
+    def test_upsert_city(self, tmp_path, city_weather):
+        self.import_json(
+            tmp_path, self.cities, stream=True, batch_size=2, upsert="city"
+        )
+        city_weather.refresh_from_db()
+        assert (city_weather.latitude, city_weather.longitude) == (
+            1.0,
+            2.0,
+        ), "Проверьте, что --upsert обновляет существующий город"
+        assert YandexWeatherModel.objects.count() == len(self.cities)
+
+    def test_stream_malformed_file(self, tmp_path):
+        data = json.dumps(self.cities[:2]).replace("}, {", "} {")
+        with pytest.raises(json.JSONDecodeError):
+            self.import_json(tmp_path, data, stream=True, batch_size=1)
+
+
+@pytest.mark.django_db
+class TestCityImport:
+    def test_copy_engine_fallback(self, tmp_path, city_weather):
+        path = tmp_path / "cities.json"
+        path.write_text(
+            json.dumps(
+                [
+                    {"city": "Москва", "latitude": 1.0, "longitude": 2.0},
+                    {"city": "Тула", "latitude": 54.2, "longitude": 37.6},
+                    {"city": "Ой", "latitude": 10.0, "longitude": 10.0},
+                    {"city": "Омск", "latitude": 95.0, "longitude": 73.3},
+                    {"city": "Орёл", "latitude": "x", "longitude": 36.0},
+                ]
+            ),
+            encoding="utf-8",
+        )
+        call_command(
+            "import_json",
+            path=str(path),
+            model="YandexWeatherModel",
+            stream=True,
+            engine="copy",
+            upsert="city",
+            batch_size=2,
+        )
+        cities = dict(
+            YandexWeatherModel.objects.values_list("city", "latitude")
+        )
+        assert cities == {
+            "Москва": 1.0,
+            "Тула": 54.2,
+        }, "Некорректные записи не должны попадать в базу"
+
+    def test_skipped_conflicts_not_loaded(self, city_weather):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from api.importers import CityImporter
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = CityImporter(batch_size=2).load(
+                [
+                    {"city": "Москва", "latitude": 1.0, "longitude": 2.0},
+                    {"city": "Тула", "latitude": 54.2, "longitude": 37.6},
+                    {"city": "Орёл", "latitude": 52.97, "longitude": 36.07},
+                ]
+            )
+        assert not [
+            query["sql"]
+            for query in queries
+            if "COUNT(" in query["sql"] and "WHERE" not in query["sql"]
+        ], "Проверьте, что для пакета не считаются все записи таблицы"
+        assert stats.loaded == 2, (
+            "Проверьте, что пропущенные из-за конфликта записи "
+            "не учитываются как загруженные"
+        )
+        city_weather.refresh_from_db()
+        assert city_weather.latitude == 55.75222
+
+
+@pytest.mark.postgres
+@pytest.mark.django_db(transaction=True)
+class TestCityImportPostgres:
+    def test_copy_and_merge(self, city_weather):
+        from api.importers import CityImporter
+
+        importer = CityImporter(batch_size=2)
+        assert importer.is_copy_supported
+        stats = importer.load(
+            [
+                {"city": "москва", "latitude": 1.0, "longitude": 2.0},
+                {"city": "Тула", "latitude": 54.2, "longitude": 37.6},
+                {"city": "тула", "latitude": 54.3, "longitude": 37.7},
+                {
+                    "city": "Новомосковск",
+                    "latitude": 55.75222,
+                    "longitude": 37.61556,
+                },
+                {"city": "Орёл", "latitude": 52.97, "longitude": 36.07},
+            ]
+        )
+        assert stats.read == 5
+        assert stats.loaded == 2, (
+            "Проверьте, что COPY и INSERT ... ON CONFLICT загружают только "
+            "новые города без дубликатов по наименованию и координатам"
+        )
+        assert set(
+            YandexWeatherModel.objects.values_list(
+                "city_normalized", flat=True
+            )
+        ) == {"москва", "тула", "орел"}
+        city_weather.refresh_from_db()
+        assert city_weather.latitude == 55.75222
+
+        stats = CityImporter(batch_size=2, upsert="city").load(
+            [{"city": "Москва", "latitude": 1.0, "longitude": 2.0}]
+        )
+        assert stats.loaded == 1
+        city_weather.refresh_from_db()
+        assert (city_weather.latitude, city_weather.longitude) == (
+            1.0,
+            2.0,
+        ), "Проверьте, что upsert обновляет город при конфликте"
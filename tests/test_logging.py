@@ -0,0 +1,78 @@
+import gzip
+import json
+import logging
+import threading
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.records.append(record)
+        self.threads.add(threading.current_thread().name)
+
+
+def get_record(level=logging.INFO, msg="Погода %s", args=("Москва",)):
+    return logging.LogRecord("api", level, __file__, 1, msg, args, None)
+
+
+class TestLogging:
+    def test_queue_handler_emits_in_background(self):
+        from yandex_weather.log_config import BackgroundQueueHandler
+
+        target = ListHandler()
+        handler = BackgroundQueueHandler([target])
+        try:
+            handler.handle(get_record())
+        finally:
+            handler.stop()
+        assert [record.getMessage() for record in target.records] == [
+            "Погода Москва"
+        ], "Проверьте, что записи передаются обработчикам из очереди"
+        assert (
+            threading.current_thread().name not in target.threads
+        ), "Проверьте, что обработчики выполняются в фоновом потоке"
+
+    def test_full_queue_drops_records(self):
+        from yandex_weather.log_config import BackgroundQueueHandler
+
+        handler = BackgroundQueueHandler([], maxsize=1)
+        handler.stop()
+        handler.handle(get_record())
+        handler.handle(get_record())
+        assert (
+            handler.dropped == 1
+        ), "Проверьте, что при заполненной очереди запись отбрасывается"
+
+    def test_debug_sampling(self):
+        from yandex_weather.log_config import DebugSamplingFilter
+
+        sampling = DebugSamplingFilter(rate=0)
+        assert not sampling.filter(get_record(logging.DEBUG))
+        assert sampling.filter(
+            get_record(logging.WARNING)
+        ), "Проверьте, что записи выше DEBUG не отбрасываются"
+
+    def test_json_formatter(self):
+        from yandex_weather.log_config import JsonFormatter
+
+        data = json.loads(JsonFormatter().format(get_record()))
+        assert data["message"] == "Погода Москва"
+        assert data["level"] == "INFO"
+        assert data["logger"] == "api"
+
+    def test_rotator_compresses_log(self, tmp_path):
+        from yandex_weather.log_config import rotator
+
+        source = tmp_path / "error.log"
+        source.write_text("ошибка\n")
+        rotator(str(source), str(tmp_path / "error.log.1.gz"))
+        for thread in threading.enumerate():
+            if thread.name == "log-compress":
+                thread.join()
+        assert not source.exists()
+        with gzip.open(tmp_path / "error.log.1.gz", "rt") as file:
+            assert file.read() == "ошибка\n", "Проверьте сжатие лога"
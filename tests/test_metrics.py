@@ -0,0 +1,225 @@
+import asyncio
+import json
+import time
+
+from django.test import AsyncClient
+from rest_framework import status
+from rest_framework.test import APIClient
+
+import pytest
+from asgiref.sync import async_to_sync
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    def test_metrics_endpoint(self, city_weather, yandex_weather):
+        from core.metrics import registry
+
+        registry.reset()
+        client = APIClient()
+        client.get("/api/weather/", {"city": "Москва"})
+        client.get("/api/weather/", {"city": "Москва"})
+        response = client.get("/metrics/")
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"].startswith("text/plain")
+        metrics = response.content.decode()
+        for line in (
+            'weather_http_request_duration_seconds_count{view="api:weather",'
+            'status="200"} 2',
+            'weather_cache_requests_total{result="hit"} 1',
+            "weather_cache_hit_ratio 0.5",
+            'weather_refreshes_total{bucket="0"} 1',
+        ):
+            assert line in metrics, f"Проверьте, что метрики содержат {line}"
+        assert 'weather_http_request_db_queries_bucket{view="api:weather"' in (
+            metrics
+        ), "Проверьте, что учитывается количество запросов к БД"
+
+    def test_metrics_merged_between_processes(self, tmp_path):
+        from core.metrics import MetricsRegistry
+
+        registry = MetricsRegistry(directory=str(tmp_path))
+        counter = registry.counter("test_total", "Test counter.", ("kind",))
+        histogram = registry.histogram(
+            "test_seconds", "Test histogram.", buckets=(1.0,)
+        )
+        counter.inc(kind="a")
+        histogram.observe(0.5)
+        (tmp_path / "1.json").write_text(
+            json.dumps(
+                {
+                    "test_total": [[["a"], 2]],
+                    "test_seconds": [[[], [0, 1, 3.0, 1]]],
+                }
+            )
+        )
+        metrics = registry.render()
+        assert (
+            'test_total{kind="a"} 3' in metrics
+        ), "Проверьте, что счетчики процессов суммируются"
+        assert 'test_seconds_bucket{le="1.0"} 1' in metrics
+        assert 'test_seconds_bucket{le="+Inf"} 2' in metrics
+        assert "test_seconds_sum 3.5" in metrics
+
+    def test_flushed_in_background(self, tmp_path):
+        import threading
+        import time
+
+        from core.metrics import MetricsRegistry
+
+        registry = MetricsRegistry(directory=str(tmp_path), flush_interval=0)
+        counter = registry.counter("test_total", "Test counter.")
+        threads = []
+        write = registry._write
+
+        def record_write(file_name, values):
+            threads.append(threading.get_ident())
+            write(file_name, values)
+
+        registry._write = record_write
+        counter.inc()
+        for _ in range(100):
+            if (tmp_path / registry.file_name).exists():
+                break
+            time.sleep(0.01)
+        registry.stop()
+        assert threads and threading.get_ident() not in threads, (
+            "Проверьте, что метрики записываются в файл фоновым потоком, "
+            "а не в запросе"
+        )
+
+    def test_dead_process_files_archived(self, tmp_path):
+        import os
+        import subprocess
+        import sys
+
+        from core.metrics import MetricsRegistry
+
+        registry = MetricsRegistry(directory=str(tmp_path))
+        counter = registry.counter("test_total", "Test counter.")
+        counter.inc()
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        for file_name in (
+            f"{process.pid}-dead.json",
+            f"{os.getpid()}-reused.json",
+        ):
+            (tmp_path / file_name).write_text(
+                json.dumps({"test_total": [[[], 2]]})
+            )
+        assert (
+            "test_total 5" in registry.render()
+        ), "Проверьте, что значения завершившихся процессов учитываются"
+        assert sorted(path.name for path in tmp_path.glob("*.json")) == [
+            registry.file_name,
+            "archive.json",
+        ], (
+            "Проверьте, что файлы завершившихся процессов и процесса "
+            "с повторно использованным pid переносятся в архив"
+        )
+        counter.inc()
+        assert "test_total 6" in registry.render()
+
+
+@pytest.mark.django_db
+class TestServerTiming:
+    def test_server_timing_header(self, city_weather, monkeypatch):
+        from core.timing import timed
+
+        def request_weather(latitude, longitude):
+            with timed("upstream"):
+                return {"temp": 5, "pressure_mm": 745, "wind_speed": 3.2}
+
+        monkeypatch.setattr(
+            "api.services.request_weather_from_yandex_api", request_weather
+        )
+        response = APIClient().get("/api/weather/", {"city": "Москва"})
+        assert response.status_code == status.HTTP_200_OK
+        timing = response["Server-Timing"]
+        for metric in ("db;dur=", "upstream;dur=", "queries;desc=", "total"):
+            assert (
+                metric in timing
+            ), f"Проверьте, что Server-Timing содержит {metric}"
+
+    def test_profile_requested_by_header(
+        self, city_weather, slow_yandex_weather, monkeypatch, tmp_path
+    ):
+        from core.profiler import profiler
+
+        monkeypatch.setattr("core.middleware.PROFILER_TOKEN", "secret")
+        monkeypatch.setattr(profiler, "directory", str(tmp_path))
+        client = APIClient()
+        response = client.get(
+            "/api/weather/", {"city": "Москва"}, HTTP_X_PROFILE="secret"
+        )
+        stacks = (tmp_path / response["X-Profile-File"]).read_text()
+        assert stacks, "Проверьте, что стеки запроса сохранены"
+        assert all(
+            line.rsplit(" ", 1)[1].isdigit() for line in stacks.splitlines()
+        ), "Проверьте формат folded: стек и количество через пробел"
+        assert "request_weather" in stacks
+        response = client.get(
+            "/api/weather/", {"city": "Москва"}, HTTP_X_PROFILE="wrong"
+        )
+        assert "X-Profile-File" not in response
+
+    @pytest.mark.django_db(transaction=True)
+    def test_profile_async_request(
+        self, city_weather, async_yandex_weather, monkeypatch, tmp_path
+    ):
+        from core.profiler import profiler
+
+        monkeypatch.setattr("core.middleware.PROFILER_TOKEN", "secret")
+        monkeypatch.setattr(profiler, "directory", str(tmp_path))
+
+        async def get():
+            return await AsyncClient().get(
+                "/api/weather/async/",
+                {"city": "Москва"},
+                headers={"X-Profile": "secret"},
+            )
+
+        response = async_to_sync(get)()
+        assert response.status_code == status.HTTP_200_OK
+        assert (
+            tmp_path / response["X-Profile-File"]
+        ).read_text(), "Проверьте, что профилируются асинхронные запросы"
+
+
+@pytest.mark.django_db(transaction=True)
+class TestAsyncMiddleware:
+    cities = ("Москва", "Казань", "Омск", "Тверь", "Сочи")
+
+    def test_concurrent_async_requests_overlap(self, async_yandex_weather):
+        from api.models import YandexWeatherModel
+
+        YandexWeatherModel.objects.bulk_create(
+            YandexWeatherModel(city=city, latitude=40 + index, longitude=40)
+            for index, city in enumerate(self.cities)
+        )
+        client = AsyncClient()
+
+        async def get_all():
+            return await asyncio.gather(
+                *(
+                    client.get("/api/weather/async/", {"city": city})
+                    for city in self.cities
+                )
+            )
+
+        started = time.perf_counter()
+        responses = async_to_sync(get_all)()
+        elapsed = time.perf_counter() - started
+        assert [response.status_code for response in responses] == [
+            status.HTTP_200_OK
+        ] * len(self.cities)
+        assert len(async_yandex_weather) == len(self.cities)
+        assert elapsed < 0.2 * len(self.cities) / 2, (
+            "Проверьте, что middleware поддерживают асинхронный режим "
+            "и конкурентные асинхронные запросы выполняются параллельно"
+        )
+        assert all(
+            "queries;desc=" in response["Server-Timing"]
+            and "db;dur=" in response["Server-Timing"]
+            for response in responses
+        ), "Проверьте, что запросы к БД учитываются в асинхронном режиме"
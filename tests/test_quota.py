@@ -0,0 +1,101 @@
+import asyncio
+import multiprocessing
+import threading
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+import pytest
+
+
+def acquire_in_child(path):
+    from core.quota import UpstreamQuota
+
+    UpstreamQuota(path, per_second=0, per_day=3).acquire()
+
+
+class TestUpstreamQuota:
+    def test_background_reserve(self, tmp_path):
+        from core.quota import BACKGROUND_PRIORITY, UpstreamQuota
+
+        quota = UpstreamQuota(
+            str(tmp_path / "quota.json"),
+            per_second=2,
+            per_day=0,
+            background_reserve=0.5,
+        )
+        assert quota.acquire(BACKGROUND_PRIORITY)
+        assert not quota.acquire(
+            BACKGROUND_PRIORITY
+        ), "Проверьте, что фоновые запросы не используют резерв квоты"
+        assert (
+            quota.acquire()
+        ), "Проверьте, что резерв квоты доступен запросам пользователей"
+        assert quota.snapshot()["per_second_remaining"] == 0
+
+    def test_daily_quota_shared_between_processes(self, tmp_path):
+        from core.quota import UpstreamQuota
+
+        path = str(tmp_path / "quota.json")
+        process = multiprocessing.get_context("fork").Process(
+            target=acquire_in_child, args=(path,)
+        )
+        process.start()
+        process.join()
+        quota = UpstreamQuota(path, per_second=0, per_day=3)
+        assert quota.acquire()
+        assert quota.acquire()
+        assert (
+            not quota.acquire()
+        ), "Проверьте, что суточная квота общая для процессов"
+        assert quota.snapshot()["per_day_remaining"] == 0
+
+
+@pytest.mark.django_db
+class TestQuotaExceeded:
+    def test_stale_served(self, city_weather, monkeypatch):
+        from core.exceptions import UpstreamQuotaExceededError
+
+        def request_weather(latitude, longitude):
+            raise UpstreamQuotaExceededError()
+
+        monkeypatch.setattr(
+            "api.services.request_weather_from_yandex_api", request_weather
+        )
+        city_weather.updated_at = timezone.now() - timedelta(minutes=50)
+        city_weather.temp = 1
+        city_weather.pressure_mm = 740
+        city_weather.wind_speed = 1.0
+        city_weather.save()
+        response = APIClient().get("/api/weather/", {"city": "Москва"})
+        assert (
+            response.status_code == status.HTTP_200_OK
+        ), "Проверьте, что при исчерпанной квоте отдаются устаревшие данные"
+        assert response["X-Weather-Stale"] == "true"
+
+    def test_async_quota_off_event_loop(self, monkeypatch):
+        from core import utils
+        from core.exceptions import UpstreamQuotaExceededError
+
+        threads = []
+
+        def acquire_upstream_quota():
+            threads.append(threading.get_ident())
+            raise UpstreamQuotaExceededError()
+
+        async def request_weather():
+            threads.append(threading.get_ident())
+            await utils.arequest_weather_from_yandex_api(55.75, 37.62)
+
+        monkeypatch.setattr(utils.upstream_quota, "per_day", 1)
+        monkeypatch.setattr(
+            utils, "acquire_upstream_quota", acquire_upstream_quota
+        )
+        with pytest.raises(UpstreamQuotaExceededError):
+            asyncio.run(request_weather())
+        assert threads[0] != threads[1], (
+            "Проверьте, что квота асинхронного запроса списывается "
+            "вне потока цикла событий"
+        )
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+
+class TestAsyncSingleFlight:
+    def test_leader_cancel_keeps_followers(self):
+        from core.singleflight import AsyncSingleFlight
+
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def run():
+            leader = asyncio.ensure_future(flight.do("key", work))
+            await asyncio.sleep(0)
+            followers = [
+                asyncio.ensure_future(flight.do("key", work)) for _ in range(3)
+            ]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await asyncio.gather(*followers)
+
+        assert asyncio.run(run()) == ["result"] * 3, (
+            "Проверьте, что отмена первого вызова не отменяет "
+            "ожидающие вызовы"
+        )
+        assert calls == [1]
+        assert flight.in_flight() == 0
+
+    def test_error_shared(self):
+        from core.singleflight import AsyncSingleFlight
+
+        flight = AsyncSingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError
+
+        async def run():
+            return await asyncio.gather(
+                flight.do("key", work),
+                flight.do("key", work),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(run())
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flight.in_flight() == 0
@@ -0,0 +1,194 @@
+import asyncio
+import os
+
+import httpx
+
+import pytest
+
+URL = "https://api.weather.yandex.ru/v2/forecast"
+
+
+def get_handler(responses):
+    """Отдает ответы responses по очереди и записывает запросы."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        response = responses[min(len(requests), len(responses)) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return httpx.Response(response)
+
+    return handler, requests
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    delays = []
+
+    def get_backoff(attempt):
+        delays.append(attempt)
+        return 0
+
+    monkeypatch.setattr("core.upstream.get_backoff", get_backoff)
+    return delays
+
+
+class TestUpstreamClient:
+    def get_client(self, handler, retries=2, quota=None):
+        from core.upstream import UpstreamClient
+
+        client = UpstreamClient(retries=retries, quota=quota)
+        client._client = httpx.Client(transport=httpx.MockTransport(handler))
+        client._pid = os.getpid()
+        return client
+
+    @pytest.mark.parametrize("code", [429, 500, 503])
+    def test_retry_on_temporary_error(self, no_backoff, code):
+        handler, requests = get_handler([code, 200])
+        response = self.get_client(handler).get(URL)
+        assert (
+            response.status_code == 200
+        ), f"Проверьте, что запрос повторяется после ответа {code}"
+        assert len(requests) == 2
+        assert no_backoff == [0]
+
+    def test_retry_on_timeout(self, no_backoff):
+        handler, requests = get_handler([httpx.ReadTimeout("timeout"), 200])
+        response = self.get_client(handler).get(URL)
+        assert (
+            response.status_code == 200
+        ), "Проверьте, что запрос повторяется после таймаута"
+        assert len(requests) == 2
+
+    def test_give_up_after_retries(self, no_backoff):
+        handler, requests = get_handler([503])
+        response = self.get_client(handler, retries=2).get(URL)
+        assert response.status_code == 503, (
+            "Проверьте, что после исчерпания повторов возвращается "
+            "последний ответ"
+        )
+        assert len(requests) == 3
+        assert no_backoff == [0, 1]
+
+    def test_timeout_raised_after_retries(self, no_backoff):
+        handler, requests = get_handler([httpx.ConnectTimeout("timeout")])
+        with pytest.raises(httpx.ConnectTimeout):
+            self.get_client(handler, retries=1).get(URL)
+        assert len(requests) == 2
+
+    @pytest.mark.parametrize("code", [400, 403, 404])
+    def test_no_retry_on_client_error(self, no_backoff, code):
+        handler, requests = get_handler([code, 200])
+        response = self.get_client(handler).get(URL)
+        assert response.status_code == code
+        assert (
+            len(requests) == 1
+        ), f"Проверьте, что запрос не повторяется после ответа {code}"
+        assert not no_backoff
+
+    def test_retry_acquires_quota(self, no_backoff, tmp_path):
+        from core.quota import UpstreamQuota
+
+        quota = UpstreamQuota(str(tmp_path / "quota.json"), 0, 1)
+        handler, requests = get_handler([503])
+        response = self.get_client(handler, retries=3, quota=quota).get(URL)
+        assert response.status_code == 503
+        assert len(requests) == 2, (
+            "Проверьте, что каждый повтор запроса списывается из квоты, "
+            "а без токена повторы прекращаются"
+        )
+        assert quota.snapshot()["per_day_remaining"] == 0
+
+
+class TestAsyncUpstreamClient:
+    def get(self, handler, retries=2, quota=None):
+        from core.upstream import AsyncUpstreamClient
+
+        async def get():
+            client = AsyncUpstreamClient(retries=retries, quota=quota)
+            client._clients[asyncio.get_running_loop()] = httpx.AsyncClient(
+                transport=httpx.MockTransport(handler)
+            )
+            try:
+                return await client.get(URL)
+            finally:
+                await client.aclose()
+
+        return asyncio.run(get())
+
+    def test_retry_on_temporary_error(self, no_backoff):
+        handler, requests = get_handler([502, 429, 200])
+        assert self.get(handler).status_code == 200
+        assert len(requests) == 3
+        assert no_backoff == [0, 1]
+
+    def test_give_up_after_retries(self, no_backoff):
+        handler, requests = get_handler([500])
+        assert self.get(handler, retries=1).status_code == 500
+        assert len(requests) == 2
+
+    def test_no_retry_on_client_error(self, no_backoff):
+        handler, requests = get_handler([404])
+        assert self.get(handler).status_code == 404
+        assert len(requests) == 1
+
+    def test_retry_acquires_quota(self, no_backoff, tmp_path):
+        from core.quota import UpstreamQuota
+
+        quota = UpstreamQuota(str(tmp_path / "quota.json"), 0, 1)
+        handler, requests = get_handler([httpx.ReadTimeout("timeout")])
+        with pytest.raises(httpx.ReadTimeout):
+            self.get(handler, retries=3, quota=quota)
+        assert (
+            len(requests) == 2
+        ), "Проверьте, что каждый повтор запроса списывается из квоты"
+
+
+class TestUpstreamPolicy:
+    def test_backoff_full_jitter(self, monkeypatch):
+        from core import upstream
+
+        monkeypatch.setattr(upstream, "YANDEX_HTTP_BACKOFF", 0.2)
+        monkeypatch.setattr(upstream, "YANDEX_HTTP_BACKOFF_MAX", 1.0)
+        for attempt, limit in ((0, 0.2), (1, 0.4), (2, 0.8), (5, 1.0)):
+            delays = [upstream.get_backoff(attempt) for _ in range(200)]
+            assert all(0 <= delay <= limit for delay in delays), (
+                "Проверьте, что задержка выбирается из [0, min(max, "
+                "backoff * 2 ** attempt)]"
+            )
+            assert max(delays) > limit / 2
+            assert (
+                min(delays) < limit / 2
+            ), "Проверьте, что задержка повтора случайна (full jitter)"
+
+    def test_timeout_and_limits(self):
+        from core.upstream import get_upstream_limits, get_upstream_timeout
+        from yandex_weather.settings.base import (
+            YANDEX_HTTP_CONNECT_TIMEOUT,
+            YANDEX_HTTP_MAX_CONNECTIONS,
+            YANDEX_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            YANDEX_HTTP_READ_TIMEOUT,
+        )
+
+        timeout = get_upstream_timeout()
+        assert timeout.connect == YANDEX_HTTP_CONNECT_TIMEOUT
+        assert timeout.read == YANDEX_HTTP_READ_TIMEOUT
+        limits = get_upstream_limits()
+        assert limits.max_connections == YANDEX_HTTP_MAX_CONNECTIONS
+        assert (
+            limits.max_keepalive_connections
+            == YANDEX_HTTP_MAX_KEEPALIVE_CONNECTIONS
+        )
+
+    def test_pool_limit(self):
+        from core.upstream import UpstreamClient
+        from yandex_weather.settings.base import YANDEX_HTTP_MAX_CONNECTIONS
+
+        client = UpstreamClient()
+        pool = client.client._transport._pool
+        assert pool._max_connections == YANDEX_HTTP_MAX_CONNECTIONS, (
+            "Проверьте, что пул соединений клиента ограничен настройкой "
+            "YANDEX_HTTP_MAX_CONNECTIONS"
+        )
+        client.close()
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+
+from httpx import Request, Response
+
+import pytest
+
+PAYLOAD = {
+    "fact": {"temp": 5, "pressure_mm": 745, "wind_speed": 3.2},
+    "forecasts": [],
+}
+
+
+def get_response(payload, status_code=200):
+    return Response(
+        status_code,
+        json=payload,
+        request=Request("GET", "http://yandex.test/v2/forecast"),
+    )
+
+
+class TestUpstreamArchive:
+    def test_record_and_replay(self, tmp_path):
+        from core.upstream_archive import UpstreamArchive
+
+        path = str(tmp_path / "upstream.jsonl.gz")
+        recorder = UpstreamArchive(path, mode="record")
+        recorder.record(55.75, 37.61, get_response(PAYLOAD), 0.2)
+        recorder.record(
+            55.75, 37.61, get_response({"error": "busy"}, 503), 0.1
+        )
+        player = UpstreamArchive(path, mode="replay", speed=2)
+        response, delay = player.replay(55.75, 37.61)
+        assert response.json() == PAYLOAD, "Проверьте тело ответа из архива"
+        assert delay == pytest.approx(0.1), (
+            "Проверьте, что при большей скорости воспроизведения "
+            "задержка меньше"
+        )
+        response, _ = player.replay(55.75, 37.61)
+        assert (
+            response.status_code == 503
+        ), "Проверьте, что ответы по одним координатам отдаются по кругу"
+        response, _ = player.replay(55.75, 37.61)
+        assert response.status_code == 200
+        _, delay = UpstreamArchive(path, mode="replay", speed=0).replay(
+            55.75, 37.61
+        )
+        assert delay == 0, "Проверьте, что при скорости 0 задержки нет"
+
+    def test_unknown_coordinates(self, tmp_path):
+        from core.exceptions import RequestYandexWeatherError
+        from core.upstream_archive import UpstreamArchive
+
+        path = str(tmp_path / "upstream.jsonl.gz")
+        player = UpstreamArchive(path, mode="replay")
+        with pytest.raises(RequestYandexWeatherError):
+            player.replay(10, 10)
+        UpstreamArchive(path, mode="record").record(
+            55.75, 37.61, get_response(PAYLOAD), 0.2
+        )
+        response, _ = UpstreamArchive(path, mode="replay").replay(10, 10)
+        assert (
+            response.json() == PAYLOAD
+        ), "Проверьте, что для координат без записей выбирается другой ответ"
+
+    def test_replay_skips_quota(self, tmp_path, monkeypatch):
+        from core import utils
+        from core.upstream_archive import UpstreamArchive
+
+        path = str(tmp_path / "upstream.jsonl.gz")
+        UpstreamArchive(path, mode="record").record(
+            55.75, 37.61, get_response(PAYLOAD), 0.0
+        )
+        monkeypatch.setattr(
+            utils, "upstream_archive", UpstreamArchive(path, mode="replay")
+        )
+
+        def acquire_upstream_quota():
+            raise AssertionError("Квота не должна расходоваться в replay")
+
+        monkeypatch.setattr(
+            utils, "acquire_upstream_quota", acquire_upstream_quota
+        )
+        weather = utils.request_weather_from_yandex_api(55.75, 37.61)
+        assert weather["temp"] == 5
+        assert weather["forecast"] == utils.get_compact_forecast([])
+
+    def test_async_replay_off_event_loop(self, tmp_path, monkeypatch):
+        from core import utils
+        from core.upstream_archive import UpstreamArchive
+
+        path = str(tmp_path / "upstream.jsonl.gz")
+        UpstreamArchive(path, mode="record").record(
+            55.75, 37.61, get_response(PAYLOAD), 0.0
+        )
+        player = UpstreamArchive(path, mode="replay")
+        threads = []
+        replay = player.replay
+
+        def replay_in_thread(latitude, longitude):
+            threads.append(threading.get_ident())
+            return replay(latitude, longitude)
+
+        monkeypatch.setattr(player, "replay", replay_in_thread)
+        monkeypatch.setattr(utils, "upstream_archive", player)
+
+        async def request_weather():
+            threads.append(threading.get_ident())
+            return await utils.arequest_weather_from_yandex_api(55.75, 37.61)
+
+        assert asyncio.run(request_weather())["temp"] == 5
+        assert (
+            threads[0] != threads[1]
+        ), "Проверьте, что архив читается вне потока цикла событий"
@@ -0,0 +1,550 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.test import AsyncClient
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+import pytest
+from asgiref.sync import async_to_sync
+from yandex_weather.settings.base import TIMEOUT_YANDEX_UPDATE
+
+from .utils import check_with_validate_data
+
+WEATHER_URL = "/api/weather/"
+
+
+@pytest.mark.django_db
+class TestWeatherCache:
+    def test_fresh_hit_without_db(
+        self, city_weather, yandex_weather, django_assert_num_queries
+    ):
+        client = APIClient()
+        data = check_with_validate_data(
+            client, "get", WEATHER_URL, data={"city": "Москва"}
+        )
+        assert len(yandex_weather) == 1, (
+            "Проверьте, что при первом запросе данные о погоде "
+            "запрашиваются с сервиса yandex"
+        )
+        with django_assert_num_queries(0):
+            response = client.get(WEATHER_URL, {"city": " москва "})
+        assert response.status_code == status.HTTP_200_OK
+        assert (
+            response.json() == data
+        ), "Проверьте, что из кэша возвращаются те же данные о погоде"
+        assert len(yandex_weather) == 1
+        html_response = client.get(
+            WEATHER_URL, {"city": "Москва"}, HTTP_ACCEPT="text/html"
+        )
+        assert html_response["Content-Type"].startswith(
+            "text/html"
+        ), "Проверьте, что HTML-представление отдается через DRF"
+
+
+@pytest.mark.django_db
+class TestWeatherConditionalRequests:
+    def test_not_modified(
+        self, city_weather, yandex_weather, django_assert_num_queries
+    ):
+        from api.cache import weather_cache
+
+        client = APIClient()
+        response = client.get(WEATHER_URL, {"city": "Москва"})
+        assert response.status_code == status.HTTP_200_OK
+        max_age = int(response["Cache-Control"].split("max-age=")[1])
+        assert 0 < max_age <= TIMEOUT_YANDEX_UPDATE * 60, (
+            "Проверьте, что max-age равен оставшемуся времени "
+            "до устаревания данных"
+        )
+        with django_assert_num_queries(0):
+            etag_response = client.get(
+                WEATHER_URL,
+                {"city": "Москва"},
+                HTTP_IF_NONE_MATCH=response["ETag"],
+            )
+            modified_response = client.get(
+                WEATHER_URL,
+                {"city": "Москва"},
+                HTTP_IF_MODIFIED_SINCE=response["Last-Modified"],
+            )
+        for conditional_response in (etag_response, modified_response):
+            assert (
+                conditional_response.status_code
+                == status.HTTP_304_NOT_MODIFIED
+            ), "Проверьте, что для актуальных данных клиента возвращается 304"
+            assert not conditional_response.content
+            assert conditional_response["ETag"] == response["ETag"]
+        city_weather.refresh_from_db()
+        city_weather.updated_at += timedelta(seconds=1)
+        city_weather.save()
+        weather_cache.cache.clear()
+        response = client.get(
+            WEATHER_URL,
+            {"city": "Москва"},
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        assert (
+            response.status_code == status.HTTP_200_OK
+        ), "Проверьте, что после обновления данных возвращается новый ответ"
+
+
+@pytest.mark.django_db
+class TestWeatherCell:
+    def test_neighbours_share_upstream_request(
+        self, city_weather, yandex_weather, django_assert_num_queries
+    ):
+        from api.models import YandexWeatherModel
+
+        neighbour = YandexWeatherModel.objects.create(
+            city="Химки", latitude=55.76, longitude=37.62
+        )
+        client = APIClient()
+        assert (
+            client.get(WEATHER_URL, {"city": "Москва"}).status_code
+            == status.HTTP_200_OK
+        )
+        with django_assert_num_queries(0):
+            response = client.get(WEATHER_URL, {"city": "Химки"})
+        assert response.status_code == status.HTTP_200_OK
+        assert yandex_weather == [(55.775, 37.625)], (
+            "Проверьте, что города одной ячейки сетки получают погоду "
+            "одним запросом к yandex по координатам центра ячейки"
+        )
+        neighbour.refresh_from_db()
+        assert not neighbour.is_need_update
+
+
+@pytest.mark.django_db(transaction=True)
+class TestWeatherRefresh:
+    concurrent_requests = 8
+
+    def test_concurrent_refresh_coalesced(
+        self, city_weather, slow_yandex_weather
+    ):
+        def request_weather(_):
+            response = APIClient().get(WEATHER_URL, {"city": "Москва"})
+            return response.status_code
+
+        with ThreadPoolExecutor(self.concurrent_requests) as executor:
+            codes = list(
+                executor.map(request_weather, range(self.concurrent_requests))
+            )
+        assert codes == [status.HTTP_200_OK] * self.concurrent_requests
+        assert slow_yandex_weather == [False], (
+            "Проверьте, что конкурентные запросы одного города объединяются "
+            "в один запрос к yandex, выполняемый вне транзакции БД"
+        )
+        city_weather.refresh_from_db()
+        assert not city_weather.is_need_update
+
+    def test_stale_writer_loses(self, city_weather, monkeypatch):
+        from api.models import YandexWeatherModel
+
+        def request_weather(latitude, longitude):
+            # Запрос, начатый позже, успевает записать данные раньше.
+            YandexWeatherModel.objects.filter(pk=city_weather.pk).update(
+                updated_at=timezone.now(),
+                temp=20,
+                pressure_mm=750,
+                wind_speed=1,
+            )
+            return {"temp": 5, "pressure_mm": 745, "wind_speed": 3.2}
+
+        monkeypatch.setattr(
+            "api.services.request_weather_from_yandex_api", request_weather
+        )
+        response = APIClient().get(WEATHER_URL, {"city": "Москва"})
+        assert response.status_code == status.HTTP_200_OK
+        city_weather.refresh_from_db()
+        assert city_weather.temp == 20, (
+            "Проверьте, что ответ yandex, полученный раньше, не затирает "
+            "более свежие данные в БД"
+        )
+        assert (
+            response.data["temp"] == 20
+        ), "Проверьте, что возвращаются более свежие данные из БД"
+
+    def test_refresh_before_expiry(self, city_weather, yandex_weather):
+        from api.models import YandexWeatherModel
+        from api.services import refresh_weather
+
+        expiring_at = timezone.now() - timedelta(
+            minutes=TIMEOUT_YANDEX_UPDATE, seconds=-60
+        )
+        YandexWeatherModel.objects.filter(pk=city_weather.pk).update(
+            updated_at=expiring_at, temp=1, pressure_mm=740, wind_speed=1
+        )
+        weather = refresh_weather(
+            YandexWeatherModel.objects.get(pk=city_weather.pk)
+        )
+        assert yandex_weather, (
+            "Проверьте, что еще не устаревшие данные обновляются "
+            "с сервиса yandex, если их не обновили после чтения"
+        )
+        assert weather.updated_at > expiring_at
+        assert weather.temp == 5
+
+    def test_user_request_not_joined_to_background(
+        self, city_weather, monkeypatch
+    ):
+        from api.models import YandexWeatherModel
+        from api.services import refresh_weather
+        from core.exceptions import UpstreamQuotaExceededError
+        from core.quota import (
+            BACKGROUND_PRIORITY,
+            background_priority,
+            upstream_priority,
+        )
+
+        def request_weather(latitude, longitude):
+            if upstream_priority.get() == BACKGROUND_PRIORITY:
+                time.sleep(0.3)
+                raise UpstreamQuotaExceededError()
+            return {"temp": 5, "pressure_mm": 745, "wind_speed": 3.2}
+
+        def background_refresh():
+            with background_priority():
+                refresh_weather(
+                    YandexWeatherModel.objects.get(pk=city_weather.pk)
+                )
+
+        monkeypatch.setattr(
+            "api.services.request_weather_from_yandex_api", request_weather
+        )
+        with ThreadPoolExecutor(1) as executor:
+            background = executor.submit(background_refresh)
+            time.sleep(0.1)
+            response = APIClient().get(WEATHER_URL, {"city": "Москва"})
+        with pytest.raises(UpstreamQuotaExceededError):
+            background.result()
+        assert response.status_code == status.HTTP_200_OK, (
+            "Проверьте, что запрос пользователя не объединяется с фоновым "
+            "обновлением, получившим отказ в квоте"
+        )
+        assert response.data["temp"] == 5
+
+    def test_stale_served_while_revalidate(self, city_weather, yandex_weather):
+        from api.cache import weather_cache
+        from api.models import YandexWeatherModel
+
+        stale_at = timezone.now() - timedelta(
+            minutes=TIMEOUT_YANDEX_UPDATE + 1
+        )
+        YandexWeatherModel.objects.filter(pk=city_weather.pk).update(
+            updated_at=stale_at, temp=1, pressure_mm=740, wind_speed=1
+        )
+        response = APIClient().get(WEATHER_URL, {"city": "Москва"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["temp"] == 1, (
+            "Проверьте, что в окне stale-while-revalidate возвращаются "
+            "устаревшие данные без ожидания yandex"
+        )
+        assert response["X-Weather-Stale"] == "true"
+        for _ in range(100):
+            if weather_cache.get("Москва")["updated_at"] != stale_at:
+                break
+            time.sleep(0.05)
+        assert yandex_weather, (
+            "Проверьте, что для устаревших данных запланировано "
+            "фоновое обновление"
+        )
+        city_weather.refresh_from_db()
+        assert not city_weather.is_need_update
+
+
+@pytest.mark.django_db(transaction=True)
+class TestWeatherAsync:
+    url = "/api/weather/async/"
+
+    def get(self, *cities):
+        client = AsyncClient()
+
+        async def get_all():
+            return await asyncio.gather(
+                *(client.get(self.url, {"city": city}) for city in cities)
+            )
+
+        return async_to_sync(get_all)()
+
+    def test_refresh_and_cache_hit(self, city_weather, async_yandex_weather):
+        (response,) = self.get("Москва")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["temp"] == 5, (
+            "Проверьте, что асинхронное представление обновляет погоду "
+            "с сервиса yandex"
+        )
+        city_weather.refresh_from_db()
+        assert not city_weather.is_need_update
+        (cached,) = self.get(" москва ")
+        assert cached.status_code == status.HTTP_200_OK
+        assert cached.json() == response.json()
+        assert (
+            len(async_yandex_weather) == 1
+        ), "Проверьте, что повторный запрос отдается из кэша"
+
+    def test_concurrent_refresh_coalesced(
+        self, city_weather, async_yandex_weather
+    ):
+        responses = self.get(*["Москва"] * 5)
+        assert [response.status_code for response in responses] == [
+            status.HTTP_200_OK
+        ] * 5
+        assert len(async_yandex_weather) == 1, (
+            "Проверьте, что конкурентные асинхронные запросы одного города "
+            "объединяются в один запрос к yandex"
+        )
+
+    def test_stale_writer_loses(self, city_weather, monkeypatch):
+        from api.models import YandexWeatherModel
+
+        async def request_weather(latitude, longitude):
+            await YandexWeatherModel.objects.filter(
+                pk=city_weather.pk
+            ).aupdate(
+                updated_at=timezone.now(),
+                temp=20,
+                pressure_mm=750,
+                wind_speed=1,
+            )
+            return {"temp": 5, "pressure_mm": 745, "wind_speed": 3.2}
+
+        monkeypatch.setattr(
+            "api.services.arequest_weather_from_yandex_api", request_weather
+        )
+        (response,) = self.get("Москва")
+        assert response.json()["temp"] == 20
+        city_weather.refresh_from_db()
+        assert city_weather.temp == 20
+
+    def test_unknown_city(self, async_yandex_weather):
+        (response,) = self.get("Атлантида")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert not async_yandex_weather
+
+
+@pytest.mark.django_db(transaction=True)
+class TestRefreshPopularWeather:
+    def test_refresh_expiring_popular_city(self, city_weather, yandex_weather):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from api.models import YandexWeatherModel
+
+        YandexWeatherModel.objects.filter(pk=city_weather.pk).update(
+            requests_count=10
+        )
+        YandexWeatherModel.objects.create(
+            city="Тверь", latitude=56.85836, longitude=35.90057
+        )
+        out = StringIO()
+        call_command(
+            "refresh_popular_weather", "--once", "--budget", "5", stdout=out
+        )
+        assert (
+            len(yandex_weather) == 1
+        ), "Проверьте, что обновляются только популярные города"
+        assert "Москва" in out.getvalue()
+        assert "бюджет: 1/5" in out.getvalue()
+        city_weather.refresh_from_db()
+        assert not city_weather.is_need_update
+
+    def test_refresh_within_lead(self, city_weather, yandex_weather):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from api.models import YandexWeatherModel
+
+        expiring_at = timezone.now() - timedelta(
+            minutes=TIMEOUT_YANDEX_UPDATE, seconds=-60
+        )
+        YandexWeatherModel.objects.filter(pk=city_weather.pk).update(
+            requests_count=10, updated_at=expiring_at
+        )
+        out = StringIO()
+        call_command(
+            "refresh_popular_weather", "--once", "--lead", "120", stdout=out
+        )
+        assert yandex_weather, (
+            "Проверьте, что данные, которые устареют в течение --lead "
+            "секунд, обновляются с сервиса yandex"
+        )
+        assert "Обновлено городов: 1 (Москва)" in out.getvalue()
+        city_weather.refresh_from_db()
+        assert city_weather.updated_at > expiring_at
+
+    def test_unchanged_city_not_counted(self, city_weather, monkeypatch):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from api.models import YandexWeatherModel
+
+        monkeypatch.setattr(
+            "api.management.commands.refresh_popular_weather."
+            "refresh_cached_weather",
+            lambda weather: weather,
+        )
+        YandexWeatherModel.objects.filter(pk=city_weather.pk).update(
+            requests_count=10
+        )
+        out = StringIO()
+        call_command("refresh_popular_weather", "--once", stdout=out)
+        assert "Обновлено городов: 0 (), ошибок: 0" in out.getvalue(), (
+            "Проверьте, что обновленным считается город, время обновления "
+            "которого изменилось"
+        )
+
+
+@pytest.mark.django_db(transaction=True)
+class TestWeatherBatch:
+    url = "/api/weather/batch/"
+
+    def test_batch_results(
+        self, city_weather, yandex_weather, django_assert_num_queries
+    ):
+        with django_assert_num_queries(1):
+            response = APIClient().post(
+                self.url,
+                {"cities": ["Москва", "Нетакогогорода", "x"]},
+                format="json",
+            )
+        assert response.status_code == status.HTTP_200_OK
+        assert list(response.data) == [
+            "Москва",
+            "Нетакогогорода",
+            "x",
+        ], "Проверьте, что результат содержит каждый запрошенный город"
+        assert response.data["Москва"]["status_code"] == status.HTTP_200_OK
+        assert response.data["Москва"]["weather"]["temp"] == 5
+        assert (
+            response.data["Нетакогогорода"]["status_code"]
+            == status.HTTP_404_NOT_FOUND
+        )
+        assert response.data["x"]["status_code"] == (
+            status.HTTP_400_BAD_REQUEST
+        )
+        assert len(yandex_weather) == 1
+
+
+@pytest.mark.django_db
+class TestWeatherForecast:
+    def test_database_unavailable(self, city_weather, monkeypatch):
+        from django.db import OperationalError
+
+        def get_queryset(view):
+            raise OperationalError("server closed the connection")
+
+        monkeypatch.setattr(
+            "api.views.YandexForecastAPIView.get_queryset", get_queryset
+        )
+        response = APIClient().get(
+            "/api/weather/forecast/", {"city": "Москва"}
+        )
+        assert (
+            response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        ), "Проверьте, что при недоступной БД прогноз отвечает 503"
+
+    def test_forecast_served_from_store(
+        self, city_weather, yandex_weather, monkeypatch
+    ):
+        from core.utils import get_compact_forecast
+
+        hour_ts = int(timezone.now().timestamp()) // 3600 * 3600
+        forecast = get_compact_forecast(
+            [
+                {
+                    "date": "2026-10-18",
+                    "parts": {
+                        "day": {"temp_min": 3, "temp_max": 8, "prec_mm": 0},
+                        "night": {"temp_min": -1, "temp_max": 2},
+                    },
+                    "hours": [
+                        {"hour_ts": hour_ts - 3600, "temp": 4},
+                        {"hour_ts": hour_ts, "temp": 5},
+                        {"hour_ts": hour_ts + 3600, "temp": 6},
+                    ],
+                }
+            ]
+        )
+        monkeypatch.setattr(
+            "api.services.request_weather_from_yandex_api",
+            lambda latitude, longitude: yandex_weather.append(
+                (latitude, longitude)
+            )
+            or {
+                "temp": 5,
+                "pressure_mm": 745,
+                "wind_speed": 3.2,
+                "forecast": forecast,
+            },
+        )
+        client = APIClient()
+        assert (
+            client.get(WEATHER_URL, {"city": "Москва"}).status_code
+            == status.HTTP_200_OK
+        )
+        response = client.get(
+            f"{WEATHER_URL}forecast/", {"city": "Москва", "hours": 1}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert len(yandex_weather) == 1, (
+            "Проверьте, что прогноз отдается из БД "
+            "без дополнительных запросов к yandex"
+        )
+        assert response.data["days"][0]["temp_min"] == -1
+        assert response.data["days"][0]["temp_max"] == 8
+        assert [hour["temp"] for hour in response.data["hours"]] == [5], (
+            "Проверьте, что прошедшие часы не попадают в прогноз "
+            "и учитывается параметр hours"
+        )
+
+
+@pytest.mark.django_db
+class TestWeatherHistory:
+    def test_refresh_appends_observation(self, city_weather, yandex_weather):
+        APIClient().get(WEATHER_URL, {"city": "Москва"})
+        assert city_weather.observations.count() == 1, (
+            "Проверьте, что каждое обновление погоды "
+            "сохраняется в истории наблюдений"
+        )
+
+    def test_hourly_aggregates_and_prune(self, city_weather):
+        from api.models import WeatherObservationModel
+        from api.services import prune_weather_history
+
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        WeatherObservationModel.objects.bulk_create(
+            WeatherObservationModel(
+                city=city_weather,
+                observed_at=observed_at,
+                temp=temp,
+                pressure_mm=745,
+                wind_speed=3.0,
+            )
+            for observed_at, temp in (
+                (hour - timedelta(minutes=50), 1.0),
+                (hour - timedelta(minutes=20), 3.0),
+                (hour + timedelta(seconds=1), 7.0),
+                (hour - timedelta(days=40), 0.0),
+            )
+        )
+        response = APIClient().get(
+            f"{WEATHER_URL}history/", {"city": "Москва", "interval": "hour"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()["results"]
+        assert [
+            (row["temp_min"], row["temp_max"], row["temp_avg"])
+            for row in results
+        ] == [
+            (1.0, 3.0, 2.0),
+            (7.0, 7.0, 7.0),
+        ], "Проверьте агрегацию истории погоды по часам"
+        assert prune_weather_history(retention_days=30) == 1
+        assert city_weather.observations.count() == 3